@@ -95,9 +95,11 @@ class BikeForSaleAdmin(admin.ModelAdmin):
     # Show a small image preview in admin list
     def thumbnail(self, obj):
         if obj.image:
-            return f'<img src="{obj.image.url}" width="80" height="50" style="object-fit:cover;border-radius:5px;" />'
+            return format_html(
+                '<img src="{}" width="80" height="50" loading="lazy" style="object-fit:cover;border-radius:5px;" />',
+                obj.image_url("thumb"),
+            )
         return "No Image"
-    thumbnail.allow_tags = True
     thumbnail.short_description = "Image"
 
 
@@ -1,6 +1,37 @@
+import logging
+
 from django.apps import AppConfig
+from django.conf import settings
+from django.db.models.signals import post_migrate
+
+logger = logging.getLogger(__name__)
+
+
+def install_search_index(sender, using, **kwargs):
+    from .search import install_search_index as install
+    install(using)
 
 
 class BikesConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'bikes'
+
+    def ready(self):
+        # Connect model signal handlers (facet counts, caches, search indexes)
+        from . import signals  # noqa: F401
+
+        # The FTS5 search table and its triggers live outside the migration
+        # graph; (re)install them whenever migrations have run
+        post_migrate.connect(install_search_index, sender=self)
+
+        from .cache import shared_cache_is_per_process
+        if shared_cache_is_per_process() and not getattr(settings, "TESTING", False):
+            logger.warning(
+                "BIKES_CACHE_ALIAS is a per-process cache: purges and generation bumps made by other "
+                "workers or management commands are not seen here until PAGE_CACHE_TIMEOUT expires"
+            )
+
+        if getattr(settings, "BUY_BIKE_ENGINE", "orm") == "columnar":
+            from .columnar import listing_snapshot
+            if not listing_snapshot.available:
+                logger.warning("BUY_BIKE_ENGINE is 'columnar' but numpy is not installed, using the ORM engine")
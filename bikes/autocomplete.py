@@ -0,0 +1,147 @@
+"""
+Typeahead suggestions for the search box and brand filter.
+
+Suggestions are the brand, "brand name" and "brand name variant" phrases of
+active BikeForSale listings, weighted by how many listings share them. Every
+word of every phrase is kept in one sorted list of (word, phrase) pairs, so
+each typed prefix is a bisect range and a query such as "roy cl" is the
+intersection of two ranges. No database query is made per keystroke.
+
+The index is built on first use and updated by the BikeForSale signal
+handlers in bikes.signals; like the facet cube it is reloaded when the
+"listings" generation moves on without it.
+"""
+import re
+import threading
+from bisect import bisect_left, insort
+
+from .cache import LISTING_GENERATIONS
+from .models import BikeForSale
+
+WORD = re.compile(r"\w+")
+
+MAX_QUERY_WORDS = 6
+
+
+def listing_phrases(row):
+    """(kind, text) suggestions contributed by one listing row"""
+    if not row or not row.get("is_active"):
+        return []
+    brand = " ".join((row.get("brand") or "").split())
+    name = " ".join((row.get("name") or "").split())
+    variant = " ".join((row.get("model_variant") or "").split())
+    phrases = []
+    if brand:
+        phrases.append(("brand", brand))
+    if name:
+        model = f"{brand} {name}".strip()
+        phrases.append(("model", model))
+        if variant:
+            phrases.append(("variant", f"{model} {variant}"))
+    return phrases
+
+
+class AutocompleteIndex:
+    """Per-process prefix index over listing brands, names and variants"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._words = None  # sorted [(word, phrase key)]
+        self._phrases = {}  # phrase key -> {"text", "kind", "count"}
+        self._generation = None
+
+    @property
+    def loaded(self):
+        return self._words is not None
+
+    def load(self):
+        generation = LISTING_GENERATIONS.read()
+        words = []
+        phrases = {}
+        rows = BikeForSale.objects.filter(is_active=True).values("brand", "name", "model_variant", "is_active")
+        for row in rows.iterator(chunk_size=2000):
+            for kind, text in listing_phrases(row):
+                key = text.lower()
+                if key in phrases:
+                    phrases[key]["count"] += 1
+                else:
+                    phrases[key] = {"text": text, "kind": kind, "count": 1}
+                    words.extend((word, key) for word in set(WORD.findall(key)))
+        words.sort()
+        with self._lock:
+            self._words = words
+            self._phrases = phrases
+            self._generation = generation
+
+    def reset(self):
+        with self._lock:
+            self._words = None
+            self._phrases = {}
+            self._generation = None
+
+    def listing_changed(self, previous, current, generation):
+        """Apply one listing change (see FacetIndex.listing_changed)"""
+        with self._lock:
+            stamp = LISTING_GENERATIONS.advance(self._generation, "listings", generation)
+            if stamp is None:
+                return
+            self._generation = stamp
+            for kind, text in listing_phrases(previous):
+                self._remove(text)
+            for kind, text in listing_phrases(current):
+                self._add(kind, text)
+
+    def _add(self, kind, text):
+        key = text.lower()
+        phrase = self._phrases.get(key)
+        if phrase:
+            phrase["count"] += 1
+            return
+        self._phrases[key] = {"text": text, "kind": kind, "count": 1}
+        for word in set(WORD.findall(key)):
+            insort(self._words, (word, key))
+
+    def _remove(self, text):
+        key = text.lower()
+        phrase = self._phrases.get(key)
+        if not phrase:
+            return
+        phrase["count"] -= 1
+        if phrase["count"] > 0:
+            return
+        del self._phrases[key]
+        for word in set(WORD.findall(key)):
+            position = bisect_left(self._words, (word, key))
+            if position < len(self._words) and self._words[position] == (word, key):
+                del self._words[position]
+
+    def _prefix_matches(self, prefix):
+        start = bisect_left(self._words, (prefix,))
+        end = bisect_left(self._words, (prefix + "\uffff",))
+        return {key for _, key in self._words[start:end]}
+
+    def suggest(self, query, limit=8, kinds=None):
+        """Phrases containing a word starting with each word of ``query``"""
+        prefixes = WORD.findall((query or "").lower())[:MAX_QUERY_WORDS]
+        if not prefixes:
+            return []
+        if self._generation != LISTING_GENERATIONS.read():
+            self.load()
+
+        with self._lock:
+            # Longest prefixes first: they have the narrowest ranges
+            matches = None
+            for prefix in sorted(set(prefixes), key=len, reverse=True):
+                keys = self._prefix_matches(prefix)
+                matches = keys if matches is None else matches & keys
+                if not matches:
+                    return []
+            phrases = [self._phrases[key] for key in matches]
+
+        if kinds:
+            phrases = [phrase for phrase in phrases if phrase["kind"] in kinds]
+        phrases.sort(key=lambda phrase: (-phrase["count"], len(phrase["text"]), phrase["text"]))
+        return [dict(phrase) for phrase in phrases[:limit]]
+
+
+autocomplete_index = AutocompleteIndex()
@@ -0,0 +1,231 @@
+"""
+Generation-versioned caching helpers.
+
+A *generation* is a counter stored in the shared cache for a namespace such
+as "listings". Cache keys embed the current generation, so bumping the
+counter (from model signals) makes every older entry unreachable at once;
+stale entries are never purged explicitly and simply age out.
+"""
+import hashlib
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+
+
+# Cache lookup default that, unlike None, cannot be a stored value
+MISSING = object()
+
+
+# Backends whose entries only the process that wrote them can see
+PER_PROCESS_BACKENDS = {
+    "django.core.cache.backends.locmem.LocMemCache",
+    "django.core.cache.backends.dummy.DummyCache",
+}
+
+
+def shared_cache():
+    """The cache shared by every worker (BIKES_CACHE_ALIAS)"""
+    return caches[getattr(settings, "BIKES_CACHE_ALIAS", "default")]
+
+
+def shared_cache_is_per_process():
+    """True when generations bumped in one process are invisible to the others"""
+    alias = getattr(settings, "BIKES_CACHE_ALIAS", "default")
+    return settings.CACHES.get(alias, {}).get("BACKEND") in PER_PROCESS_BACKENDS
+
+
+def _generation_key(namespace):
+    return f"bikes:generation:{namespace}"
+
+
+def _fresh_generation():
+    # Start from the clock rather than 1, so a counter that was evicted can
+    # never come back at a value that old entries were stored under
+    return int(time.time() * 1000)
+
+
+def get_generation(namespace):
+    """Current generation number for ``namespace``"""
+    cache = shared_cache()
+    generation = cache.get(_generation_key(namespace))
+    if generation is None:
+        generation = _fresh_generation()
+        if not cache.add(_generation_key(namespace), generation, timeout=None):
+            generation = cache.get(_generation_key(namespace), generation)
+    return generation
+
+
+def get_generations(namespaces):
+    """Current generations of several namespaces in one cache read; unknown ones are left out"""
+    keys = {namespace: _generation_key(namespace) for namespace in namespaces}
+    found = shared_cache().get_many(list(keys.values()))
+    return {namespace: found[key] for namespace, key in keys.items() if key in found}
+
+
+def bump_generation(namespace):
+    """Invalidate every entry cached under the current generation of ``namespace``"""
+    cache = shared_cache()
+    try:
+        return cache.incr(_generation_key(namespace))
+    except ValueError:
+        generation = _fresh_generation()
+        cache.set(_generation_key(namespace), generation, timeout=None)
+        return generation
+
+
+class VersionedCache:
+    """
+    Result cache for one namespace, keyed by a canonical string plus the
+    namespace generation. Hit/miss counters are kept per process and, for a
+    view across workers, added to the shared cache at most every
+    LISTING_CACHE_STATS_FLUSH seconds rather than on every lookup.
+    """
+
+    def __init__(self, namespace, timeout=None):
+        self.namespace = namespace
+        self.timeout = timeout
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self._unflushed = {"hits": 0, "misses": 0}
+        self._flushed_at = time.monotonic()
+
+    def make_key(self, canonical, generation=None):
+        generation = get_generation(self.namespace) if generation is None else generation
+        digest = hashlib.md5(canonical.encode("utf-8")).hexdigest()
+        return f"bikes:{self.namespace}:{generation}:{digest}"
+
+    def get_or_compute(self, canonical, compute):
+        """Cached value for ``canonical``, calling ``compute()`` on a miss"""
+        cache = shared_cache()
+        key = self.make_key(canonical)
+        value = cache.get(key)
+        if value is not None:
+            self._count("hits")
+            return value
+
+        self._count("misses")
+        value = compute()
+        timeout = self.timeout if self.timeout is not None else getattr(settings, "LISTING_CACHE_TIMEOUT", 600)
+        cache.set(key, value, timeout=timeout)
+        return value
+
+    def invalidate(self):
+        return bump_generation(self.namespace)
+
+    def _count(self, outcome):
+        with self._lock:
+            setattr(self, outcome, getattr(self, outcome) + 1)
+            self._unflushed[outcome] += 1
+            due = time.monotonic() - self._flushed_at >= getattr(settings, "LISTING_CACHE_STATS_FLUSH", 60)
+        if due:
+            self.flush_stats()
+
+    def flush_stats(self):
+        """Add this process's counts since the last flush to the shared counters"""
+        with self._lock:
+            unflushed = self._unflushed
+            self._unflushed = {"hits": 0, "misses": 0}
+            self._flushed_at = time.monotonic()
+        cache = shared_cache()
+        for outcome, count in unflushed.items():
+            if not count:
+                continue
+            key = f"bikes:{self.namespace}:stats:{outcome}"
+            try:
+                cache.incr(key, count)
+            except ValueError:
+                if not cache.add(key, count, timeout=None):
+                    cache.incr(key, count)
+
+    def stats(self):
+        self.flush_stats()
+        shared = shared_cache().get_many([f"bikes:{self.namespace}:stats:hits", f"bikes:{self.namespace}:stats:misses"])
+        shared_hits = shared.get(f"bikes:{self.namespace}:stats:hits", 0)
+        shared_misses = shared.get(f"bikes:{self.namespace}:stats:misses", 0)
+        lookups = shared_hits + shared_misses
+        return {
+            "namespace": self.namespace,
+            "generation": get_generation(self.namespace),
+            "process": {"hits": self.hits, "misses": self.misses},
+            "shared": {"hits": shared_hits, "misses": shared_misses},
+            "hit_rate": round(shared_hits / lookups, 4) if lookups else None,
+        }
+
+
+# buy_bike result pages (rows + facet counts) per canonical query string
+listing_cache = VersionedCache("listings")
+
+
+
+class Snapshot:
+    """
+    A single value built by ``loader()``, shared through the cache and kept
+    in process memory for as long as the generation of ``namespace`` is
+    unchanged. A warm get() costs one cache read and no database queries.
+    """
+
+    def __init__(self, namespace, loader, timeout=None):
+        self.namespace = namespace
+        self.loader = loader
+        self.timeout = timeout
+        self._lock = threading.Lock()
+        self._local = None  # (generation, value)
+
+    def get(self):
+        generation = get_generation(self.namespace)
+        local = self._local
+        if local is not None and local[0] == generation:
+            return local[1]
+
+        cache = shared_cache()
+        key = f"bikes:{self.namespace}:snapshot:{generation}"
+        value = cache.get(key, MISSING)
+        if value is MISSING:
+            value = self.loader()
+            cache.set(key, value, timeout=self.timeout)
+        with self._lock:
+            self._local = (generation, value)
+        return value
+
+    def invalidate(self):
+        bump_generation(self.namespace)
+        with self._lock:
+            self._local = None
+
+
+class Generations:
+    """
+    The generations of ``namespaces`` an in-memory index was loaded at.
+
+    Every committed change bumps one of them in the shared cache (see
+    bikes.signals), so an index whose stamp no longer matches read() has
+    missed a change, possibly one made by another worker, and is reloaded.
+    The process making the change applies it in place instead and moves
+    its stamp along with the bump (advance()).
+    """
+
+    def __init__(self, *namespaces):
+        self.namespaces = namespaces
+
+    def read(self):
+        """Current stamp; read it *before* loading, so changes made meanwhile still count"""
+        return tuple(get_generation(namespace) for namespace in self.namespaces)
+
+    def advance(self, stamp, namespace, generation):
+        """
+        ``stamp`` moved to ``generation`` of ``namespace``, or None when that
+        bump does not directly follow it (the index is stale, or was
+        reloaded after the change, and must not apply it again)
+        """
+        position = self.namespaces.index(namespace)
+        if stamp is None or stamp[position] != generation - 1:
+            return None
+        return stamp[:position] + (generation,) + stamp[position + 1:]
+
+
+# Stamp of the in-memory listing indexes; "listings" is bumped by
+# listing_cache.invalidate() on every committed listing change
+LISTING_GENERATIONS = Generations("listings")
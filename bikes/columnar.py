@@ -0,0 +1,304 @@
+"""
+Columnar in-memory snapshot of active listings for the buy_bike page.
+
+Every active BikeForSale is one position in a set of NumPy arrays: price
+(in paise), kilometers, displacement, created_at (microseconds), id and one
+integer code column per facet (brand, year, fuel, owner, price band, cc
+band). A ListingFilter becomes a handful of vectorised boolean masks, the
+page is picked with a partial sort over the matching positions and facet
+counts are bincounts, so only the page's rows are read from the database,
+by primary key.
+
+NumPy is optional. The snapshot is used when BUY_BIKE_ENGINE = "columnar"
+and numpy can be imported; otherwise buy_bike stays on the ORM path. Like
+the other in-memory indexes it is loaded on first use, updated from the
+BikeForSale signal handlers in bikes.signals and reloaded when the
+"listings" generation moves on without it.
+"""
+import datetime
+import threading
+from collections import Counter
+from decimal import Decimal
+
+from django.utils import timezone
+
+from .cache import LISTING_GENERATIONS
+from .facets import FACET_FIELDS, facet_cell, facet_options
+from .models import BikeForSale
+from .pagination import KeysetPage, KeysetPaginator
+
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover - numpy is an optional dependency
+    np = None
+
+EPOCH = datetime.datetime(1970, 1, 1, tzinfo=datetime.timezone.utc)
+
+
+def to_paise(price):
+    return int(round(Decimal(str(price)) * 100))
+
+
+def to_micros(moment):
+    if timezone.is_naive(moment):
+        moment = timezone.make_aware(moment, datetime.timezone.utc)
+    return (moment - EPOCH) // datetime.timedelta(microseconds=1)
+
+
+# Snapshot columns per ordering field, and how a cursor value maps onto them
+ORDER_COLUMNS = {
+    "id": ("ids", int),
+    "price": ("price", to_paise),
+    "created_at": ("created", to_micros),
+}
+
+LOAD_FIELDS = (
+    "id", "is_active", "brand", "year", "fuel_type", "owner_number",
+    "price", "displacement_cc", "kilometers", "created_at",
+)
+
+
+class Vocabulary:
+    """Stable value <-> integer code mapping for one facet column"""
+
+    def __init__(self):
+        self.codes = {}
+        self.values = []
+
+    def code(self, value):
+        code = self.codes.get(value)
+        if code is None:
+            code = self.codes[value] = len(self.values)
+            self.values.append(value)
+        return code
+
+
+class ListingSnapshot:
+    """Per-process columnar copy of the active listings"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._columns = None
+        self._clear()
+
+    @property
+    def available(self):
+        return np is not None
+
+    @property
+    def loaded(self):
+        return self._columns is not None
+
+    def _clear(self):
+        self._columns = None
+        self._positions = {}  # listing id -> array position
+        self._size = 0  # positions in use, including removed ones
+        self._removed = 0
+        self._vocabularies = {name: Vocabulary() for name in FACET_FIELDS}
+        self._brand_labels = {}
+        self._generation = None
+
+    def load(self):
+        generation = LISTING_GENERATIONS.read()
+        rows = BikeForSale.objects.filter(is_active=True).values(*LOAD_FIELDS)
+        with self._lock:
+            self._clear()
+            self._allocate(max(1024, rows.count()))
+            for row in rows.iterator(chunk_size=2000):
+                self._put(row)
+            self._generation = generation
+
+    def reset(self):
+        with self._lock:
+            self._clear()
+
+    def listing_changed(self, previous, current, generation):
+        """BikeForSale change hook (see bikes.signals.LISTING_INDEXES)"""
+        with self._lock:
+            stamp = LISTING_GENERATIONS.advance(self._generation, "listings", generation)
+            if stamp is None:
+                return
+            self._generation = stamp
+            self._discard((current or previous)["id"])
+            if current and current.get("is_active"):
+                self._put(current)
+            if self._removed > max(1024, self._size // 2):
+                self._compact()
+
+    # -- storage -------------------------------------------------------------
+
+    def _allocate(self, capacity):
+        columns = {
+            "ids": np.zeros(capacity, dtype=np.int64),
+            "alive": np.zeros(capacity, dtype=bool),
+            "price": np.zeros(capacity, dtype=np.int64),
+            "kilometers": np.zeros(capacity, dtype=np.int64),
+            "cc": np.zeros(capacity, dtype=np.int64),
+            "created": np.zeros(capacity, dtype=np.int64),
+        }
+        columns.update({name: np.zeros(capacity, dtype=np.int32) for name in FACET_FIELDS})
+        if self._columns is not None:
+            for name, column in self._columns.items():
+                columns[name][:self._size] = column[:self._size]
+        self._columns = columns
+
+    def _put(self, row):
+        if self._size == len(self._columns["ids"]):
+            self._allocate(2 * self._size)
+        position = self._size
+        self._size += 1
+        self._positions[row["id"]] = position
+
+        columns = self._columns
+        columns["ids"][position] = row["id"]
+        columns["alive"][position] = True
+        columns["price"][position] = to_paise(row["price"])
+        columns["kilometers"][position] = int(row["kilometers"])
+        # NULL displacement never satisfies a cc condition, as in SQL
+        columns["cc"][position] = -1 if row["displacement_cc"] is None else int(row["displacement_cc"])
+        columns["created"][position] = to_micros(row["created_at"])
+        for name, value in zip(FACET_FIELDS, facet_cell(row)):
+            columns[name][position] = self._vocabularies[name].code(value)
+        brand = (row["brand"] or "").strip()
+        self._brand_labels.setdefault(brand.lower(), brand)
+
+    def _discard(self, pk):
+        position = self._positions.pop(pk, None)
+        if position is not None:
+            self._columns["alive"][position] = False
+            self._removed += 1
+
+    def _compact(self):
+        keep = np.flatnonzero(self._columns["alive"][:self._size])
+        for name, column in self._columns.items():
+            column[:len(keep)] = column[keep]
+            column[len(keep):] = 0
+        self._size = len(keep)
+        self._removed = 0
+        self._positions = {int(pk): position for position, pk in enumerate(self._columns["ids"][:self._size])}
+
+    # -- queries -------------------------------------------------------------
+
+    def _range_mask(self, spec):
+        """Active positions passing every filter the facet columns do not cover"""
+        columns = {name: column[:self._size] for name, column in self._columns.items()}
+        mask = columns["alive"].copy()
+        cc = columns["cc"]
+        if spec.cc is not None:
+            mask &= cc == spec.cc
+        if spec.min_cc is not None:
+            mask &= cc >= spec.min_cc
+        if spec.max_cc is not None:
+            mask &= (cc >= 0) & (cc <= spec.max_cc)
+        if spec.min_price is not None:
+            mask &= columns["price"] >= to_paise(spec.min_price)
+        if spec.max_price is not None:
+            mask &= columns["price"] <= to_paise(spec.max_price)
+        if spec.min_km is not None:
+            mask &= columns["kilometers"] >= spec.min_km
+        if spec.max_km is not None:
+            mask &= columns["kilometers"] <= spec.max_km
+        return mask
+
+    def _facet_masks(self, selected):
+        masks = {}
+        for name, value in selected.items():
+            code = self._vocabularies[name].codes.get(value)
+            column = self._columns[name][:self._size]
+            masks[name] = column == code if code is not None else np.zeros(self._size, dtype=bool)
+        return masks
+
+    def _facets(self, base, masks):
+        totals = {}
+        for name in FACET_FIELDS:
+            mask = base
+            for other, other_mask in masks.items():
+                if other != name:
+                    mask = mask & other_mask
+            vocabulary = self._vocabularies[name]
+            counts = np.bincount(self._columns[name][:self._size][mask], minlength=len(vocabulary.values))
+            totals[name] = Counter({vocabulary.values[code]: int(counts[code]) for code in np.flatnonzero(counts)})
+        return totals
+
+    def _select(self, matching, ordering, values, backwards, limit):
+        """Positions of the first ``limit`` matching rows past the cursor ``values``"""
+        keys = []
+        bounds = []
+        for position, name in enumerate(ordering):
+            column, convert = ORDER_COLUMNS[name.lstrip("-")]
+            # Flip descending (and backwards) keys so "first" is always ascending
+            sign = -1 if name.startswith("-") != backwards else 1
+            keys.append(sign * self._columns[column][:self._size][matching])
+            if values is not None:
+                bounds.append(sign * convert(values[position]))
+
+        candidates = np.arange(len(matching))
+        if values is not None:
+            past = np.zeros(len(matching), dtype=bool)
+            equal = np.ones(len(matching), dtype=bool)
+            for key, bound in zip(keys, bounds):
+                past |= equal & (key > bound)
+                equal &= key == bound
+            candidates = np.flatnonzero(past)
+            keys = [key[candidates] for key in keys]
+
+        # Partial sort: only rows whose first key is within the first `limit`
+        # values are fully ordered
+        if len(candidates) > limit:
+            threshold = np.partition(keys[0], limit - 1)[limit - 1]
+            keep = np.flatnonzero(keys[0] <= threshold)
+            candidates = candidates[keep]
+            keys = [key[keep] for key in keys]
+        order = np.lexsort(keys[::-1])[:limit]
+        return matching[candidates[order]]
+
+    def results(self, spec, after=None, before=None, per_page=24):
+        """Page and facet counts for a ListingFilter, same shape as views.listing_results"""
+        if self._generation != LISTING_GENERATIONS.read():
+            self.load()
+
+        paginator = KeysetPaginator(BikeForSale.objects.none(), spec.ordering, per_page=per_page)
+        cursor = after or before
+        values = paginator.decode_cursor(cursor) if cursor else None  # raises InvalidCursor
+        backwards = bool(before) and not after
+
+        with self._lock:
+            selected = spec.selected_facets()
+            base = self._range_mask(spec)
+            masks = self._facet_masks(selected)
+            matching = base
+            for mask in masks.values():
+                matching = matching & mask
+
+            totals = self._facets(base, masks)
+            total = int(np.count_nonzero(matching))
+            positions = self._select(np.flatnonzero(matching), spec.ordering, values, backwards, per_page + 1)
+            ids = [int(pk) for pk in self._columns["ids"][positions]]
+            brand_labels = dict(self._brand_labels)
+
+        more = len(ids) > per_page
+        ids = ids[:per_page]
+        if backwards:
+            ids.reverse()
+        # A listing deactivated since the snapshot was taken is skipped
+        found = BikeForSale.objects.filter(is_active=True).in_bulk(ids)
+        rows = [found[pk] for pk in ids if pk in found]
+
+        if values is None:
+            has_next, has_previous = more, False
+        elif backwards:
+            has_next, has_previous = True, more
+        else:
+            has_next, has_previous = more, True
+
+        page = KeysetPage(
+            rows,
+            has_next=has_next and bool(rows),
+            has_previous=has_previous and bool(rows),
+            next_cursor=paginator.encode_cursor(rows[-1]) if rows else None,
+            previous_cursor=paginator.encode_cursor(rows[0]) if rows else None,
+        )
+        return {"page": page, "facets": facet_options(totals, total, selected, brand_labels)}
+
+
+listing_snapshot = ListingSnapshot()
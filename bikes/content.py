@@ -0,0 +1,84 @@
+"""
+Registry of the CMS-style section objects shown on the static pages.
+
+AboutSection, MissionSection, ApproachSection (with its images),
+FeatureSection, RiderTrustSection and the auth page images are edited
+rarely in the admin but read on every page view. Each registered entry is
+loaded once into a cache.Snapshot, served from process memory afterwards
+and invalidated by the save/delete signals of the models it depends on
+(see bikes.signals). warm_up() loads every entry ahead of the first request.
+"""
+import logging
+
+from django.db import DatabaseError
+
+from .cache import Snapshot
+from .models import (
+    AboutSection, ApproachImage, ApproachSection, AuthImage, FeatureSection,
+    MissionSection, RiderTrustSection,
+)
+
+logger = logging.getLogger(__name__)
+
+
+class ContentRegistry:
+    """Named, cached content entries and the models each one is built from"""
+
+    def __init__(self):
+        self._entries = {}  # name -> Snapshot
+        self._dependencies = {}  # model -> set of entry names
+
+    def register(self, name, loader, models):
+        self._entries[name] = Snapshot(f"content:{name}", loader)
+        for model in models:
+            self._dependencies.setdefault(model, set()).add(name)
+
+    @property
+    def models(self):
+        return list(self._dependencies)
+
+    def get(self, name):
+        return self._entries[name].get()
+
+    def get_many(self, *names):
+        return {name: self.get(name) for name in names}
+
+    def entries_for(self, model):
+        """Names of the entries built from ``model``"""
+        return sorted(self._dependencies.get(model, ()))
+
+    def model_changed(self, model):
+        """Invalidate every entry built from ``model``"""
+        for name in self.entries_for(model):
+            self._entries[name].invalidate()
+
+    def warm_up(self):
+        """Load every entry, e.g. at process start; a missing table is only logged"""
+        for name in self._entries:
+            try:
+                self.get(name)
+            except DatabaseError as e:
+                logger.warning(f"Could not warm up content entry {name}: {str(e)}")
+
+
+content_registry = ContentRegistry()
+
+content_registry.register("about_section", lambda: AboutSection.objects.first(), [AboutSection])
+content_registry.register("mission", lambda: MissionSection.objects.first(), [MissionSection])
+content_registry.register(
+    "approach_section",
+    lambda: ApproachSection.objects.prefetch_related("images").first(),
+    [ApproachSection, ApproachImage],
+)
+content_registry.register("feature", lambda: FeatureSection.objects.first(), [FeatureSection])
+content_registry.register("rider_section", lambda: RiderTrustSection.objects.first(), [RiderTrustSection])
+content_registry.register(
+    "login_image",
+    lambda: AuthImage.objects.filter(is_for_login=True).order_by("-uploaded_at").first(),
+    [AuthImage],
+)
+content_registry.register(
+    "register_image",
+    lambda: AuthImage.objects.filter(is_for_register=True).order_by("-uploaded_at").first(),
+    [AuthImage],
+)
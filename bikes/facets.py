@@ -0,0 +1,248 @@
+"""
+Facet counts for the buy_bike filter sidebar.
+
+Active listings are folded into a small "cube": a Counter keyed by
+(brand, year, fuel_type, owner_number, price_band, cc_band) holding the
+number of listings in each cell. A dealer inventory has far fewer distinct cells than
+rows, so counting facets for any combination of sidebar filters is a pass
+over the cube instead of a scan over BikeForSale.
+
+The cube lives in process memory, is loaded with one GROUP BY query on first
+use and is then kept current by the BikeForSale signal handlers in
+bikes.signals. It remembers the "listings" generation it was loaded at and
+is reloaded once that moves on, i.e. after a change made by another worker.
+"""
+import threading
+from collections import Counter
+from decimal import Decimal, InvalidOperation
+
+from django.db.models import Case, CharField, Count, Value, When
+
+from .cache import LISTING_GENERATIONS
+from .models import BikeForSale
+
+
+# (key, label, lower bound inclusive, upper bound exclusive)
+PRICE_BANDS = [
+    ("under_50k", "Under ₹50K", None, 50000),
+    ("50k_1l", "₹50K - ₹1L", 50000, 100000),
+    ("1l_2l", "₹1L - ₹2L", 100000, 200000),
+    ("2l_5l", "₹2L - ₹5L", 200000, 500000),
+    ("above_5l", "Above ₹5L", 500000, None),
+]
+PRICE_BAND_BOUNDS = {key: (low, high) for key, _, low, high in PRICE_BANDS}
+
+# Engine size buckets over BikeForSale.displacement_cc
+CC_BANDS = [
+    ("under_125", "Below 125cc", None, 125),
+    ("125_200", "125 - 199cc", 125, 200),
+    ("200_400", "200 - 399cc", 200, 400),
+    ("400_750", "400 - 749cc", 400, 750),
+    ("750_plus", "750cc and above", 750, None),
+]
+CC_BAND_BOUNDS = {key: (low, high) for key, _, low, high in CC_BANDS}
+
+FACET_FIELDS = ("brand", "year", "fuel_type", "owner_number", "price_band", "cc_band")
+
+
+def band_for(value, bands):
+    """Key of the band in ``bands`` containing ``value``"""
+    if value is None:
+        return None
+    try:
+        value = Decimal(str(value))
+    except InvalidOperation:
+        return None
+    for key, _, low, high in bands:
+        if (low is None or value >= low) and (high is None or value < high):
+            return key
+    return None
+
+
+def price_band(price):
+    """Key of the PRICE_BANDS entry containing ``price``"""
+    return band_for(price, PRICE_BANDS)
+
+
+def band_expression(field, bands):
+    """SQL CASE mapping ``field`` to its band key (NULL stays NULL)"""
+    whens = [When(**{f"{field}__isnull": True}, then=Value(None))]
+    whens += [When(**{f"{field}__lt": high}, then=Value(key)) for key, _, _, high in bands if high is not None]
+    return Case(*whens, default=Value(bands[-1][0]), output_field=CharField())
+
+
+def facet_cell(row):
+    """Cube key for a listing row (dict of field values), or None if it is not listed"""
+    if not row or not row.get("is_active"):
+        return None
+    try:
+        year = int(row.get("year"))
+    except (TypeError, ValueError):
+        year = None
+    return (
+        (row.get("brand") or "").strip().lower(),
+        year,
+        row.get("fuel_type"),
+        row.get("owner_number"),
+        price_band(row.get("price")),
+        band_for(row.get("displacement_cc"), CC_BANDS),
+    )
+
+
+def build_cube(queryset):
+    """Group ``queryset`` into (cube Counter, brand labels) with a single query"""
+    cube = Counter()
+    labels = {}
+    rows = (
+        queryset.order_by()
+        .annotate(
+            price_band=band_expression("price", PRICE_BANDS),
+            cc_band=band_expression("displacement_cc", CC_BANDS),
+        )
+        .values_list("brand", "year", "fuel_type", "owner_number", "price_band", "cc_band")
+        .annotate(listings=Count("id"))
+    )
+    for brand, *rest, listings in rows:
+        brand_key = (brand or "").strip().lower()
+        labels.setdefault(brand_key, (brand or "").strip())
+        cube[(brand_key, *rest)] += listings
+    return cube, labels
+
+
+def count_facets(cube, selected, brand_labels):
+    """
+    Facet counts for ``selected`` filters over ``cube``.
+
+    Each facet is counted with every *other* selected filter applied, so the
+    sidebar shows how many listings picking a different value would give.
+    ``total`` is the number of listings matching all selected filters.
+    """
+    totals = {name: Counter() for name in FACET_FIELDS}
+    total = 0
+    wanted = [(position, selected.get(name)) for position, name in enumerate(FACET_FIELDS)]
+
+    for cell, listings in cube.items():
+        if listings <= 0:
+            continue
+        misses = [position for position, value in wanted if value is not None and cell[position] != value]
+        if not misses:
+            total += listings
+            for position, name in enumerate(FACET_FIELDS):
+                totals[name][cell[position]] += listings
+        elif len(misses) == 1:
+            position = misses[0]
+            totals[FACET_FIELDS[position]][cell[position]] += listings
+
+    return facet_options(totals, total, selected, brand_labels)
+
+
+def facet_options(totals, total, selected, brand_labels):
+    """
+    Sidebar option lists from per-facet counts: ``totals`` maps each facet
+    name to a Counter of value -> listings matching every other selected filter.
+    """
+    def options(name, values, label_for):
+        return [
+            {
+                "value": value,
+                "label": label_for(value),
+                "count": totals[name].get(value, 0),
+                "selected": selected.get(name) == value,
+            }
+            for value in values
+        ]
+
+    def present(name):
+        values = {value for value, listings in totals[name].items() if listings > 0}
+        if selected.get(name) is not None:
+            values.add(selected[name])
+        return values
+
+    brands = sorted(present("brand"), key=lambda value: brand_labels.get(value, value).lower())
+    years = sorted(present("year"), reverse=True)
+
+    return {
+        "total": total,
+        "brand": options("brand", brands, lambda value: brand_labels.get(value, value)),
+        "year": options("year", years, str),
+        "fuel_type": options("fuel_type", [key for key, _ in BikeForSale.FUEL_CHOICES],
+                             dict(BikeForSale.FUEL_CHOICES).get),
+        "owner_number": options("owner_number", [key for key, _ in BikeForSale.OWNER_CHOICES],
+                                dict(BikeForSale.OWNER_CHOICES).get),
+        "price_band": options("price_band", [key for key, *_ in PRICE_BANDS],
+                              {key: label for key, label, *_ in PRICE_BANDS}.get),
+        "cc_band": options("cc_band", [key for key, *_ in CC_BANDS],
+                           {key: label for key, label, *_ in CC_BANDS}.get),
+    }
+
+
+class FacetIndex:
+    """Per-process facet cube over active BikeForSale listings"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._cube = None
+        self._brand_labels = {}
+        self._generation = None
+
+    @property
+    def loaded(self):
+        return self._cube is not None
+
+    def load(self):
+        generation = LISTING_GENERATIONS.read()
+        cube, labels = build_cube(BikeForSale.objects.filter(is_active=True))
+        with self._lock:
+            self._cube = cube
+            self._brand_labels = labels
+            self._generation = generation
+
+    def reset(self):
+        with self._lock:
+            self._cube = None
+            self._brand_labels = {}
+            self._generation = None
+
+    def listing_changed(self, previous, current, generation):
+        """
+        Move one listing between cells; rows are dicts of field values or
+        None and ``generation`` is the "listings" generation the change bumped
+        """
+        with self._lock:
+            stamp = LISTING_GENERATIONS.advance(self._generation, "listings", generation)
+            if stamp is None:
+                return  # not loaded, or stale anyway: the next load reads fresh data
+            self._generation = stamp
+            before, after = facet_cell(previous), facet_cell(current)
+            if before == after:
+                return
+            if before is not None:
+                self._cube[before] -= 1
+                if self._cube[before] <= 0:
+                    del self._cube[before]
+            if after is not None:
+                self._cube[after] += 1
+                self._brand_labels.setdefault(after[0], current["brand"].strip())
+
+    def counts(self, selected, queryset=None):
+        """
+        Facet counts for ``selected``, a {facet name: value} dict (see
+        ListingFilter.selected_facets).
+
+        Filters the cube cannot express (cc, price/km ranges) are applied by
+        passing ``queryset`` already narrowed by them; it is grouped in one
+        query and counted the same way.
+        """
+        if queryset is not None:
+            cube, labels = build_cube(queryset)
+            with self._lock:
+                labels = {**labels, **self._brand_labels}
+            return count_facets(cube, selected, labels)
+
+        if self._generation != LISTING_GENERATIONS.read():
+            self.load()
+        with self._lock:
+            return count_facets(self._cube, selected, self._brand_labels)
+
+
+facet_index = FacetIndex()
@@ -0,0 +1,210 @@
+"""
+Typed filter spec for the buy_bike query parameters.
+
+ListingFilter.from_params() parses and validates the raw GET strings into a
+frozen, hashable spec: brand is lowercased, numbers are parsed, empty
+values are dropped and contradictory ranges are rejected. Everything
+downstream (the listing query, facet selection, result cache keys) works
+from the spec, so equivalent query strings share one canonical key and
+bad input never reaches the database.
+"""
+from dataclasses import dataclass, fields, replace
+from datetime import datetime
+from decimal import Decimal, InvalidOperation
+from urllib.parse import urlencode
+
+from django.db.models import Q
+
+from .facets import CC_BAND_BOUNDS, FACET_FIELDS, PRICE_BAND_BOUNDS
+from .models import BikeForSale, parse_displacement
+
+BUY_BIKE_ORDERINGS = {
+    "newest": ("-created_at", "-id"),
+    "price_low": ("price", "id"),
+    "price_high": ("-price", "-id"),
+}
+
+DEFAULT_SORT = "newest"
+
+# Filters the facet cube cannot answer by itself (see bikes.facets)
+RANGE_FIELDS = ("cc", "min_cc", "max_cc", "min_price", "max_price", "min_km", "max_km")
+
+# BikeForSale.price is DecimalField(max_digits=10, decimal_places=2)
+MAX_PRICE = Decimal("99999999.99")
+
+MAX_KILOMETERS = 10_000_000
+
+MAX_DISPLACEMENT = 10_000
+
+
+class InvalidFilter(ValueError):
+    """Raised when buy_bike parameters cannot be parsed; ``errors`` maps parameter to message"""
+
+    def __init__(self, errors):
+        self.errors = errors
+        super().__init__("; ".join(f"{name}: {message}" for name, message in errors.items()))
+
+
+def _integer(value, low, high):
+    try:
+        number = int(value)
+    except ValueError:
+        raise ValueError("must be a whole number")
+    if not low <= number <= high:
+        raise ValueError(f"must be between {low} and {high}")
+    return number
+
+
+def _price(value):
+    try:
+        price = Decimal(value)
+    except InvalidOperation:
+        raise ValueError("must be a number")
+    if not price.is_finite() or not 0 <= price <= MAX_PRICE:
+        raise ValueError(f"must be between 0 and {MAX_PRICE}")
+    return price.quantize(Decimal("0.01"))
+
+
+def _displacement(value):
+    cc = parse_displacement(value)
+    if cc is None:
+        raise ValueError("must be an engine size such as 150 or 150cc")
+    if cc > MAX_DISPLACEMENT:
+        raise ValueError(f"must be at most {MAX_DISPLACEMENT}")
+    return cc
+
+
+def _choice(choices):
+    def parse(value):
+        if value not in choices:
+            raise ValueError(f"must be one of {', '.join(choices)}")
+        return value
+    return parse
+
+
+PARSERS = {
+    "brand": str.lower,
+    "year": lambda value: _integer(value, 1900, datetime.now().year + 1),
+    "fuel_type": _choice([key for key, _ in BikeForSale.FUEL_CHOICES]),
+    "owner_number": _choice([key for key, _ in BikeForSale.OWNER_CHOICES]),
+    "cc": _displacement,
+    "min_cc": _displacement,
+    "max_cc": _displacement,
+    "cc_band": _choice(list(CC_BAND_BOUNDS)),
+    "min_price": _price,
+    "max_price": _price,
+    "price_band": _choice(list(PRICE_BAND_BOUNDS)),
+    "min_km": lambda value: _integer(value, 0, MAX_KILOMETERS),
+    "max_km": lambda value: _integer(value, 0, MAX_KILOMETERS),
+    "sort": _choice(list(BUY_BIKE_ORDERINGS)),
+}
+
+
+@dataclass(frozen=True)
+class ListingFilter:
+    """Validated buy_bike filters; ``None`` means the filter is not applied"""
+
+    brand: str = None
+    year: int = None
+    fuel_type: str = None
+    owner_number: str = None
+    cc: int = None
+    min_cc: int = None
+    max_cc: int = None
+    cc_band: str = None
+    min_price: Decimal = None
+    max_price: Decimal = None
+    price_band: str = None
+    min_km: int = None
+    max_km: int = None
+    sort: str = DEFAULT_SORT
+
+    @classmethod
+    def from_params(cls, params):
+        """Parse a QueryDict (or plain dict); raises InvalidFilter listing every bad parameter"""
+        values = {}
+        errors = {}
+        for name, parse in PARSERS.items():
+            raw = (params.get(name) or "").strip()
+            if not raw:
+                continue
+            try:
+                values[name] = parse(raw)
+            except ValueError as e:
+                errors[name] = str(e)
+
+        for low, high in (("min_cc", "max_cc"), ("min_price", "max_price"), ("min_km", "max_km")):
+            if low in values and high in values and values[low] > values[high]:
+                errors[low] = f"must not be greater than {high}"
+
+        if errors:
+            raise InvalidFilter(errors)
+        return cls(**values)
+
+    @property
+    def ordering(self):
+        return BUY_BIKE_ORDERINGS[self.sort]
+
+    @property
+    def key(self):
+        """Canonical query string: sorted, normalised, defaults and empty values left out"""
+        pairs = []
+        for field in sorted(fields(self), key=lambda field: field.name):
+            value = getattr(self, field.name)
+            if value is not None and value != field.default:
+                pairs.append((field.name, str(value)))
+        return urlencode(pairs)
+
+    def only(self, *names):
+        """Copy keeping only the filters in ``names`` (and the sort order)"""
+        return replace(self, **{field.name: None for field in fields(self) if field.name not in names + ("sort",)})
+
+    def without(self, *names):
+        """Copy with the filters in ``names`` removed"""
+        return replace(self, **{name: None for name in names})
+
+    @property
+    def has_range_filters(self):
+        return any(getattr(self, name) is not None for name in RANGE_FIELDS)
+
+    def selected_facets(self):
+        """Values of the cube-answerable filters, keyed by facet name"""
+        return {name: getattr(self, name) for name in FACET_FIELDS if getattr(self, name) is not None}
+
+    def to_q(self):
+        """All filters as one Q over BikeForSale (active listings only)"""
+        conditions = {"is_active": True}
+        if self.brand:
+            conditions["brand__iexact"] = self.brand
+        for name in ("year", "fuel_type", "owner_number"):
+            if getattr(self, name) is not None:
+                conditions[name] = getattr(self, name)
+        if self.cc is not None:
+            conditions["displacement_cc"] = self.cc
+
+        q = Q(**conditions)
+        for field, low, high in (
+            ("displacement_cc", self.min_cc, self.max_cc),
+            ("price", self.min_price, self.max_price),
+            ("kilometers", self.min_km, self.max_km),
+        ):
+            if low is not None:
+                q &= Q(**{f"{field}__gte": low})
+            if high is not None:
+                q &= Q(**{f"{field}__lte": high})
+
+        # Bands are half-open: lower bound inclusive, upper bound exclusive
+        for field, band, bounds in (
+            ("price", self.price_band, PRICE_BAND_BOUNDS),
+            ("displacement_cc", self.cc_band, CC_BAND_BOUNDS),
+        ):
+            if band is not None:
+                low, high = bounds[band]
+                if low is not None:
+                    q &= Q(**{f"{field}__gte": low})
+                if high is not None:
+                    q &= Q(**{f"{field}__lt": high})
+        return q
+
+    def queryset(self):
+        return BikeForSale.objects.filter(self.to_q())
@@ -0,0 +1,260 @@
+"""
+Typo-tolerant catalogue search with a trigram inverted index.
+
+Each distinct "brand name" phrase of an active listing, and each carousel
+Bike name, is a document. Words are padded ("  royal ") and split into
+trigrams; the index maps every trigram to the documents containing it.
+
+A query is answered in two steps:
+
+1. candidate generation - walk the posting lists of the query trigrams and
+   keep the documents with the best trigram overlap (Dice coefficient);
+2. re-ranking - score the candidates by word-level edit distance, so that
+   "royel enfeild" and "ktm duk" still land on the right bikes.
+
+Only the posting lists of the query trigrams are touched, never every row.
+
+The index is reloaded when the "listings" or "bikes" generation moves on
+without it, i.e. after a change committed by another worker.
+"""
+import heapq
+import math
+import re
+import threading
+from collections import Counter, defaultdict
+
+from .cache import Generations
+from .models import Bike, BikeForSale
+
+WORD = re.compile(r"\w+")
+
+EMPTY = frozenset()
+
+# Candidates kept after trigram overlap, before edit-distance re-ranking
+CANDIDATES = 50
+
+# Minimum share of query trigrams a candidate must contain
+MIN_OVERLAP = 0.3
+
+# Bumped by bikes.signals on every committed listing / carousel bike change
+FUZZY_GENERATIONS = Generations("listings", "bikes")
+
+# Minimum average word similarity (1 - normalised edit distance) to be returned
+MIN_SIMILARITY = 0.6
+
+
+def words(text):
+    return WORD.findall((text or "").lower())
+
+
+def trigrams(text):
+    """pg_trgm style trigrams: each word padded with two spaces before and one after"""
+    grams = set()
+    for word in words(text):
+        padded = f"  {word} "
+        grams.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return grams
+
+
+def edit_distance(a, b, limit=None):
+    """Levenshtein distance, giving up early once it exceeds ``limit``"""
+    if a == b:
+        return 0
+    if len(a) < len(b):
+        a, b = b, a
+    if limit is not None and len(a) - len(b) > limit:
+        return limit + 1
+    previous = list(range(len(b) + 1))
+    for i, char_a in enumerate(a, 1):
+        current = [i]
+        for j, char_b in enumerate(b, 1):
+            current.append(min(
+                previous[j] + 1,
+                current[j - 1] + 1,
+                previous[j - 1] + (char_a != char_b),
+            ))
+        if limit is not None and min(current) > limit:
+            return limit + 1
+        previous = current
+    return previous[-1]
+
+
+def word_similarity(query_word, doc_words):
+    """Best 1 - distance/length of ``query_word`` against any document word"""
+    best = 0.0
+    for doc_word in doc_words:
+        # A typed word is often a truncated one ("duk" for "duke"); compare it
+        # with the document word cut to roughly the same length as well
+        for target in {doc_word, doc_word[:len(query_word) + 1]}:
+            longest = max(len(query_word), len(target))
+            limit = longest - int(best * longest)
+            distance = edit_distance(query_word, target, limit)
+            best = max(best, 1 - distance / longest)
+            if best == 1.0:
+                return best
+    return best
+
+
+class FuzzyIndex:
+    """Per-process trigram index over listing and carousel bike names"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._postings = None  # trigram -> set of document ids
+        self._documents = {}  # document id -> {"text", "words", "grams", "refs"}
+        self._by_text = {}  # normalised text -> document id
+        self._by_ref = {}  # ("listing" | "bike", pk) -> document id
+        self._next_id = 0
+        self._generation = None
+
+    @property
+    def loaded(self):
+        return self._postings is not None
+
+    def load(self):
+        generation = FUZZY_GENERATIONS.read()
+        listings = BikeForSale.objects.filter(is_active=True).values_list("id", "brand", "name")
+        entries = [(("listing", pk), f"{brand} {name}") for pk, brand, name in listings.iterator(chunk_size=2000)]
+        entries += [(("bike", pk), name) for pk, name in Bike.objects.values_list("id", "name")]
+        self.build(entries, generation)
+
+    def build(self, entries, generation):
+        """
+        Replace the index with ``entries``, an iterable of (ref, text), read
+        at ``generation`` (a FUZZY_GENERATIONS stamp)
+        """
+        with self._lock:
+            self._clear()
+            self._postings = defaultdict(set)
+            for ref, text in entries:
+                self._add(ref, text)
+            self._generation = generation
+
+    def reset(self):
+        with self._lock:
+            self._clear()
+
+    def _clear(self):
+        self._postings = None
+        self._documents = {}
+        self._by_text = {}
+        self._by_ref = {}
+        self._next_id = 0
+        self._generation = None
+
+    def listing_changed(self, previous, current, generation):
+        """BikeForSale change hook (see bikes.signals.LISTING_INDEXES)"""
+        ref = ("listing", (current or previous)["id"])
+        text = f"{current['brand']} {current['name']}" if current and current.get("is_active") else None
+        self.update(ref, text, "listings", generation)
+
+    def update(self, ref, text, namespace, generation):
+        """
+        Point ``ref`` at the document for ``text`` (None removes it), a
+        change that bumped ``namespace`` to ``generation``
+        """
+        with self._lock:
+            stamp = FUZZY_GENERATIONS.advance(self._generation, namespace, generation)
+            if stamp is None:
+                return
+            self._generation = stamp
+            self._discard(ref)
+            if text:
+                self._add(ref, text)
+
+    def _add(self, ref, text):
+        key = " ".join(words(text))
+        if not key:
+            return
+        doc_id = self._by_text.get(key)
+        if doc_id is None:
+            doc_id = self._next_id
+            self._next_id += 1
+            grams = trigrams(key)
+            self._documents[doc_id] = {"text": text.strip(), "words": key.split(), "grams": len(grams), "refs": set()}
+            self._by_text[key] = doc_id
+            for gram in grams:
+                self._postings[gram].add(doc_id)
+        self._documents[doc_id]["refs"].add(ref)
+        self._by_ref[ref] = doc_id
+
+    def _discard(self, ref):
+        doc_id = self._by_ref.pop(ref, None)
+        if doc_id is None:
+            return
+        document = self._documents[doc_id]
+        document["refs"].discard(ref)
+        if document["refs"]:
+            return
+        key = " ".join(document["words"])
+        for gram in trigrams(key):
+            postings = self._postings.get(gram)
+            if postings is not None:
+                postings.discard(doc_id)
+                if not postings:
+                    del self._postings[gram]
+        del self._documents[doc_id]
+        del self._by_text[key]
+
+    def search(self, query, limit=10):
+        """
+        Best fuzzy matches for ``query`` as a list of
+        {"text", "score", "listings", "refs"} dicts, highest score first.
+        """
+        query_words = words(query)
+        query_grams = trigrams(query)
+        if not query_grams:
+            return []
+        if self._generation != FUZZY_GENERATIONS.read():
+            self.load()
+
+        with self._lock:
+            # A document sharing at least `needed` trigrams must appear in one of
+            # the (len - needed + 1) rarest posting lists, so only those are
+            # unioned; the long lists of common trigrams are only probed.
+            postings = sorted((self._postings.get(gram, EMPTY) for gram in query_grams), key=len)
+            needed = max(1, math.ceil(MIN_OVERLAP * len(postings)))
+            seeds = set().union(*postings[:len(postings) - needed + 1])
+
+            overlap = Counter()
+            for posting in postings:
+                overlap.update(seeds.intersection(posting))
+
+            scored = []
+            for doc_id, shared in overlap.items():
+                if shared >= needed:
+                    document = self._documents[doc_id]
+                    dice = 2 * shared / (len(postings) + document["grams"])
+                    scored.append((dice, len(document["refs"]), doc_id))
+            candidates = heapq.nlargest(CANDIDATES, scored)
+            documents = [(dice, self._documents[doc_id]) for dice, _, doc_id in candidates]
+
+            # Candidates share most of their words ("royal", "enfield"), so each
+            # (query word, document word) distance is computed once per query
+            similarities = {}
+
+            def similarity_to(word, doc_word):
+                key = (word, doc_word)
+                if key not in similarities:
+                    similarities[key] = word_similarity(word, [doc_word])
+                return similarities[key]
+
+            results = []
+            for dice, document in documents:
+                similarity = sum(
+                    max(similarity_to(word, doc_word) for doc_word in document["words"])
+                    for word in query_words
+                ) / len(query_words)
+                if similarity >= MIN_SIMILARITY:
+                    results.append({
+                        "text": document["text"],
+                        "score": round(similarity + 0.1 * dice, 4),
+                        "listings": len(document["refs"]),
+                        "refs": sorted(document["refs"]),
+                    })
+
+        results.sort(key=lambda result: (-result["score"], -result["listings"]))
+        return results[:limit]
+
+
+fuzzy_index = FuzzyIndex()
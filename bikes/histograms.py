@@ -0,0 +1,74 @@
+"""
+Price and kilometre histograms for the buy_bike range sliders.
+
+Each histogram counts active listings per fixed bucket under every applied
+filter *except* its own range (min_price/max_price for price, min_km/max_km
+for kilometres), so a slider always shows where the other values lie. All
+buckets of both histograms, plus the observed minimum and maximum, come
+from a single aggregate query with conditional counts.
+"""
+import math
+
+from django.db.models import Count, Max, Min, Q
+
+from .models import BikeForSale
+
+# Bucket edges: lower bound inclusive, upper bound exclusive, None = open ended
+PRICE_EDGES = [0, 25000, 50000, 75000, 100000, 150000, 200000, 300000, 500000, 1000000, None]
+KILOMETER_EDGES = [0, 5000, 10000, 20000, 30000, 50000, 75000, 100000, None]
+
+# histogram name -> (model field, spec lower bound, spec upper bound, bucket edges)
+HISTOGRAMS = {
+    "price": ("price", "min_price", "max_price", PRICE_EDGES),
+    "kilometers": ("kilometers", "min_km", "max_km", KILOMETER_EDGES),
+}
+
+SLIDER_FIELDS = tuple(name for _, low, high, _ in HISTOGRAMS.values() for name in (low, high))
+
+
+def _whole(value, rounding=math.floor):
+    return None if value is None else int(rounding(value))
+
+
+def histograms(spec):
+    """Bucketed price and kilometre counts for a ListingFilter"""
+    queryset = BikeForSale.objects.filter(spec.without(*SLIDER_FIELDS).to_q())
+
+    aggregates = {}
+    for name, (field, low_param, high_param, edges) in HISTOGRAMS.items():
+        # Every other slider's range still applies to this histogram
+        others = Q()
+        for other, (other_field, other_low, other_high, _) in HISTOGRAMS.items():
+            if other == name:
+                continue
+            if getattr(spec, other_low) is not None:
+                others &= Q(**{f"{other_field}__gte": getattr(spec, other_low)})
+            if getattr(spec, other_high) is not None:
+                others &= Q(**{f"{other_field}__lte": getattr(spec, other_high)})
+
+        aggregates[f"{name}_min"] = Min(field, filter=others)
+        aggregates[f"{name}_max"] = Max(field, filter=others)
+        for position, low in enumerate(edges[:-1]):
+            high = edges[position + 1]
+            bucket = Q(**{f"{field}__gte": low})
+            if high is not None:
+                bucket &= Q(**{f"{field}__lt": high})
+            aggregates[f"{name}_{position}"] = Count("id", filter=bucket & others)
+
+    totals = queryset.aggregate(**aggregates)
+
+    result = {}
+    for name, (_, low_param, high_param, edges) in HISTOGRAMS.items():
+        result[name] = {
+            "min": _whole(totals[f"{name}_min"]),
+            "max": _whole(totals[f"{name}_max"], math.ceil),
+            "selected": {
+                "min": _whole(getattr(spec, low_param)),
+                "max": _whole(getattr(spec, high_param), math.ceil),
+            },
+            "buckets": [
+                {"min": low, "max": edges[position + 1], "count": totals[f"{name}_{position}"]}
+                for position, low in enumerate(edges[:-1])
+            ],
+        }
+    return result
@@ -0,0 +1,26 @@
+"""
+Everything the home page renders, loaded together and cached as one
+snapshot. The home page is also the health check path, so a warm hit must
+not touch the database; bikes.signals invalidates the snapshot whenever one
+of the models shown here changes.
+"""
+from .cache import Snapshot
+from .content import content_registry
+from .models import Bike, BikeForSale, FeatureSection, RiderTrustSection, Testimonial
+
+# Models whose save/delete invalidates the snapshot
+HOMEPAGE_MODELS = (Bike, BikeForSale, FeatureSection, Testimonial, RiderTrustSection)
+
+
+def load_homepage():
+    """Home page context, with every queryset evaluated"""
+    return {
+        "bikes": list(Bike.objects.all()[:5]),
+        "bikes_for_sale": list(BikeForSale.objects.filter(is_featured=True, is_active=True)[:3]),
+        "feature": content_registry.get("feature"),
+        "testimonials": list(Testimonial.objects.all()[:3]),
+        "rider_section": content_registry.get("rider_section"),
+    }
+
+
+homepage_snapshot = Snapshot("homepage", load_homepage, timeout=None)
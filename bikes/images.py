@@ -0,0 +1,162 @@
+"""
+Responsive derivatives of uploaded photos.
+
+Each source image is resized with Pillow to a few named widths (thumb,
+card, detail, full) and saved as WebP and JPEG next to the original under
+``<upload dir>/derivatives/``. The result is described by a small dict
+stored on the model (e.g. BikeForSale.image_derivatives):
+
+    {
+        "source": "bikes_for_sale/r15.jpg",
+        "width": 4000, "height": 3000,
+        "variants": {
+            "card": {"width": 640, "height": 480,
+                     "webp": "bikes_for_sale/derivatives/r15-card.webp",
+                     "jpeg": "bikes_for_sale/derivatives/r15-card.jpg"},
+            ...
+        },
+    }
+
+srcset() and variant_url() turn that dict into template-ready values.
+"""
+import io
+import logging
+import posixpath
+
+from django.core.files.base import ContentFile
+from PIL import ExifTags, Image, ImageOps
+
+logger = logging.getLogger(__name__)
+
+# Name -> longest edge in pixels; sources are never upscaled
+DERIVATIVE_SIZES = {
+    "thumb": 160,
+    "card": 640,
+    "detail": 1280,
+    "full": 1920,
+}
+
+# EXIF orientations that exif_transpose turns by 90 degrees
+ROTATED = {5, 6, 7, 8}
+
+FORMATS = {
+    "webp": ("WEBP", "webp", {"quality": 80, "method": 4}),
+    "jpeg": ("JPEG", "jpg", {"quality": 82, "optimize": True, "progressive": True}),
+}
+
+
+def derivative_name(source_name, variant, extension):
+    directory, filename = posixpath.split(source_name)
+    stem = posixpath.splitext(filename)[0]
+    return posixpath.join(directory, "derivatives", f"{stem}-{variant}.{extension}")
+
+
+def encode_image(image, fmt):
+    pil_format, _, options = FORMATS[fmt]
+    if fmt == "jpeg" and image.mode != "RGB":
+        # JPEG has no alpha channel: flatten transparent PNG/WebP uploads on white
+        background = Image.new("RGB", image.size, "white")
+        rgba = image.convert("RGBA")
+        background.paste(rgba, mask=rgba.getchannel("A"))
+        image = background
+    buffer = io.BytesIO()
+    image.save(buffer, pil_format, **options)
+    return buffer.getvalue()
+
+
+class ImageTooLarge(ValueError):
+    """Raised when decoding an image would exceed the pixel budget"""
+
+
+def generate_derivatives(field_file, max_pixels=None):
+    """
+    Write every derivative of ``field_file`` (a stored FieldFile) to its
+    storage and return the description dict. A file Pillow cannot read, or
+    one that would decode to more than ``max_pixels``, gets no variants, so
+    templates fall back to the original.
+    """
+    storage = field_file.storage
+    try:
+        with storage.open(field_file.name, "rb") as source:
+            image = Image.open(source)
+            # The source size is recorded as uploaded, before draft() shrinks it
+            width, height = image.size
+            if image.getexif().get(ExifTags.Base.Orientation) in ROTATED:
+                width, height = height, width
+            # Decoding JPEGs at a reduced scale makes the largest resize cheap
+            image.draft("RGB", (DERIVATIVE_SIZES["full"], DERIVATIVE_SIZES["full"]))
+            if max_pixels and image.width * image.height > max_pixels:
+                raise ImageTooLarge(f"{image.width}x{image.height} exceeds {max_pixels} pixels")
+            image = ImageOps.exif_transpose(image)
+            image.load()
+    except (OSError, ValueError, Image.DecompressionBombError) as e:
+        logger.warning(f"Could not read image {field_file.name} for derivatives: {str(e)}")
+        return {"source": field_file.name, "variants": {}}
+
+    if image.mode not in ("RGB", "RGBA"):
+        image = image.convert("RGBA" if image.has_transparency_data else "RGB")
+
+    description = {"source": field_file.name, "width": width, "height": height, "variants": {}}
+    # Largest first, each resized from the previous one, which is much
+    # faster than resizing the original every time
+    resized = image
+    for variant, edge in sorted(DERIVATIVE_SIZES.items(), key=lambda item: -item[1]):
+        if max(resized.size) > edge:
+            resized = resized.copy()
+            resized.thumbnail((edge, edge), Image.Resampling.LANCZOS)
+        entry = {"width": resized.width, "height": resized.height}
+        for fmt, (_, extension, _) in FORMATS.items():
+            name = derivative_name(field_file.name, variant, extension)
+            if storage.exists(name):
+                storage.delete(name)
+            entry[fmt] = storage.save(name, ContentFile(encode_image(resized, fmt)))
+        description["variants"][variant] = entry
+    return description
+
+
+def derivatives_current(storage, source_name):
+    """True when every derivative file of ``source_name`` exists and is newer than it"""
+    try:
+        source_time = storage.get_modified_time(source_name)
+        for variant in DERIVATIVE_SIZES:
+            for _, extension, _ in FORMATS.values():
+                name = derivative_name(source_name, variant, extension)
+                if not storage.exists(name) or storage.get_modified_time(name) < source_time:
+                    return False
+    except (NotImplementedError, OSError):
+        return False
+    return True
+
+
+def derivative_files(description):
+    """Storage names of every derivative in a description dict"""
+    return [
+        entry[fmt]
+        for entry in (description or {}).get("variants", {}).values()
+        for fmt in FORMATS
+        if entry.get(fmt)
+    ]
+
+
+def delete_derivatives(storage, description, keep=()):
+    # Derivatives of a shared (content-addressed) source may belong to other
+    # rows too; collect_media removes them once nothing refers to them
+    if getattr(storage, "shared_files", False):
+        return
+    for name in derivative_files(description):
+        if name not in keep:
+            storage.delete(name)
+
+
+def variant_url(storage, description, variant, fmt="jpeg"):
+    entry = (description or {}).get("variants", {}).get(variant)
+    return storage.url(entry[fmt]) if entry and entry.get(fmt) else None
+
+
+def srcset(storage, description, fmt="webp"):
+    """``"url 160w, url 640w, ..."`` over the distinct derivative widths"""
+    candidates = {}
+    for entry in (description or {}).get("variants", {}).values():
+        if entry.get(fmt):
+            candidates.setdefault(entry["width"], storage.url(entry[fmt]))
+    return ", ".join(f"{url} {width}w" for width, url in sorted(candidates.items()))
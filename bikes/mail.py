@@ -0,0 +1,463 @@
+"""
+Contact form email: the messages and the outbox that delivers them.
+
+Views call enqueue_contact_emails() in the transaction that creates the
+ContactSubmission, so the submission and its emails are stored together
+and no SMTP work happens inside the request. deliver_outbox() leases a
+batch of due rows, sends them through the process's MailDispatcher and
+reschedules failures with exponential backoff, giving up after
+OUTBOX_MAX_ATTEMPTS. It runs either in "manage.py send_outbox", a worker
+process of its own (OUTBOX_DRAIN = "worker"), or in a background thread of
+each web process (OUTBOX_DRAIN = "web", see OutboxDrainer) for hosts where
+no separate process can reach the database.
+
+With CONTACT_ADMIN_DIGEST_SIZE above 1, admin notifications wait until
+that many are due (or the oldest has waited CONTACT_ADMIN_DIGEST_WAIT
+seconds) and go out as one digest email.
+
+Every message is multipart/alternative (plain text plus HTML). Subject and
+bodies come from the active ContactEmailTemplate of the message's type,
+falling back to the files in templates/emails/, and are compiled once per
+process by email_templates until a template is saved or deleted.
+"""
+import logging
+import smtplib
+import threading
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.mail import EmailMultiAlternatives, get_connection
+from django.db import close_old_connections, transaction
+from django.template import Context, Template
+from django.template.loader import get_template
+from django.utils import timezone
+
+from .cache import bump_generation, get_generation, shared_cache
+from .forms import ContactForm
+from .models import ContactEmailTemplate, ContactSubmission, EmailOutbox
+
+logger = logging.getLogger(__name__)
+
+
+def email_context(submission):
+    """Template context for the emails about ``submission``"""
+    return {
+        'name': submission.name,
+        'email': submission.email,
+        'phone': submission.phone or 'Not provided',
+        'reason': submission.reason,
+        'reason_display': dict(ContactForm.REASON_CHOICES)[submission.reason],
+        'source': submission.source or 'Not specified',
+        'source_display': dict(ContactForm.SOURCE_CHOICES).get(submission.source or '', 'Not specified'),
+        'message': submission.message,
+        'submission_date': submission.created_at,
+        'submission_id': str(submission.id),
+    }
+
+
+def get_user_email_subject(reason):
+    """Get customized email subject for user confirmation"""
+    subjects = {
+        'general_enquiry': 'Thank you for contacting Drive RP',
+        'buy_bike': 'Thank you for your interest in buying a bike - Drive RP',
+        'sell_bike': 'Thank you for choosing Drive RP to sell your bike',
+        'exchange_bike': 'Thank you for your bike exchange inquiry - Drive RP',
+        'rto_service': 'Thank you for your RTO service inquiry - Drive RP',
+        'others': 'Thank you for contacting Drive RP',
+    }
+    return subjects.get(reason, 'Thank you for contacting Drive RP')
+
+
+class CompiledEmail:
+    """Subject, text and HTML templates of one email type, compiled"""
+
+    def __init__(self, subject, text, html):
+        self.subject = subject
+        self.text = text
+        self.html = html
+
+    def render(self, context):
+        plain = Context(context, autoescape=False)
+        # Headers cannot contain newlines
+        subject = " ".join(self.subject.render(plain).split())
+        return subject, self.text.render(plain), self.html.render(Context(context))
+
+
+# Template type -> (subject, text file, HTML file) used without an active
+# ContactEmailTemplate; default_subject is set by the message builder
+FILE_TEMPLATES = {
+    'admin_notification': (
+        "{{ default_subject }}",
+        'emails/contact_admin_notification.txt',
+        'emails/contact_admin_notification.html',
+    ),
+    'confirmation': (
+        "{{ default_subject }}",
+        'emails/contact_user_confirmation.txt',
+        'emails/contact_user_confirmation.html',
+    ),
+    'admin_digest': (
+        "{{ submissions|length }} New Inquiries - Drive RP",
+        'emails/contact_admin_digest.txt',
+        'emails/contact_admin_digest.html',
+    ),
+}
+
+
+class EmailTemplates:
+    """
+    CompiledEmail per template type, built from the most recently updated
+    active ContactEmailTemplate of that type (or FILE_TEMPLATES) on first
+    use and kept in process memory. Saving or deleting a template bumps
+    the generation (bikes.signals); EMAIL_TEMPLATE_MAX_AGE bounds how long
+    a process without a shared cache keeps using an old one.
+    """
+
+    namespace = "email_templates"
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._compiled = {}
+        self._generation = None
+        self._loaded_at = 0
+
+    def get(self, template_type):
+        generation = get_generation(self.namespace)
+        with self._lock:
+            expired = time.monotonic() - self._loaded_at > getattr(settings, 'EMAIL_TEMPLATE_MAX_AGE', 300)
+            if generation != self._generation or expired:
+                self._compiled = {}
+                self._generation = generation
+                self._loaded_at = time.monotonic()
+            if template_type not in self._compiled:
+                self._compiled[template_type] = self._compile(template_type)
+            return self._compiled[template_type]
+
+    def _compile(self, template_type):
+        row = (
+            ContactEmailTemplate.objects.filter(template_type=template_type, is_active=True)
+            .order_by('-updated_at')
+            .first()
+        )
+        if row is not None:
+            return CompiledEmail(Template(row.subject), Template(row.body_text), Template(row.body_html))
+        subject, text, html = FILE_TEMPLATES[template_type]
+        return CompiledEmail(Template(subject), get_template(text).template, get_template(html).template)
+
+    def invalidate(self):
+        bump_generation(self.namespace)
+        with self._lock:
+            self._compiled = {}
+
+
+email_templates = EmailTemplates()
+
+
+def build_email(template_type, context, to, reply_to=None):
+    subject, text, html = email_templates.get(template_type).render(context)
+    message = EmailMultiAlternatives(
+        subject=subject,
+        body=text,
+        from_email=settings.DEFAULT_FROM_EMAIL,
+        to=to,
+        reply_to=reply_to
+    )
+    message.attach_alternative(html, "text/html")
+    return message
+
+
+def build_admin_notification(submission):
+    """Notification email to admin"""
+    context = email_context(submission)
+    context['default_subject'] = f"New {context['reason_display']} Inquiry - Drive RP"
+    return build_email(
+        'admin_notification', context,
+        to=[getattr(settings, 'CONTACT_EMAIL', 'admin@driverp.in')],
+        reply_to=[context['email']]
+    )
+
+
+def build_user_confirmation(submission):
+    """Confirmation email to user"""
+    context = email_context(submission)
+    context['default_subject'] = get_user_email_subject(submission.reason)
+    return build_email('confirmation', context, to=[context['email']])
+
+
+def build_admin_digest(submissions):
+    """One notification email to admin covering several submissions"""
+    contexts = [email_context(submission) for submission in submissions]
+    return build_email(
+        'admin_digest', {'submissions': contexts},
+        to=[getattr(settings, 'CONTACT_EMAIL', 'admin@driverp.in')],
+        reply_to=[context['email'] for context in contexts]
+    )
+
+
+BUILDERS = {
+    'admin_notification': build_admin_notification,
+    'confirmation': build_user_confirmation,
+}
+
+
+# The server (or the network) dropped the session: worth reconnecting
+CONNECTION_ERRORS = (smtplib.SMTPServerDisconnected, smtplib.SMTPConnectError, ConnectionError, TimeoutError)
+
+
+class MailDispatcher:
+    """
+    One long-lived email connection per process, shared by every message it
+    sends. A connection that has been idle for MAIL_CONNECTION_IDLE seconds
+    (SMTP servers drop quiet sessions) or that fails mid-send is replaced,
+    retrying the message once. Counters are kept per process and, for a
+    view across workers, in the shared cache.
+    """
+
+    COUNTERS = ("connections", "reconnects", "messages", "failures")
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.connection = None
+        self.last_used = 0
+        self.counts = dict.fromkeys(self.COUNTERS, 0)
+
+    def send(self, messages):
+        """Send ``messages`` in order; returns the exception raised for each, None if it was sent"""
+        with self._lock:
+            self.close_if_idle()
+            results = []
+            for message in messages:
+                error = self._send(message)
+                results.append(error)
+                if error is not None and self.connection is None:
+                    # Could not (re)connect: the rest would fail the same way
+                    results += [error] * (len(messages) - len(results))
+                    break
+            self.last_used = time.monotonic()
+            return results
+
+    def _send(self, message):
+        for attempt in range(2):
+            try:
+                if self.connection is None:
+                    self._open()
+                self.connection.send_messages([message])
+            except CONNECTION_ERRORS as e:
+                self.close()
+                if attempt:
+                    self._count("failures")
+                    return e
+                self._count("reconnects")
+                continue
+            except Exception as e:
+                self._count("failures")
+                return e
+            self._count("messages")
+            return None
+
+    def _open(self):
+        connection = get_connection()
+        connection.open()
+        self.connection = connection
+        self._count("connections")
+
+    def close(self):
+        if self.connection is not None:
+            try:
+                self.connection.close()
+            except Exception:
+                pass
+            self.connection = None
+
+    def close_if_idle(self):
+        if self.connection is not None and time.monotonic() - self.last_used > getattr(settings, 'MAIL_CONNECTION_IDLE', 60):
+            self.close()
+
+    def _count(self, counter):
+        self.counts[counter] += 1
+        cache = shared_cache()
+        key = f"bikes:mail:stats:{counter}"
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.add(key, 1, timeout=None)
+
+    def stats(self):
+        shared = shared_cache().get_many([f"bikes:mail:stats:{counter}" for counter in self.COUNTERS])
+        shared = {counter: shared.get(f"bikes:mail:stats:{counter}", 0) for counter in self.COUNTERS}
+        return {
+            "process": dict(self.counts),
+            "shared": shared,
+            "messages_per_connection": (
+                round(shared["messages"] / shared["connections"], 2) if shared["connections"] else None
+            ),
+        }
+
+
+dispatcher = MailDispatcher()
+
+
+def enqueue_contact_emails(*submissions):
+    """Queue the admin notification and user confirmation of each submission; call inside their transaction"""
+    EmailOutbox.objects.bulk_create(
+        [EmailOutbox(submission=submission, kind=kind) for submission in submissions for kind in BUILDERS],
+        batch_size=getattr(settings, 'BULK_CONTACT_BATCH_SIZE', 500),
+    )
+    transaction.on_commit(outbox_drainer.wake)
+
+
+def retry_delay(attempts):
+    base = getattr(settings, 'OUTBOX_RETRY_BASE', 30)
+    return timedelta(seconds=min(base * 2 ** (attempts - 1), getattr(settings, 'OUTBOX_RETRY_MAX', 3600)))
+
+
+def claim_batch(size, exclude_kinds=()):
+    """
+    Up to ``size`` due messages, leased to this worker: their
+    next_attempt_at moves past the lease, so no other worker claims them
+    while they are being sent (or after a crash, before the lease ends)
+    """
+    now = timezone.now()
+    lease = now + timedelta(seconds=getattr(settings, 'OUTBOX_LEASE', 300))
+    with transaction.atomic():
+        due = list(
+            EmailOutbox.objects.select_for_update(skip_locked=True)
+            .filter(status='pending', next_attempt_at__lte=now)
+            .exclude(kind__in=exclude_kinds)
+            .order_by('next_attempt_at')
+            .values_list('id', flat=True)[:size]
+        )
+        # The conditional update is what makes the claim exclusive on
+        # databases without row locks (SQLite)
+        EmailOutbox.objects.filter(id__in=due, status='pending', next_attempt_at__lte=now).update(next_attempt_at=lease)
+    return list(
+        EmailOutbox.objects.filter(id__in=due, next_attempt_at=lease)
+        .select_related('submission')
+        .order_by('created_at')
+    )
+
+
+def record_failure(item, error):
+    item.attempts += 1
+    item.last_error = str(error)
+    if item.attempts >= getattr(settings, 'OUTBOX_MAX_ATTEMPTS', 8):
+        item.status = 'failed'
+        logger.error(f"Giving up on {item.kind} email for submission {item.submission_id}: {str(error)}")
+    else:
+        item.next_attempt_at = timezone.now() + retry_delay(item.attempts)
+        logger.warning(f"Error sending {item.kind} email for submission {item.submission_id} "
+                       f"(attempt {item.attempts}): {str(error)}")
+    item.save(update_fields=['attempts', 'last_error', 'status', 'next_attempt_at'])
+
+
+def digest_due(size):
+    """True once enough admin notifications are due for a digest, or the oldest has waited long enough"""
+    now = timezone.now()
+    due = EmailOutbox.objects.filter(kind='admin_notification', status='pending', next_attempt_at__lte=now)
+    oldest = due.order_by('created_at').values_list('created_at', flat=True).first()
+    if oldest is None:
+        return False
+    waited = now - oldest >= timedelta(seconds=getattr(settings, 'CONTACT_ADMIN_DIGEST_WAIT', 900))
+    return waited or due.count() >= size
+
+
+def deliver_outbox(batch_size=None):
+    """Send one batch of due outbox messages; returns (sent, failed)"""
+    digest_size = getattr(settings, 'CONTACT_ADMIN_DIGEST_SIZE', 1)
+    digest = digest_size > 1
+    held = () if not digest or digest_due(digest_size) else ('admin_notification',)
+    batch = claim_batch(batch_size or getattr(settings, 'OUTBOX_BATCH_SIZE', 50), exclude_kinds=held)
+    if not batch:
+        return 0, 0
+
+    # (outbox rows, builder of the one message covering them)
+    units = []
+    admin = [item for item in batch if digest and item.kind == 'admin_notification']
+    for start in range(0, len(admin), digest_size):
+        group = admin[start:start + digest_size]
+        units.append((group, lambda group=group: build_admin_digest([item.submission for item in group])))
+    units += [
+        ([item], lambda item=item: BUILDERS[item.kind](item.submission))
+        for item in batch if item not in admin
+    ]
+
+    messages = []
+    for items, build in units:
+        try:
+            messages.append((items, build()))
+        except Exception as e:
+            for item in items:
+                record_failure(item, e)
+
+    sent = []
+    results = dispatcher.send([message for _, message in messages])
+    for (items, _), error in zip(messages, results):
+        if error is None:
+            sent += [item.id for item in items]
+        else:
+            for item in items:
+                record_failure(item, error)
+
+    now = timezone.now()
+    EmailOutbox.objects.filter(id__in=sent).update(status='sent', sent_at=now, last_error='')
+    # A submission counts as emailed once all of its messages have gone out
+    ContactSubmission.objects.filter(
+        id__in={item.submission_id for item in batch if item.id in sent}, email_sent=False
+    ).exclude(outbox_messages__status__in=['pending', 'failed']).update(email_sent=True, email_sent_at=now)
+    logger.info(f"Outbox batch: {len(sent)} sent, {len(batch) - len(sent)} failed")
+    return len(sent), len(batch) - len(sent)
+
+
+def drain_outbox(batch_size=None):
+    """Send batches until nothing is due; returns (sent, failed)"""
+    total_sent = total_failed = 0
+    while True:
+        sent, failed = deliver_outbox(batch_size)
+        if not (sent or failed):
+            return total_sent, total_failed
+        total_sent += sent
+        total_failed += failed
+
+
+class OutboxDrainer:
+    """
+    Delivers the outbox from inside a web process (OUTBOX_DRAIN = "web").
+    A daemon thread, started by the first committed submission, drains it
+    whenever wake() is called and otherwise every OUTBOX_DRAIN_INTERVAL
+    seconds, for retries that have come due. Leases (claim_batch) keep the
+    threads of several processes from sending the same message.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._thread = None
+
+    @property
+    def enabled(self):
+        return getattr(settings, 'OUTBOX_DRAIN', 'worker') == 'web'
+
+    def wake(self):
+        if not self.enabled:
+            return
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name='outbox-drainer', daemon=True)
+                self._thread.start()
+        self._wake.set()
+
+    def _run(self):
+        while True:
+            self._wake.wait(getattr(settings, 'OUTBOX_DRAIN_INTERVAL', 60))
+            self._wake.clear()
+            try:
+                drain_outbox()
+            except Exception:
+                logger.exception("Outbox drain failed")
+            finally:
+                close_old_connections()
+                dispatcher.close_if_idle()
+
+
+outbox_drainer = OutboxDrainer()
@@ -0,0 +1,31 @@
+"""
+Worker side of backfill_derivatives.
+
+Kept apart from the command so a spawned worker can unpickle generate()
+without importing the models before django.setup() has run.
+"""
+import django
+from django.apps import apps
+
+from bikes.images import generate_derivatives
+
+
+def init_worker():
+    # max_tasks_per_child makes the pool spawn its workers
+    django.setup()
+
+
+def generate(task, max_pixels=None):
+    """
+    Write the derivatives of one stored image. Returns the task, its
+    description, the source size in bytes and, when the source is missing
+    or the derivatives cannot be written, an error message instead
+    """
+    label, field_name, pk, source = task
+    field = apps.get_model(label)._meta.get_field(field_name)
+    try:
+        source_size = field.storage.size(source)
+        description = generate_derivatives(field.attr_class(None, field, source), max_pixels=max_pixels)
+    except OSError as e:
+        return task, None, 0, f"{type(e).__name__}: {str(e)}"
+    return task, description, source_size, None
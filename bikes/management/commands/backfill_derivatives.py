@@ -0,0 +1,161 @@
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import ExitStack
+from functools import partial
+
+from django.apps import apps
+from django.core.exceptions import FieldDoesNotExist
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections, models, transaction
+
+from bikes.homepage import homepage_snapshot
+from bikes.images import delete_derivatives, derivative_files, derivatives_current
+from bikes.signals import listing_pages_changed
+
+from ._derivatives import generate, init_worker
+
+# Rows whose stored derivative descriptions are written per transaction
+UPDATE_BATCH = 200
+
+
+def derivatives_field(model, field):
+    """Name of the JSONField holding ``field``'s derivative description, if the model has one"""
+    try:
+        return model._meta.get_field(f"{field.name}_derivatives").name
+    except FieldDoesNotExist:
+        return None
+
+
+class Command(BaseCommand):
+    help = "Generate missing or stale image derivatives for every ImageField of the bikes models"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--model", action="append", default=[],
+                            help="Only this model (e.g. BikeForSale); may be repeated")
+        parser.add_argument("--workers", type=int, default=os.cpu_count(),
+                            help="Resize processes (1 resizes in this process)")
+        parser.add_argument("--max-megapixels", type=float, default=50,
+                            help="Largest image a worker decodes; bigger ones are skipped")
+        parser.add_argument("--tasks-per-child", type=int, default=100,
+                            help="Images a worker processes before it is replaced, returning its memory")
+        parser.add_argument("--force", action="store_true", help="Regenerate derivatives that are up to date")
+
+    def handle(self, *args, **options):
+        tasks, current, descriptions = self.collect_tasks(options["model"], options["force"])
+        self.stdout.write(f"{len(tasks)} images to process, {current} up to date")
+        if not tasks:
+            return
+
+        generated = failed = 0
+        size = 0
+        pending = {}
+        started = time.perf_counter()
+        # Checked after JPEG draft mode has picked a reduced decode size, so a
+        # huge JPEG still fits while a huge PNG is skipped
+        work = partial(generate, max_pixels=int(options["max_megapixels"] * 1_000_000))
+        with ExitStack() as stack:
+            if options["workers"] <= 1:
+                results = map(work, tasks)
+            else:
+                # Workers never touch the database, but must not inherit the
+                # parent's connection if the platform forks them
+                connections.close_all()
+                pool = stack.enter_context(ProcessPoolExecutor(
+                    max_workers=min(options["workers"], len(tasks)),
+                    initializer=init_worker,
+                    max_tasks_per_child=options["tasks_per_child"],
+                ))
+                results = pool.map(work, tasks, chunksize=4)
+
+            for task, description, source_size, error in results:
+                label, field_name, pk, source = task
+                if error:
+                    # Missing or unreadable source: leave the row as it is
+                    failed += 1
+                    self.stderr.write(f"Skipped {label}.{field_name} #{pk}: {source}: {error}")
+                    continue
+                if not description["variants"]:
+                    # Too large or unreadable: the stored description (and
+                    # the derivatives it names, if any) is kept as it is
+                    failed += 1
+                    self.stderr.write(f"Skipped {label}.{field_name} #{pk}: {source} could not be resized")
+                else:
+                    generated += 1
+                    size += source_size
+                    if descriptions.get(task) is not None:
+                        pending[task] = description
+                        if len(pending) >= UPDATE_BATCH:
+                            self.store(pending, descriptions)
+                if (generated + failed) % 100 == 0:
+                    self.report(generated + failed, len(tasks), size, started)
+        self.store(pending, descriptions)
+
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(
+            f"Generated derivatives for {generated} images in {elapsed:.1f}s "
+            f"({generated / elapsed:.1f} images/s, {size / elapsed / 1_000_000:.1f} MB/s of sources), "
+            f"{failed} failed"
+        ))
+
+    def collect_tasks(self, only, force):
+        """
+        Every stored image that needs derivatives, the number already up to
+        date, and for fields backed by a ``<field>_derivatives`` column the
+        stored description of each task's row
+        """
+        config = apps.get_app_config("bikes")
+        selected = [config.get_model(name) for name in only] if only else list(config.get_models())
+        if not selected:
+            raise CommandError("No models selected")
+
+        tasks = []
+        descriptions = {}
+        current = 0
+        for model in selected:
+            for field in model._meta.fields:
+                if not isinstance(field, models.ImageField):
+                    continue
+                stored = derivatives_field(model, field)
+                columns = ["pk", field.name] + ([stored] if stored else [])
+                rows = model._default_manager.exclude(**{field.name: ""}).exclude(**{f"{field.name}__isnull": True})
+                for row in rows.values_list(*columns).iterator():
+                    pk, source = row[0], row[1]
+                    description = (row[2] or {}) if stored else None
+                    if not force and derivatives_current(field.storage, source) and (
+                        description is None or (description.get("source") == source and description.get("variants"))
+                    ):
+                        current += 1
+                        continue
+                    task = (model._meta.label, field.name, pk, source)
+                    tasks.append(task)
+                    descriptions[task] = description
+        return tasks, current, descriptions
+
+    def store(self, pending, descriptions):
+        """Save finished descriptions on their rows and drop derivatives no longer referenced"""
+        if not pending:
+            return
+        with transaction.atomic():
+            for (label, field_name, pk, source), description in pending.items():
+                model = apps.get_model(label)
+                # Only rows still pointing at the same image: a replacement
+                # uploaded meanwhile has made its own derivatives on save
+                model._default_manager.filter(pk=pk, **{field_name: source}).update(
+                    **{f"{field_name}_derivatives": description}
+                )
+        for task, description in pending.items():
+            field = apps.get_model(task[0])._meta.get_field(task[1])
+            delete_derivatives(field.storage, descriptions[task], keep=derivative_files(description))
+
+        # Listing pages and snapshots embed the derivative URLs, and update()
+        # sends no signals; the shared cache carries this to every worker
+        listings = [pk for label, _, pk, _ in pending if label == "bikes.BikeForSale"]
+        if listings:
+            listing_pages_changed(*listings)
+            homepage_snapshot.invalidate()
+        pending.clear()
+
+    def report(self, done, total, size, started):
+        elapsed = time.perf_counter() - started
+        self.stdout.write(f"  {done}/{total}  {done / elapsed:.1f} images/s  {size / elapsed / 1_000_000:.1f} MB/s")
@@ -0,0 +1,191 @@
+import hashlib
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from urllib.parse import urlencode
+
+import django
+from django.conf import settings
+from django.contrib.auth.models import AnonymousUser
+from django.core.management.base import BaseCommand
+from django.db import connections
+from django.template.utils import get_app_template_dirs
+from django.test import RequestFactory
+from django.urls import resolve, reverse
+
+from bikes.filters import ListingFilter
+from bikes.models import (
+    AboutSection, ApproachImage, ApproachSection, Bike, BikeForSale, FeatureSection,
+    MissionSection, RiderTrustSection, Testimonial,
+)
+from bikes.pagination import KeysetPaginator
+
+MANIFEST = "manifest.json"
+
+
+def digest(*parts):
+    return hashlib.md5(repr(parts).encode("utf-8")).hexdigest()
+
+
+def rows(queryset):
+    """Every field of every row, in primary key order, for fingerprinting"""
+    return list(queryset.order_by("pk").values_list())
+
+
+def templates_fingerprint():
+    """Changes whenever any template file does, so a redesign re-bakes every page"""
+    files = []
+    for directory in [*settings.TEMPLATES[0]["DIRS"], *get_app_template_dirs("templates")]:
+        for path in sorted(Path(directory).rglob("*.html")):
+            stat = path.stat()
+            files.append((str(path), stat.st_mtime_ns, stat.st_size))
+    return digest(files)
+
+
+def output_file(path):
+    """Where the page for URL ``path`` is written, relative to the bake root"""
+    relative = path.strip("/")
+    return f"{relative}/index.html" if relative else "index.html"
+
+
+def page_path(path, number):
+    """URL of baked listing page ``number``; a static server cannot see ``?after=`` cursors"""
+    return f"{path.rstrip('/')}/page/{number}/"
+
+
+def init_worker():
+    # Needed when the pool spawns instead of forking; a no-op otherwise
+    django.setup()
+
+
+def render_page(task):
+    """Render one page in a worker process and write it under the bake root"""
+    path, query, relative, root, links = task
+    request = RequestFactory().get(path, query)
+    request.user = AnonymousUser()
+    match = resolve(path)
+    response = match.func(request, *match.args, **match.kwargs)
+    if response.status_code != 200:
+        return relative, response.status_code
+
+    content = response.content
+    # Cursor links to other baked pages become their static paths; the rest
+    # (filters, pages past the last baked one) stay on the dynamic view
+    for href, baked in links.items():
+        content = content.replace(f'href="{href}"'.encode("utf-8"), f'href="{baked}"'.encode("utf-8"))
+
+    target = Path(root) / relative
+    target.parent.mkdir(parents=True, exist_ok=True)
+    partial = target.with_name(f".{target.name}.{os.getpid()}")
+    partial.write_bytes(content)
+    os.replace(partial, target)
+    return relative, response.status_code
+
+
+class Command(BaseCommand):
+    help = "Pre-render home, about, buy_bike and every active bike_detail page to static HTML"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--output", default=str(getattr(settings, "BAKE_ROOT", settings.BASE_DIR / "baked")),
+                            help="Directory the HTML files are written to")
+        parser.add_argument("--buy-bike-pages", type=int, default=getattr(settings, "BAKE_BUY_BIKE_PAGES", 5),
+                            help="Number of buy_bike pages to bake")
+        parser.add_argument("--workers", type=int, default=os.cpu_count(),
+                            help="Render processes (1 renders in this process)")
+        parser.add_argument("--force", action="store_true", help="Re-render pages even if unchanged")
+
+    def handle(self, *args, **options):
+        root = Path(options["output"])
+        root.mkdir(parents=True, exist_ok=True)
+        manifest_path = root / MANIFEST
+        previous = {} if options["force"] or not manifest_path.exists() else json.loads(manifest_path.read_text())
+
+        pages = self.collect_pages(options["buy_bike_pages"])
+        tasks = [
+            (path, query, relative, str(root), links)
+            for relative, (path, query, fingerprint, links) in pages.items()
+            if previous.get(relative) != fingerprint
+        ]
+
+        rendered = {}
+        if tasks:
+            if options["workers"] <= 1:
+                results = list(map(render_page, tasks))
+            else:
+                # Forked workers must not share the parent's database connection
+                connections.close_all()
+                with ProcessPoolExecutor(max_workers=min(options["workers"], len(tasks)),
+                                         initializer=init_worker) as pool:
+                    results = list(pool.map(render_page, tasks, chunksize=8))
+            for relative, status in results:
+                if status == 200:
+                    rendered[relative] = pages[relative][2]
+                else:
+                    self.stderr.write(f"Skipped {relative}: HTTP {status}")
+
+        # Pages that no longer exist (deactivated or deleted listings, fewer
+        # buy_bike pages) are removed so the proxy stops serving them
+        removed = 0
+        for relative in set(previous) - set(pages):
+            (root / relative).unlink(missing_ok=True)
+            removed += 1
+
+        manifest = {relative: fingerprint for relative, fingerprint in previous.items() if relative in pages}
+        manifest.update(rendered)
+        manifest_path.write_text(json.dumps(manifest, indent=1, sort_keys=True))
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Baked {len(rendered)} pages, {len(pages) - len(tasks)} unchanged, {removed} removed, "
+            f"{len(tasks) - len(rendered)} failed"
+        ))
+
+    def collect_pages(self, buy_bike_pages):
+        """{output file: (URL path, query, fingerprint of the data the page shows, {href: baked href})}"""
+        templates = templates_fingerprint()
+        listings = {row[0]: digest(row) for row in rows(BikeForSale.objects.filter(is_active=True))}
+        all_listings = digest(templates, sorted(listings.items()))
+
+        pages = {
+            output_file(reverse("home")): (reverse("home"), {}, digest(
+                templates,
+                rows(Bike.objects.all()),
+                rows(BikeForSale.objects.filter(is_featured=True, is_active=True)),
+                rows(Testimonial.objects.all()),
+                rows(FeatureSection.objects.all()),
+                rows(RiderTrustSection.objects.all()),
+            ), {}),
+            output_file(reverse("about")): (reverse("about"), {}, digest(
+                templates,
+                rows(AboutSection.objects.all()),
+                rows(MissionSection.objects.all()),
+                rows(ApproachSection.objects.all()),
+                rows(ApproachImage.objects.all()),
+            ), {}),
+        }
+
+        for pk, fingerprint in listings.items():
+            path = reverse("bike_detail", args=[pk])
+            pages[output_file(path)] = (path, {}, digest(templates, fingerprint), {})
+
+        # buy_bike pages hold facet counts over every listing, so any change
+        # re-bakes them; their cursors are walked here, in order. They are
+        # baked as buy-bike/page/N/ and linked to each other by that path:
+        # /buy-bike/ itself depends on its query string and is left dynamic
+        spec = ListingFilter()
+        paginator = KeysetPaginator(spec.queryset(), spec.ordering,
+                                    per_page=getattr(settings, "BUY_BIKE_PAGE_SIZE", 24))
+        path = reverse("buy_bike")
+        query = {}
+        for number in range(1, buy_bike_pages + 1):
+            page = paginator.page(after=query.get("after"))
+            links = {}
+            if number > 1:
+                links[f"{path}?{urlencode({'before': page.previous_cursor})}"] = page_path(path, number - 1)
+            if page.has_next and number < buy_bike_pages:
+                links[f"{path}?{urlencode({'after': page.next_cursor})}"] = page_path(path, number + 1)
+            pages[output_file(page_path(path, number))] = (path, query, all_listings, links)
+            if not page.has_next:
+                break
+            query = {"after": page.next_cursor}
+        return pages
@@ -0,0 +1,67 @@
+import random
+import statistics
+import time
+
+from django.core.management.base import BaseCommand
+
+from bikes.fuzzy import FuzzyIndex
+
+BRANDS = {
+    "Royal Enfield": ["Classic 350", "Bullet 350", "Hunter 350", "Meteor 350", "Himalayan", "Interceptor 650"],
+    "Honda": ["Shine", "Unicorn", "Activa 6G", "SP 125", "Hornet 2.0", "CB350"],
+    "Yamaha": ["FZ-S", "R15 V4", "MT-15", "Fascino", "Ray ZR", "Aerox 155"],
+    "KTM": ["Duke 390", "Duke 200", "Duke 125", "RC 390", "Adventure 390"],
+    "Bajaj": ["Pulsar 150", "Pulsar NS200", "Dominar 400", "Platina", "Avenger 220"],
+    "TVS": ["Apache RTR 160", "Jupiter", "Raider 125", "Ntorq 125", "Ronin"],
+    "Suzuki": ["Access 125", "Gixxer SF", "Burgman Street", "V-Strom SX"],
+    "Hero": ["Splendor Plus", "HF Deluxe", "Glamour", "Xpulse 200", "Passion Pro"],
+}
+
+QUERIES = [
+    "royel enfeild", "royal enfield clasic", "yamha", "ktm duk", "pulsr ns 200",
+    "splender plus", "apachi rtr", "himalyan", "hornet", "acess 125",
+]
+
+
+class Command(BaseCommand):
+    help = "Benchmark the trigram fuzzy search index on synthetic listings"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--sizes", nargs="+", type=int, default=[10000, 100000],
+                            help="Numbers of synthetic listings to index")
+        parser.add_argument("--repeat", type=int, default=50, help="Times each query is run")
+        parser.add_argument("--seed", type=int, default=7)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options["seed"])
+        for size in options["sizes"]:
+            entries = []
+            for pk in range(size):
+                brand = rng.choice(list(BRANDS))
+                name = rng.choice(BRANDS[brand])
+                # Some dealers add trims/editions, which makes names distinct
+                if rng.random() < 0.3:
+                    name = f"{name} {rng.choice(['Edition', 'Special', 'Dual Tone', 'BS6'])} {rng.randint(1, 400)}"
+                entries.append((("listing", pk), f"{brand} {name}"))
+
+            index = FuzzyIndex()
+            started = time.perf_counter()
+            index.build(entries)
+            build_ms = (time.perf_counter() - started) * 1000
+
+            timings = []
+            for _ in range(options["repeat"]):
+                for query in QUERIES:
+                    started = time.perf_counter()
+                    index.search(query)
+                    timings.append((time.perf_counter() - started) * 1000)
+            timings.sort()
+
+            self.stdout.write(
+                f"{size:>7} listings, {len(index._documents):>6} documents: "
+                f"build {build_ms:.0f} ms, query p50 {statistics.median(timings):.2f} ms, "
+                f"p99 {timings[int(len(timings) * 0.99) - 1]:.2f} ms"
+            )
+            for query in QUERIES:
+                best = index.search(query, limit=1)
+                self.stdout.write(f"    {query!r:24} -> {best[0]['text'] if best else '(no match)'}")
@@ -0,0 +1,102 @@
+import random
+import statistics
+import time
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from bikes.columnar import listing_snapshot
+from bikes.facets import facet_index
+from bikes.filters import ListingFilter
+from bikes.models import BikeForSale
+from bikes.views import listing_results
+
+from .benchmark_fuzzy import BRANDS
+
+QUERIES = [
+    {},
+    {"brand": "honda"},
+    {"brand": "royal enfield", "sort": "price_low"},
+    {"year": "2021", "fuel_type": "petrol"},
+    {"price_band": "50k_1l", "owner_number": "1st"},
+    {"min_price": "60000", "max_price": "150000", "sort": "price_high"},
+    {"cc_band": "125_200", "min_km": "5000", "max_km": "40000"},
+    {"brand": "ktm", "min_cc": "200", "max_cc": "400"},
+]
+
+
+class Rollback(Exception):
+    """Raised to undo the synthetic listings once the benchmark is done"""
+
+
+class Command(BaseCommand):
+    help = "Benchmark buy_bike filtering on the ORM and the columnar snapshot over synthetic listings"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--sizes", nargs="+", type=int, default=[10000, 100000],
+                            help="Numbers of synthetic listings to create")
+        parser.add_argument("--repeat", type=int, default=20, help="Times each query is run per engine")
+        parser.add_argument("--seed", type=int, default=7)
+
+    def handle(self, *args, **options):
+        if not listing_snapshot.available:
+            raise CommandError("numpy is not installed; the columnar engine is unavailable")
+
+        rng = random.Random(options["seed"])
+        specs = [ListingFilter.from_params(params) for params in QUERIES]
+        for size in options["sizes"]:
+            # The synthetic rows only live inside this transaction
+            try:
+                with transaction.atomic():
+                    self.create_listings(rng, size)
+                    facet_index.load()
+                    listing_snapshot.load()
+                    self.compare(size, specs, options["repeat"])
+                    raise Rollback
+            except Rollback:
+                pass
+            facet_index.reset()
+            listing_snapshot.reset()
+
+    def create_listings(self, rng, size):
+        listings = []
+        for _ in range(size):
+            brand = rng.choice(list(BRANDS))
+            displacement = rng.choice([110, 125, 150, 160, 200, 250, 350, 390, 650])
+            listings.append(BikeForSale(
+                name=rng.choice(BRANDS[brand]),
+                brand=brand,
+                cc=str(displacement),
+                displacement_cc=displacement,
+                year=rng.randint(2012, 2024),
+                kilometers=rng.randint(0, 80000),
+                fuel_type=rng.choice(["petrol", "petrol", "petrol", "electric"]),
+                owner_number=rng.choice(["1st", "1st", "2nd", "3rd"]),
+                price=Decimal(rng.randrange(25000, 600000, 500)),
+                location="Chennai",
+            ))
+        BikeForSale.objects.bulk_create(listings, batch_size=2000)
+
+    def compare(self, size, specs, repeat):
+        self.stdout.write(f"{size:>7} listings")
+        for spec in specs:
+            timings = {}
+            results = {}
+            for engine in ("orm", "columnar"):
+                samples = []
+                for _ in range(repeat):
+                    started = time.perf_counter()
+                    results[engine] = listing_results(spec, engine=engine)
+                    samples.append((time.perf_counter() - started) * 1000)
+                timings[engine] = statistics.median(samples)
+
+            orm, columnar = results["orm"], results["columnar"]
+            same = (
+                [bike.pk for bike in orm["page"]] == [bike.pk for bike in columnar["page"]]
+                and orm["facets"] == columnar["facets"]
+            )
+            self.stdout.write(
+                f"    {spec.key or '(no filters)':52} orm {timings['orm']:7.2f} ms   "
+                f"columnar {timings['columnar']:6.2f} ms   {'same results' if same else 'RESULTS DIFFER'}"
+            )
@@ -0,0 +1,73 @@
+import os
+import time
+
+from django.apps import apps
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand, CommandError
+from django.db import models
+
+from bikes.images import DERIVATIVE_SIZES, FORMATS, derivative_files, derivative_name
+from bikes.storage import BLOB_DIR
+
+
+def referenced_names():
+    """Every media name a row refers to: its files, their derivatives and stored derivative descriptions"""
+    names = set()
+    for model in apps.get_models():
+        for field in model._meta.fields:
+            if isinstance(field, models.FileField):
+                rows = model._default_manager.exclude(**{field.name: ""}).exclude(**{f"{field.name}__isnull": True})
+                names.update(rows.values_list(field.name, flat=True).iterator())
+            elif isinstance(field, models.JSONField) and field.name.endswith("_derivatives"):
+                for description in model._default_manager.values_list(field.name, flat=True).iterator():
+                    names.update(derivative_files(description))
+
+    # Derivatives backfilled for fields without a description column
+    names.update([
+        derivative_name(name, variant, extension)
+        for name in list(names)
+        for variant in DERIVATIVE_SIZES
+        for _, extension, _ in FORMATS.values()
+    ])
+    return names
+
+
+class Command(BaseCommand):
+    help = "Delete content-addressed media blobs (and their derivatives) that no row refers to"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--grace", type=int, default=3600,
+                            help="Keep files younger than this many seconds (uploads not yet saved on a row)")
+        parser.add_argument("--dry-run", action="store_true", help="Only report what would be deleted")
+
+    def handle(self, *args, **options):
+        try:
+            root = default_storage.path(BLOB_DIR)
+        except NotImplementedError:
+            raise CommandError("The default storage has no local files to collect")
+
+        referenced = referenced_names()
+        cutoff = time.time() - options["grace"]
+        deleted = kept = 0
+        freed = 0
+        for directory, _, files in os.walk(root, topdown=False):
+            for filename in files:
+                path = os.path.join(directory, filename)
+                name = os.path.relpath(path, default_storage.location).replace(os.sep, "/")
+                stat = os.stat(path)
+                if name in referenced or stat.st_mtime > cutoff:
+                    kept += 1
+                    continue
+                if options["dry_run"]:
+                    self.stdout.write(f"Would delete {name}")
+                else:
+                    os.remove(path)
+                deleted += 1
+                freed += stat.st_size
+            if not options["dry_run"] and directory != root and not os.listdir(directory):
+                os.rmdir(directory)
+
+        self.stdout.write(self.style.SUCCESS(
+            f"{'Would delete' if options['dry_run'] else 'Deleted'} {deleted} files "
+            f"({freed / 1_000_000:.1f} MB), kept {kept}"
+        ))
@@ -0,0 +1,41 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from bikes.mail import deliver_outbox, dispatcher
+
+
+class Command(BaseCommand):
+    help = "Send queued contact emails from the outbox, retrying failures with backoff"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=getattr(settings, "OUTBOX_BATCH_SIZE", 50),
+                            help="Messages claimed and sent over one connection at a time")
+        parser.add_argument("--interval", type=float, default=getattr(settings, "OUTBOX_POLL_INTERVAL", 5),
+                            help="Seconds to wait when nothing is due")
+        parser.add_argument("--once", action="store_true", help="Send everything due now, then exit")
+
+    def handle(self, *args, **options):
+        total_sent = total_failed = 0
+        while True:
+            sent, failed = deliver_outbox(options["batch_size"])
+            total_sent += sent
+            total_failed += failed
+            if sent or failed:
+                continue
+            if options["once"]:
+                break
+            # Long-running: do not hold on to connections the database or
+            # the mail server has dropped
+            close_old_connections()
+            dispatcher.close_if_idle()
+            time.sleep(options["interval"])
+        dispatcher.close()
+
+        counts = dispatcher.stats()["process"]
+        self.stdout.write(self.style.SUCCESS(
+            f"Sent {total_sent} emails, {total_failed} failed, over {counts['connections']} connections "
+            f"({counts['reconnects']} reconnects)"
+        ))
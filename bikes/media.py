@@ -0,0 +1,138 @@
+"""
+Efficient responses for files on disk (uploads and resized copies).
+
+file_response() answers a GET/HEAD for a local file the way WhiteNoise does
+for static files: ETag and Last-Modified validators with 304 / 412
+handling, single byte-range requests (206, or 416 when unsatisfiable,
+honouring If-Range), and a FileResponse for full bodies so the WSGI server
+can send the file with sendfile.
+
+Names carrying a content hash (12+ hex digits as a name segment, e.g. the
+content-addressed uploads or ``photo.3f2a9c0d1e4b.jpg``) never change, so
+they are cached immutably; anything else is revalidated after
+MEDIA_MAX_AGE seconds.
+"""
+import mimetypes
+import os
+import re
+import stat as stat_module
+
+from django.conf import settings
+from django.http import FileResponse, HttpResponse
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, parse_http_date_safe
+
+IMMUTABLE = "public, max-age=31536000, immutable"
+
+HASHED_NAME = re.compile(r"(?:^|[./_-])[0-9a-f]{12,}(?:[./_-]|$)")
+
+RANGE = re.compile(r"^bytes=(\d*)-(\d*)$")
+
+
+def is_hashed_name(name):
+    return bool(HASHED_NAME.search(os.path.splitext(name)[0].lower()))
+
+
+def media_cache_control(name):
+    if is_hashed_name(name):
+        return IMMUTABLE
+    return f"public, max-age={getattr(settings, 'MEDIA_MAX_AGE', 3600)}"
+
+
+def file_etag(stat):
+    return f'"{stat.st_size:x}-{stat.st_mtime_ns:x}"'
+
+
+def parse_range(header, size):
+    """
+    (start, end) inclusive for a single ``bytes=`` range, None when the
+    header should be ignored (absent, malformed or several ranges) and
+    False when it cannot be satisfied
+    """
+    match = RANGE.match(header.strip())
+    if not match or not any(match.groups()):
+        return None
+    first, last = match.groups()
+    if not first:
+        # Suffix range: the final ``last`` bytes
+        length = int(last)
+        if length == 0 or size == 0:
+            return False
+        return max(size - length, 0), size - 1
+    start = int(first)
+    end = min(int(last), size - 1) if last else size - 1
+    if start >= size or end < start:
+        return False
+    return start, end
+
+
+class FileRange:
+    """Reads ``length`` bytes of an open file from its current position"""
+
+    def __init__(self, file, length):
+        self.file = file
+        self.remaining = length
+
+    def read(self, size=-1):
+        if size < 0 or size > self.remaining:
+            size = self.remaining
+        data = self.file.read(size)
+        self.remaining -= len(data)
+        return data
+
+    def close(self):
+        self.file.close()
+
+
+def _if_range_matches(request, etag, last_modified):
+    """Ranges are only served for the representation the client already has"""
+    validator = request.headers.get("If-Range")
+    if not validator:
+        return True
+    if validator.startswith('"') or validator.startswith("W/"):
+        return validator == etag
+    return parse_http_date_safe(validator) == last_modified
+
+
+def file_response(request, path, cache_control):
+    """Response for the file at ``path``; raises FileNotFoundError if there is none"""
+    stat = os.stat(path)
+    if not stat_module.S_ISREG(stat.st_mode):
+        raise FileNotFoundError(path)
+    etag = file_etag(stat)
+    last_modified = int(stat.st_mtime)
+
+    validators = HttpResponse()
+    validators["ETag"] = etag
+    validators["Last-Modified"] = http_date(last_modified)
+    validators["Cache-Control"] = cache_control
+    validators["Accept-Ranges"] = "bytes"
+    conditional = get_conditional_response(request, etag=etag, last_modified=last_modified, response=validators)
+    if conditional is not validators:
+        return conditional
+
+    content_type = mimetypes.guess_type(path)[0] or "application/octet-stream"
+    requested = parse_range(request.headers.get("Range", ""), stat.st_size)
+    if requested is not None and not _if_range_matches(request, etag, last_modified):
+        requested = None
+
+    if requested is False:
+        response = HttpResponse(status=416)
+        response["Content-Range"] = f"bytes */{stat.st_size}"
+        response["Accept-Ranges"] = "bytes"
+        return response
+
+    if requested is None:
+        response = FileResponse(open(path, "rb"), content_type=content_type)
+    else:
+        start, end = requested
+        file = open(path, "rb")
+        file.seek(start)
+        response = FileResponse(FileRange(file, end - start + 1), status=206, content_type=content_type)
+        response["Content-Range"] = f"bytes {start}-{end}/{stat.st_size}"
+        response["Content-Length"] = end - start + 1
+
+    for header, value in validators.items():
+        if header != "Content-Type":
+            response[header] = value
+    return response
@@ -0,0 +1,46 @@
+# Generated by Django 5.2.6 on 2026-10-18 09:00
+
+import django.db.models.functions.comparison
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bikes', '0019_alter_bike_image'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='bikeforsale',
+            index=models.Index(condition=models.Q(('is_active', True)), fields=['-created_at', '-id'], name='bfs_active_newest_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='bikeforsale',
+            index=models.Index(condition=models.Q(('is_active', True)), fields=['price', 'id'], name='bfs_active_price_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='bikeforsale',
+            index=models.Index(django.db.models.functions.comparison.Collate('brand', 'nocase'), models.OrderBy(models.F('created_at'), descending=True), models.OrderBy(models.F('id'), descending=True), condition=models.Q(('is_active', True)), name='bfs_active_brand_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='bikeforsale',
+            index=models.Index(condition=models.Q(('is_active', True)), fields=['year', '-created_at', '-id'], name='bfs_active_year_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='bikeforsale',
+            index=models.Index(condition=models.Q(('is_active', True)), fields=['fuel_type', '-created_at', '-id'], name='bfs_active_fuel_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='bikeforsale',
+            index=models.Index(condition=models.Q(('is_active', True)), fields=['owner_number', '-created_at', '-id'], name='bfs_active_owner_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='bikeforsale',
+            index=models.Index(condition=models.Q(('is_active', True)), fields=['kilometers'], name='bfs_active_km_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='bikeforsale',
+            index=models.Index(condition=models.Q(('is_active', True), ('is_featured', True)), fields=['-created_at'], name='bfs_featured_idx'),
+        ),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 5.2.6 on 2026-10-18 09:30
+
+import re
+
+from django.db import migrations, models
+
+
+def populate_displacement(apps, schema_editor):
+    """Parse the existing free-text cc values into displacement_cc"""
+    BikeForSale = apps.get_model('bikes', 'BikeForSale')
+    pattern = re.compile(r'\d+(?:\.\d+)?')
+
+    updated = []
+    for bike in BikeForSale.objects.only('id', 'cc').iterator():
+        match = pattern.search(bike.cc or '')
+        bike.displacement_cc = int(round(float(match.group()))) if match else None
+        updated.append(bike)
+    BikeForSale.objects.bulk_update(updated, ['displacement_cc'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bikes', '0020_bikeforsale_listing_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='bikeforsale',
+            name='displacement_cc',
+            field=models.PositiveIntegerField(blank=True, editable=False, help_text='Engine displacement parsed from cc, used for filtering', null=True),
+        ),
+        migrations.AddIndex(
+            model_name='bikeforsale',
+            index=models.Index(condition=models.Q(('is_active', True)), fields=['displacement_cc', '-created_at', '-id'], name='bfs_active_cc_idx'),
+        ),
+        migrations.RunPython(populate_displacement, migrations.RunPython.noop),
+    ]
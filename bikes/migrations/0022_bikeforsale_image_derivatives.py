@@ -0,0 +1,18 @@
+# Generated by Django 5.2.6 on 2026-10-18 14:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bikes', '0021_bikeforsale_displacement_cc'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='bikeforsale',
+            name='image_derivatives',
+            field=models.JSONField(blank=True, default=dict, editable=False, help_text='Resized WebP/JPEG versions of image (see bikes.images)'),
+        ),
+    ]
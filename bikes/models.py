@@ -1,6 +1,9 @@
 from django.db import models
+from django.db.models import F, Q
+from django.db.models.functions import Collate
 from django.core.validators import RegexValidator
 from django.utils import timezone
+import re
 import uuid
 # from django.contrib.auth.models import User
 # from django.core.validators import FileExtensionValidator
@@ -8,6 +11,8 @@ import os
 from django.core.validators import MinValueValidator, MaxValueValidator
 from datetime import datetime
 
+from .images import delete_derivatives, derivative_files, generate_derivatives, srcset, variant_url
+
 # Keep your existing model for carousel
 class Bike(models.Model):
     name = models.CharField(max_length=100)
@@ -25,6 +30,17 @@ class FeatureSection(models.Model):
         return self.title
 
 
+DISPLACEMENT_PATTERN = re.compile(r"\d+(?:\.\d+)?")
+
+
+def parse_displacement(value):
+    """Engine displacement in cc from free text such as "150", "149.5 cc" or "350CC" """
+    match = DISPLACEMENT_PATTERN.search(str(value or ""))
+    if not match:
+        return None
+    return int(round(float(match.group())))
+
+
 # Add new model for detailed bike listings
 class BikeForSale(models.Model):
     FUEL_CHOICES = [
@@ -42,6 +58,12 @@ class BikeForSale(models.Model):
     name = models.CharField(max_length=200)
     brand = models.CharField(max_length=100)
     cc = models.CharField(max_length=10)
+    displacement_cc = models.PositiveIntegerField(
+        null=True,
+        blank=True,
+        editable=False,
+        help_text="Engine displacement parsed from cc, used for filtering"
+    )
     model_variant = models.CharField(max_length=100, blank=True)
     
     year = models.PositiveIntegerField(
@@ -58,15 +80,108 @@ class BikeForSale(models.Model):
     location = models.CharField(max_length=100)
     
     image = models.ImageField(upload_to='bikes_for_sale/', blank=True, null=True)
+    image_derivatives = models.JSONField(
+        default=dict,
+        blank=True,
+        editable=False,
+        help_text="Resized WebP/JPEG versions of image (see bikes.images)"
+    )
     
     is_featured = models.BooleanField(default=False)
     is_active = models.BooleanField(default=True)
     created_at = models.DateTimeField(auto_now_add=True)
 
-    
+    class Meta:
+        # buy_bike always filters is_active=True, so every access path is a
+        # partial index over active listings only. Each ends with the sort
+        # key + id so keyset pagination can seek straight to the next page.
+        indexes = [
+            models.Index(
+                fields=["-created_at", "-id"],
+                name="bfs_active_newest_idx",
+                condition=Q(is_active=True),
+            ),
+            models.Index(
+                fields=["price", "id"],
+                name="bfs_active_price_idx",
+                condition=Q(is_active=True),
+            ),
+            # brand__iexact compiles to LIKE on SQLite, which can only use a NOCASE index
+            models.Index(
+                Collate("brand", "nocase"), F("created_at").desc(), F("id").desc(),
+                name="bfs_active_brand_idx",
+                condition=Q(is_active=True),
+            ),
+            models.Index(
+                fields=["year", "-created_at", "-id"],
+                name="bfs_active_year_idx",
+                condition=Q(is_active=True),
+            ),
+            models.Index(
+                fields=["fuel_type", "-created_at", "-id"],
+                name="bfs_active_fuel_idx",
+                condition=Q(is_active=True),
+            ),
+            models.Index(
+                fields=["owner_number", "-created_at", "-id"],
+                name="bfs_active_owner_idx",
+                condition=Q(is_active=True),
+            ),
+            models.Index(
+                fields=["kilometers"],
+                name="bfs_active_km_idx",
+                condition=Q(is_active=True),
+            ),
+            models.Index(
+                fields=["displacement_cc", "-created_at", "-id"],
+                name="bfs_active_cc_idx",
+                condition=Q(is_active=True),
+            ),
+            # Home page featured strip
+            models.Index(
+                fields=["-created_at"],
+                name="bfs_featured_idx",
+                condition=Q(is_active=True, is_featured=True),
+            ),
+        ]
+
     def __str__(self):
         return f"{self.year} | {self.brand} {self.name} | {self.cc}"
 
+    def save(self, *args, **kwargs):
+        # Keep the numeric displacement in step with the free-text cc
+        self.displacement_cc = parse_displacement(self.cc)
+        update_fields = kwargs.get("update_fields")
+        if update_fields is not None and "cc" in update_fields:
+            kwargs["update_fields"] = {*update_fields, "displacement_cc"}
+        if update_fields is None or "image" in update_fields:
+            self.refresh_image_derivatives()
+            if update_fields is not None:
+                kwargs["update_fields"] = {*kwargs["update_fields"], "image_derivatives"}
+        super().save(*args, **kwargs)
+
+    def refresh_image_derivatives(self, force=False):
+        """Regenerate image_derivatives when the image was replaced (or ``force``)"""
+        previous = self.image_derivatives or {}
+        source = self.image.name if self.image else None
+        if not force and previous.get("source") == source:
+            return
+        if self.image and not self.image._committed:
+            # Store the upload now (FileField.pre_save would do it later) so
+            # the derivatives can be made from the stored file
+            self.image.save(self.image.name, self.image.file, save=False)
+        self.image_derivatives = generate_derivatives(self.image) if self.image else {}
+        delete_derivatives(self.image.storage, previous, keep=derivative_files(self.image_derivatives))
+
+    def image_url(self, variant="card", fmt="jpeg"):
+        """URL of one image derivative, falling back to the original upload"""
+        if not self.image:
+            return None
+        return variant_url(self.image.storage, self.image_derivatives, variant, fmt) or self.image.url
+
+    def image_srcset(self, fmt="webp"):
+        return srcset(self.image.storage, self.image_derivatives, fmt) if self.image else ""
+
     def formatted_price(self):
         return f"₹ {self.price:,.0f}"
     
@@ -222,6 +337,51 @@ class ContactSubmission(models.Model):
         self.save()
 
 
+class EmailOutbox(models.Model):
+    """
+    An email waiting to be sent, written in the same transaction as the
+    submission it is about and delivered by "manage.py send_outbox"
+    """
+
+    KIND_CHOICES = [
+        ('admin_notification', 'Admin Notification'),
+        ('confirmation', 'Confirmation Email'),
+    ]
+
+    STATUS_CHOICES = [
+        ('pending', 'Pending'),
+        ('sent', 'Sent'),
+        ('failed', 'Failed'),
+    ]
+
+    submission = models.ForeignKey(
+        ContactSubmission,
+        on_delete=models.CASCADE,
+        related_name='outbox_messages'
+    )
+    kind = models.CharField(max_length=20, choices=KIND_CHOICES)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='pending')
+    attempts = models.PositiveIntegerField(default=0)
+    next_attempt_at = models.DateTimeField(
+        default=timezone.now,
+        help_text="Not picked up by the worker before this time (retry backoff or a worker's lease)"
+    )
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(default=timezone.now)
+    sent_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['created_at']
+        verbose_name = "Outbox Email"
+        verbose_name_plural = "Outbox Emails"
+        indexes = [
+            models.Index(fields=['status', 'next_attempt_at']),
+        ]
+
+    def __str__(self):
+        return f"{self.get_kind_display()} for {self.submission_id} ({self.get_status_display()})"
+
+
 class ContactEmailTemplate(models.Model):
     """Model for storing email templates for contact responses"""
     
@@ -0,0 +1,86 @@
+"""
+Full-page cache for the public pages, purged by surrogate keys.
+
+A view decorated with @page_cache("listings", "listing:{id}") stores its
+rendered response together with the current generation of each tag (tags
+are formatted with the view's URL kwargs). purge("listing:7") bumps that
+tag's generation, so exactly the pages carrying it are rendered again on
+their next request; everything else stays cached. bikes.signals maps model
+changes to tags.
+
+Only anonymous traffic is cached. Requests with a session or a messages
+cookie (which covers every logged-in and staff user) bypass the cache, and
+responses that are not 200 or that set cookies are never stored.
+"""
+import hashlib
+from functools import wraps
+
+from django.conf import settings
+from django.contrib.messages.storage.cookie import CookieStorage
+from django.http import HttpResponse
+
+from .cache import bump_generation, get_generation, get_generations, shared_cache
+
+
+def tag_namespace(tag):
+    return f"tag:{tag}"
+
+
+def purge(*tags):
+    """Invalidate every cached page carrying any of ``tags``"""
+    for tag in tags:
+        bump_generation(tag_namespace(tag))
+
+
+def is_cacheable_request(request):
+    if request.method != "GET":
+        return False
+    cookies = request.COOKIES
+    return settings.SESSION_COOKIE_NAME not in cookies and CookieStorage.cookie_name not in cookies
+
+
+def page_key(request):
+    digest = hashlib.md5(request.get_full_path().encode("utf-8")).hexdigest()
+    return f"bikes:page:{request.get_host()}:{digest}"
+
+
+def _current(entry):
+    """True when no tag of a stored page has been purged since it was stored"""
+    current = get_generations([tag_namespace(tag) for tag in entry["tags"]])
+    return all(current.get(tag_namespace(tag)) == generation for tag, generation in entry["tags"].items())
+
+
+def page_cache(*tags):
+    """Cache the decorated view's anonymous GET responses under ``tags``"""
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if not is_cacheable_request(request):
+                return view(request, *args, **kwargs)
+
+            cache = shared_cache()
+            key = page_key(request)
+            entry = cache.get(key)
+            if entry is not None and _current(entry):
+                response = HttpResponse(entry["content"], status=entry["status"])
+                for header, value in entry["headers"]:
+                    response[header] = value
+                response["X-Page-Cache"] = "hit"
+                return response
+
+            # Generations are read before rendering, so a purge that lands
+            # while the page renders still invalidates what is stored
+            page_tags = {tag.format(**kwargs) for tag in tags}
+            generations = {tag: get_generation(tag_namespace(tag)) for tag in page_tags}
+            response = view(request, *args, **kwargs)
+            if response.status_code == 200 and not response.cookies and not response.streaming:
+                cache.set(key, {
+                    "tags": generations,
+                    "status": response.status_code,
+                    "headers": list(response.items()),
+                    "content": response.content,
+                }, timeout=getattr(settings, "PAGE_CACHE_TIMEOUT", 3600))
+                response["X-Page-Cache"] = "miss"
+            return response
+        return wrapper
+    return decorator
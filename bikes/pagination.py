@@ -0,0 +1,148 @@
+import base64
+import binascii
+import datetime
+import decimal
+import json
+
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+
+
+class InvalidCursor(Exception):
+    """Raised when a pagination cursor cannot be decoded for the current ordering"""
+
+
+class KeysetPage:
+    """One page of results produced by KeysetPaginator"""
+
+    def __init__(self, object_list, has_next, has_previous, next_cursor=None, previous_cursor=None):
+        self.object_list = object_list
+        self.has_next = has_next
+        self.has_previous = has_previous
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+
+class KeysetPaginator:
+    """
+    Cursor based paginator for ordered querysets.
+
+    The ordering must end with a unique column (usually ``id``) so that every
+    row has a distinct position. A cursor stores the ordering values of the
+    row at the edge of a page, and the next page is fetched with a
+    ``WHERE (a, b) > (x, y)`` style predicate instead of OFFSET, so deep pages
+    cost the same as the first one. No COUNT(*) query is ever issued.
+    """
+
+    def __init__(self, queryset, ordering, per_page=24):
+        self.queryset = queryset
+        self.ordering = tuple(ordering)
+        self.per_page = per_page
+        self.fields = [name.lstrip("-") for name in self.ordering]
+        self.descending = [name.startswith("-") for name in self.ordering]
+
+    def page(self, after=None, before=None):
+        """Return the page after (or before) the given cursor, or the first page"""
+        if after:
+            values = self.decode_cursor(after)
+            rows = self._fetch(values, backwards=False)
+            has_next = len(rows) > self.per_page
+            rows = rows[:self.per_page]
+            has_previous = True
+        elif before:
+            values = self.decode_cursor(before)
+            rows = self._fetch(values, backwards=True)
+            has_previous = len(rows) > self.per_page
+            rows = list(reversed(rows[:self.per_page]))
+            has_next = True
+        else:
+            rows = self._fetch(None, backwards=False)
+            has_next = len(rows) > self.per_page
+            rows = rows[:self.per_page]
+            has_previous = False
+
+        return KeysetPage(
+            rows,
+            has_next=has_next and bool(rows),
+            has_previous=has_previous and bool(rows),
+            next_cursor=self.encode_cursor(rows[-1]) if rows else None,
+            previous_cursor=self.encode_cursor(rows[0]) if rows else None,
+        )
+
+    def _fetch(self, values, backwards):
+        queryset = self.queryset
+        if values is not None:
+            queryset = queryset.filter(self._seek_filter(values, backwards))
+        if backwards:
+            ordering = [name[1:] if name.startswith("-") else f"-{name}" for name in self.ordering]
+        else:
+            ordering = self.ordering
+        return list(queryset.order_by(*ordering)[:self.per_page + 1])
+
+    def _seek_filter(self, values, backwards):
+        """Build the lexicographic "rows strictly past the cursor" predicate"""
+        condition = Q()
+        for position, field in enumerate(self.fields):
+            descending = self.descending[position] != backwards
+            lookup = "lt" if descending else "gt"
+            term = Q(**{f"{field}__{lookup}": values[position]})
+            for previous in range(position):
+                term &= Q(**{self.fields[previous]: values[previous]})
+            condition |= term
+        return condition
+
+    def encode_cursor(self, obj):
+        values = [getattr(obj, field) for field in self.fields]
+        payload = json.dumps(values, default=_cursor_value, separators=(",", ":"))
+        return base64.urlsafe_b64encode(payload.encode("utf-8")).decode("ascii").rstrip("=")
+
+    def decode_cursor(self, cursor):
+        try:
+            padded = cursor + "=" * (-len(cursor) % 4)
+            raw_values = json.loads(base64.urlsafe_b64decode(padded.encode("ascii")))
+        except (binascii.Error, UnicodeError, ValueError):
+            raise InvalidCursor(cursor)
+
+        if not isinstance(raw_values, list) or len(raw_values) != len(self.fields):
+            raise InvalidCursor(cursor)
+
+        values = []
+        for field_name, raw in zip(self.fields, raw_values):
+            # Cursors only ever hold strings and numbers; nested JSON would
+            # reach to_python as a type it does not expect
+            if isinstance(raw, bool) or not isinstance(raw, (str, int, float)):
+                raise InvalidCursor(cursor)
+            field = self.queryset.model._meta.get_field(field_name)
+            try:
+                values.append(field.to_python(raw))
+            except (ValidationError, TypeError, ValueError):
+                raise InvalidCursor(cursor)
+            if values[-1] is None:
+                raise InvalidCursor(cursor)
+        return values
+
+
+def _cursor_value(value):
+    # Full precision on purpose: DjangoJSONEncoder drops microseconds, which
+    # would make the equality half of the seek predicate miss rows.
+    if isinstance(value, (datetime.datetime, datetime.date)):
+        return value.isoformat()
+    if isinstance(value, decimal.Decimal):
+        return str(value)
+    raise TypeError(f"Cannot encode {type(value).__name__} in a cursor")
+
+
+def cursor_querystring(request, **params):
+    """Current query string with the pagination cursor replaced by ``params``"""
+    query = request.GET.copy()
+    query.pop("after", None)
+    query.pop("before", None)
+    for key, value in params.items():
+        query[key] = value
+    return query.urlencode()
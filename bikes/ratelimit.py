@@ -0,0 +1,151 @@
+"""
+Token-bucket rate limiting for the write endpoints.
+
+A view decorated with @rate_limit("contact_api") gets one bucket per client
+IP for that scope (see get_client_ip). RATE_LIMITS maps a scope to "<count>/<s|m|h|d>": a full
+bucket holds ``count`` requests and refills at that rate, so a client may
+burst up to ``count`` and is then held to the steady rate. A request that
+finds the bucket empty is answered at once with 429 and a Retry-After.
+
+The bucket is kept as a single number, its "theoretical arrival time"
+(GCRA): the moment it will be full again. A bucket at or before now is
+full, so idle clients cost nothing and can be dropped at any time.
+
+Buckets live in this process unless RATELIMIT_CACHE_ALIAS names a cache,
+in which case every worker shares them there (one get and one set per
+request; concurrent requests of one client may slip a token or two).
+"""
+import math
+import threading
+import time
+from collections import OrderedDict
+from functools import lru_cache, wraps
+
+from django.conf import settings
+from django.core.cache import caches
+from django.http import JsonResponse
+
+PERIODS = {"s": 1, "m": 60, "h": 3600, "d": 86400}
+
+
+def get_client_ip(request):
+    """
+    Extract client IP address from request.
+
+    Clients can send any X-Forwarded-For they like, and each proxy only
+    appends the address it received the request from. With
+    RATELIMIT_TRUSTED_PROXIES proxies in front of the site, the entry the
+    outermost one added (that many from the right) is the client; without
+    proxies, or when the header is shorter than that, it is REMOTE_ADDR.
+    """
+    proxies = getattr(settings, 'RATELIMIT_TRUSTED_PROXIES', 0)
+    x_forwarded_for = request.META.get('HTTP_X_FORWARDED_FOR')
+    if proxies and x_forwarded_for:
+        entries = [entry.strip() for entry in x_forwarded_for.split(',')]
+        if len(entries) >= proxies and entries[-proxies]:
+            return entries[-proxies]
+    return request.META.get('REMOTE_ADDR', '')
+
+
+@lru_cache(maxsize=None)
+def parse_rate(rate):
+    """(seconds per token, bucket size) for a rate such as "10/m" """
+    count, _, period = rate.partition("/")
+    count = int(count)
+    if count <= 0 or period not in PERIODS:
+        raise ValueError(f"Invalid rate {rate!r}; expected <count>/<s|m|h|d>")
+    return PERIODS[period] / count, count
+
+
+def take(arrival, now, interval, size):
+    """
+    (new arrival time, seconds to wait) for taking one token from a bucket
+    whose arrival time is ``arrival``; the wait is 0 when the token was
+    available and the arrival time is then advanced by one interval
+    """
+    arrival = max(arrival or now, now) + interval
+    wait = arrival - now - interval * size
+    if wait > 0:
+        return None, wait
+    return arrival, 0
+
+
+class RateLimiter:
+    """Buckets of every scope and client; throttled counts are kept per process"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._buckets = OrderedDict()
+        self.throttled = {}
+
+    def hit(self, scope, identity, rate):
+        """Seconds the client must wait, 0 when the request may proceed"""
+        interval, size = parse_rate(rate)
+        key = f"bikes:ratelimit:{scope}:{identity}"
+        alias = getattr(settings, "RATELIMIT_CACHE_ALIAS", None)
+        if alias:
+            cache = caches[alias]
+            # Wall-clock time, as the arrival time is compared across workers
+            now = time.time()
+            arrival, wait = take(cache.get(key), now, interval, size)
+            if arrival is not None:
+                cache.set(key, arrival, timeout=math.ceil(arrival - now) + 1)
+        else:
+            now = time.monotonic()
+            with self._lock:
+                arrival, wait = take(self._buckets.get(key), now, interval, size)
+                if arrival is not None:
+                    self._buckets[key] = arrival
+                    self._buckets.move_to_end(key)
+                    self._prune(now)
+
+        if wait:
+            with self._lock:
+                self.throttled[scope] = self.throttled.get(scope, 0) + 1
+        return wait
+
+    def _prune(self, now):
+        # Oldest entries first: refilled buckets go at no cost, and past
+        # the limit the least recently used are dropped (a refill for them)
+        max_keys = getattr(settings, "RATELIMIT_MAX_KEYS", 10000)
+        while self._buckets:
+            key, arrival = next(iter(self._buckets.items()))
+            if arrival > now and len(self._buckets) <= max_keys:
+                break
+            del self._buckets[key]
+
+    def reset(self):
+        with self._lock:
+            self._buckets.clear()
+            self.throttled.clear()
+
+    def stats(self):
+        with self._lock:
+            return {"buckets": len(self._buckets), "throttled": dict(self.throttled)}
+
+
+limiter = RateLimiter()
+
+
+def too_many_requests(wait):
+    response = JsonResponse({
+        'success': False,
+        'message': 'Too many requests. Please try again later.'
+    }, status=429)
+    response["Retry-After"] = max(math.ceil(wait), 1)
+    return response
+
+
+def rate_limit(scope, methods=("POST",)):
+    """Throttle the decorated view's ``methods`` per client IP at RATE_LIMITS[scope]"""
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            rate = getattr(settings, "RATE_LIMITS", {}).get(scope)
+            if rate and request.method in methods:
+                wait = limiter.hit(scope, get_client_ip(request), rate)
+                if wait:
+                    return too_many_requests(wait)
+            return view(request, *args, **kwargs)
+        return wrapper
+    return decorator
@@ -0,0 +1,141 @@
+"""
+On-demand resized copies of uploaded images.
+
+/media/r/<w>x<h>/<path> serves the upload at <path> scaled to fit within
+w x h (never upscaled). Only sizes listed in MEDIA_RESIZE_SIZES are
+accepted, so arbitrary dimensions cannot be used to fill the cache.
+
+Results are written once to MEDIA_RESIZE_ROOT, named by a hash of the
+source path, its size and mtime and the box, so a replaced upload never
+serves a stale copy. The directory is kept under MEDIA_RESIZE_CACHE_BYTES
+by deleting the least recently used files; a file's mtime records its
+last use.
+"""
+import hashlib
+import logging
+import os
+import threading
+import time
+from pathlib import Path
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+from PIL import Image, ImageOps
+
+from .images import FORMATS, encode_image
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_SIZES = ["400x400", "640x480", "800x600", "800x800", "1280x960", "1920x1080"]
+
+# A cached file used within this many seconds is not touched again
+TOUCH_INTERVAL = 3600
+
+# Eviction removes files until the cache is this fraction of its budget,
+# so it does not run again on the very next write
+EVICT_TO = 0.9
+
+
+def allowed_sizes():
+    return set(getattr(settings, "MEDIA_RESIZE_SIZES", DEFAULT_SIZES))
+
+
+def is_allowed(width, height):
+    return f"{width}x{height}" in allowed_sizes()
+
+
+class ResizeCache:
+    def __init__(self):
+        self._lock = threading.Lock()
+        # Bytes in the cache directory as seen by this process; None until
+        # the first write scans it. Other processes' writes are picked up
+        # by the scan eviction does
+        self._total = None
+
+    @property
+    def root(self):
+        return Path(getattr(settings, "MEDIA_RESIZE_ROOT", settings.BASE_DIR / "media_cache"))
+
+    @property
+    def max_bytes(self):
+        return getattr(settings, "MEDIA_RESIZE_CACHE_BYTES", 512 * 1024 * 1024)
+
+    def get(self, name, width, height):
+        """
+        Path of ``name`` resized to fit ``width`` x ``height``, creating it
+        on first use. Raises FileNotFoundError for a missing upload and
+        SuspiciousFileOperation for a path outside MEDIA_ROOT.
+        """
+        source = Path(default_storage.path(name))
+        stat = source.stat()
+        digest = hashlib.md5(f"{name}:{stat.st_size}:{stat.st_mtime_ns}:{width}x{height}".encode("utf-8")).hexdigest()
+
+        for fmt in FORMATS:
+            cached = self.root / digest[:2] / f"{digest}.{FORMATS[fmt][1]}"
+            try:
+                used = cached.stat().st_mtime
+            except FileNotFoundError:
+                continue
+            if time.time() - used > TOUCH_INTERVAL:
+                os.utime(cached)
+            return cached
+        return self._create(source, digest, width, height)
+
+    def _create(self, source, digest, width, height):
+        with Image.open(source) as image:
+            # WebP keeps transparency and stays small; everything else is JPEG
+            fmt = "webp" if image.format == "WEBP" or image.has_transparency_data else "jpeg"
+            image.draft("RGB", (width, height))
+            image = ImageOps.exif_transpose(image)
+            image.thumbnail((width, height), Image.Resampling.LANCZOS)
+            if image.mode not in ("RGB", "RGBA"):
+                image = image.convert("RGBA" if image.has_transparency_data else "RGB")
+            content = encode_image(image, fmt)
+
+        cached = self.root / digest[:2] / f"{digest}.{FORMATS[fmt][1]}"
+        cached.parent.mkdir(parents=True, exist_ok=True)
+        partial = cached.with_name(f".{cached.name}.{os.getpid()}.{threading.get_ident()}")
+        partial.write_bytes(content)
+        os.replace(partial, cached)
+        self._added(len(content))
+        return cached
+
+    def _added(self, size):
+        with self._lock:
+            if self._total is None:
+                self._total = self._scan_total()
+            else:
+                self._total += size
+            if self._total > self.max_bytes:
+                self._total = self._evict()
+
+    def _files(self):
+        for path in self.root.glob("*/*"):
+            if path.name.startswith("."):
+                continue
+            try:
+                stat = path.stat()
+            except FileNotFoundError:
+                continue
+            yield stat.st_mtime, stat.st_size, path
+
+    def _scan_total(self):
+        return sum(size for _, size, _ in self._files())
+
+    def _evict(self):
+        """Delete least recently used files down to EVICT_TO of the budget; returns the bytes left"""
+        files = sorted(self._files())
+        total = sum(size for _, size, _ in files)
+        target = self.max_bytes * EVICT_TO
+        removed = 0
+        for _, size, path in files:
+            if total <= target:
+                break
+            path.unlink(missing_ok=True)
+            total -= size
+            removed += 1
+        logger.info(f"Resize cache evicted {removed} files, {total} bytes left")
+        return total
+
+
+resize_cache = ResizeCache()
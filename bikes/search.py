@@ -0,0 +1,214 @@
+"""
+Full-text catalogue search backed by an SQLite FTS5 table.
+
+``bikes_catalogue_fts`` holds one row per active BikeForSale listing and per
+carousel Bike. Rowids encode the source: ``id * 2`` for listings and
+``id * 2 + 1`` for bikes, so triggers can update a single row by rowid.
+SQL triggers keep the table in sync, which also covers queryset.update()
+and bulk operations that bypass model signals.
+
+The table and triggers are not Django models; install_search_index() is run
+after every ``migrate`` (see BikesConfig.ready) and recreates anything a
+table rebuild dropped. Other database vendors fall back to icontains.
+"""
+import logging
+import re
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, DatabaseError, connection, connections
+from django.db.models import Q
+
+from .fuzzy import fuzzy_index
+from .models import Bike, BikeForSale
+
+logger = logging.getLogger(__name__)
+
+FTS_TABLE = "bikes_catalogue_fts"
+
+# bm25 column weights, in table column order: brand, name, model_variant, location
+COLUMN_WEIGHTS = (5.0, 10.0, 3.0, 1.0)
+
+MAX_QUERY_TERMS = 8
+
+# Matches ranked per query, newest first (SEARCH_RANK_WINDOW). bm25 reads
+# each match's position lists, about 0.8us per row: over every match a
+# broad query ("ch") on 100k listings took 41ms, within the newest 2000
+# matches 2-5ms for any query. A better but older match past the window is
+# found by a more specific query, which narrows the match set.
+RANK_WINDOW = 2000
+
+INSTALL_SQL = [
+    f"""
+    CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5(
+        brand, name, model_variant, location,
+        prefix='2 3',
+        tokenize='unicode61 remove_diacritics 2'
+    )
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS bikes_listing_fts_insert AFTER INSERT ON bikes_bikeforsale
+    WHEN new.is_active BEGIN
+        INSERT INTO {FTS_TABLE} (rowid, brand, name, model_variant, location)
+        VALUES (new.id * 2, new.brand, new.name, new.model_variant, new.location);
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS bikes_listing_fts_update AFTER UPDATE ON bikes_bikeforsale BEGIN
+        DELETE FROM {FTS_TABLE} WHERE rowid = old.id * 2;
+        INSERT INTO {FTS_TABLE} (rowid, brand, name, model_variant, location)
+        SELECT new.id * 2, new.brand, new.name, new.model_variant, new.location WHERE new.is_active;
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS bikes_listing_fts_delete AFTER DELETE ON bikes_bikeforsale BEGIN
+        DELETE FROM {FTS_TABLE} WHERE rowid = old.id * 2;
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS bikes_bike_fts_insert AFTER INSERT ON bikes_bike BEGIN
+        INSERT INTO {FTS_TABLE} (rowid, brand, name, model_variant, location)
+        VALUES (new.id * 2 + 1, '', new.name, '', '');
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS bikes_bike_fts_update AFTER UPDATE ON bikes_bike BEGIN
+        DELETE FROM {FTS_TABLE} WHERE rowid = old.id * 2 + 1;
+        INSERT INTO {FTS_TABLE} (rowid, brand, name, model_variant, location)
+        VALUES (new.id * 2 + 1, '', new.name, '', '');
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS bikes_bike_fts_delete AFTER DELETE ON bikes_bike BEGIN
+        DELETE FROM {FTS_TABLE} WHERE rowid = old.id * 2 + 1;
+    END
+    """,
+]
+
+TRIGGER_NAMES = [
+    "bikes_listing_fts_insert", "bikes_listing_fts_update", "bikes_listing_fts_delete",
+    "bikes_bike_fts_insert", "bikes_bike_fts_update", "bikes_bike_fts_delete",
+]
+
+REBUILD_SQL = [
+    f"DELETE FROM {FTS_TABLE}",
+    f"""
+    INSERT INTO {FTS_TABLE} (rowid, brand, name, model_variant, location)
+    SELECT id * 2, brand, name, model_variant, location FROM bikes_bikeforsale WHERE is_active
+    """,
+    f"""
+    INSERT INTO {FTS_TABLE} (rowid, brand, name, model_variant, location)
+    SELECT id * 2 + 1, '', name, '', '' FROM bikes_bike
+    """,
+]
+
+
+class SearchHit:
+    """A search result: ``kind`` is "listing" (BikeForSale) or "bike" (carousel Bike)"""
+
+    def __init__(self, kind, obj):
+        self.kind = kind
+        self.object = obj
+
+
+def install_search_index(using=DEFAULT_DB_ALIAS):
+    """Create the FTS table and triggers if missing, rebuilding the index when they were"""
+    conn = connections[using]
+    if conn.vendor != "sqlite":
+        return False
+
+    with conn.cursor() as cursor:
+        cursor.execute(
+            "SELECT name FROM sqlite_master WHERE type IN ('table', 'trigger') AND name IN (%s)"
+            % ", ".join(["%s"] * (len(TRIGGER_NAMES) + 1)),
+            [FTS_TABLE, *TRIGGER_NAMES],
+        )
+        existing = {row[0] for row in cursor.fetchall()}
+        for statement in INSTALL_SQL:
+            cursor.execute(statement)
+        if existing != {FTS_TABLE, *TRIGGER_NAMES}:
+            # A table rebuild (e.g. SQLite AddField) drops its triggers, so the
+            # index may have missed changes; repopulate it from the source tables
+            for statement in REBUILD_SQL:
+                cursor.execute(statement)
+            logger.info("Rebuilt catalogue search index")
+    return True
+
+
+def fts_query(text):
+    """Turn user input into an FTS5 query: every word must match as a prefix"""
+    terms = re.findall(r"\w+", (text or "").lower())[:MAX_QUERY_TERMS]
+    return " ".join(f'"{term}"*' for term in terms)
+
+
+def search_catalogue(text, limit=None):
+    """Active listings and carousel bikes matching ``text``, best match first"""
+    limit = limit or getattr(settings, "SEARCH_RESULT_LIMIT", 30)
+    match = fts_query(text)
+    if not match:
+        return []
+
+    if connection.vendor != "sqlite":
+        return _search_fallback(text, limit)
+    try:
+        window = getattr(settings, "SEARCH_RANK_WINDOW", RANK_WINDOW)
+        with connection.cursor() as cursor:
+            # Only the newest ``window`` matches are scored: the rowid of the
+            # last of them bounds the ranked scan, which FTS5 seeks directly
+            # (an IN list of rowids would re-run the MATCH for every entry)
+            cursor.execute(
+                f"SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s AND rowid >= coalesce(("
+                f"SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s ORDER BY rowid DESC LIMIT 1 OFFSET %s"
+                f"), 0)"
+                f" ORDER BY bm25({FTS_TABLE}, {', '.join(str(w) for w in COLUMN_WEIGHTS)}), rowid DESC"
+                f" LIMIT %s",
+                [match, match, window - 1, limit],
+            )
+            rowids = [row[0] for row in cursor.fetchall()]
+    except DatabaseError as e:
+        logger.error(f"Catalogue search failed, using fallback: {str(e)}")
+        return _search_fallback(text, limit)
+
+    listings = BikeForSale.objects.in_bulk([rowid // 2 for rowid in rowids if rowid % 2 == 0])
+    bikes = Bike.objects.in_bulk([rowid // 2 for rowid in rowids if rowid % 2 == 1])
+    hits = []
+    for rowid in rowids:
+        if rowid % 2 == 0 and rowid // 2 in listings:
+            hits.append(SearchHit("listing", listings[rowid // 2]))
+        elif rowid % 2 == 1 and rowid // 2 in bikes:
+            hits.append(SearchHit("bike", bikes[rowid // 2]))
+    return hits
+
+
+def fuzzy_search_catalogue(text, limit=None):
+    """Close matches for misspelt queries ("royel enfeild", "ktm duk"), best first"""
+    limit = limit or getattr(settings, "SEARCH_RESULT_LIMIT", 30)
+    refs = []
+    for match in fuzzy_index.search(text, limit=limit):
+        refs.extend(match["refs"])
+        if len(refs) >= limit:
+            break
+    refs = refs[:limit]
+
+    listings = BikeForSale.objects.filter(is_active=True).in_bulk([pk for kind, pk in refs if kind == "listing"])
+    bikes = Bike.objects.in_bulk([pk for kind, pk in refs if kind == "bike"])
+    hits = []
+    for kind, pk in refs:
+        source = listings if kind == "listing" else bikes
+        if pk in source:
+            hits.append(SearchHit(kind, source[pk]))
+    return hits
+
+
+def _search_fallback(text, limit):
+    """icontains search for databases without FTS5"""
+    listing_filter = Q()
+    bike_filter = Q()
+    for term in re.findall(r"\w+", text)[:MAX_QUERY_TERMS]:
+        listing_filter &= (
+            Q(brand__icontains=term) | Q(name__icontains=term)
+            | Q(model_variant__icontains=term) | Q(location__icontains=term)
+        )
+        bike_filter &= Q(name__icontains=term)
+    hits = [SearchHit("listing", obj) for obj in BikeForSale.objects.filter(listing_filter, is_active=True)[:limit]]
+    hits += [SearchHit("bike", obj) for obj in Bike.objects.filter(bike_filter)[:max(limit - len(hits), 0)]]
+    return hits
@@ -0,0 +1,112 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from .autocomplete import autocomplete_index
+from .cache import bump_generation, listing_cache
+from .columnar import listing_snapshot
+from .content import content_registry
+from .facets import facet_index
+from .fuzzy import fuzzy_index
+from .homepage import HOMEPAGE_MODELS, homepage_snapshot
+from .mail import email_templates
+from .models import Bike, BikeForSale, ContactEmailTemplate, Testimonial
+from .pagecache import purge
+
+# In-memory indexes fed with every committed listing change; each reloads
+# itself when the "listings" generation moves on without it
+LISTING_INDEXES = [facet_index, autocomplete_index, fuzzy_index, listing_snapshot]
+
+
+def listing_row(instance):
+    """Field values of a BikeForSale instance as a plain dict"""
+    return {field.attname: getattr(instance, field.attname) for field in instance._meta.concrete_fields}
+
+
+def listing_pages_changed(*pks):
+    """
+    Retire cached buy_bike results, in-memory listing indexes and the pages
+    showing these listings; returns the new "listings" generation
+    """
+    generation = listing_cache.invalidate()
+    purge("listings", *(f"listing:{pk}" for pk in pks))
+    return generation
+
+
+def listing_changed(previous, current):
+    # Bump first: an index reloaded from here on already holds the change
+    generation = listing_pages_changed((current or previous)["id"])
+    for index in LISTING_INDEXES:
+        index.listing_changed(previous, current, generation)
+
+
+def bike_changed(ref, name):
+    fuzzy_index.update(ref, name, "bikes", bump_generation("bikes"))
+    purge("bikes")
+
+
+@receiver(pre_save, sender=BikeForSale)
+def remember_previous_listing(sender, instance, raw=False, **kwargs):
+    """Keep the stored row so post_save handlers can see what changed"""
+    instance._previous_listing = None
+    if instance.pk and not instance._state.adding:
+        instance._previous_listing = BikeForSale.objects.filter(pk=instance.pk).values().first()
+
+
+@receiver(post_save, sender=BikeForSale)
+def listing_saved(sender, instance, **kwargs):
+    previous = getattr(instance, "_previous_listing", None)
+    current = listing_row(instance)
+    # Only touch in-memory indexes once the change is really in the database
+    transaction.on_commit(lambda: listing_changed(previous, current))
+
+
+@receiver(post_delete, sender=BikeForSale)
+def listing_deleted(sender, instance, **kwargs):
+    previous = listing_row(instance)
+    transaction.on_commit(lambda: listing_changed(previous, None))
+
+
+@receiver(post_save, sender=Bike)
+def bike_saved(sender, instance, **kwargs):
+    ref, name = ("bike", instance.pk), instance.name
+    transaction.on_commit(lambda: bike_changed(ref, name))
+
+
+@receiver(post_delete, sender=Bike)
+def bike_deleted(sender, instance, **kwargs):
+    ref = ("bike", instance.pk)
+    transaction.on_commit(lambda: bike_changed(ref, None))
+
+
+@receiver(post_save, sender=Testimonial)
+@receiver(post_delete, sender=Testimonial)
+def testimonial_changed(sender, **kwargs):
+    transaction.on_commit(lambda: purge("testimonials"))
+
+
+@receiver(post_save, sender=ContactEmailTemplate)
+@receiver(post_delete, sender=ContactEmailTemplate)
+def email_template_changed(sender, **kwargs):
+    transaction.on_commit(email_templates.invalidate)
+
+
+def homepage_changed(sender, **kwargs):
+    transaction.on_commit(homepage_snapshot.invalidate)
+
+
+for model in HOMEPAGE_MODELS:
+    post_save.connect(homepage_changed, sender=model, dispatch_uid=f"homepage_changed_save_{model.__name__}")
+    post_delete.connect(homepage_changed, sender=model, dispatch_uid=f"homepage_changed_delete_{model.__name__}")
+
+
+def content_changed(sender, **kwargs):
+    def invalidate():
+        content_registry.model_changed(sender)
+        purge(*(f"content:{name}" for name in content_registry.entries_for(sender)))
+    transaction.on_commit(invalidate)
+
+
+for model in content_registry.models:
+    post_save.connect(content_changed, sender=model, dispatch_uid=f"content_changed_save_{model.__name__}")
+    post_delete.connect(content_changed, sender=model, dispatch_uid=f"content_changed_delete_{model.__name__}")
@@ -0,0 +1,61 @@
+"""
+Content-addressed storage for uploads.
+
+Every uploaded file is stored as ``blobs/<h[:2]>/<h><ext>``, where h is the
+SHA-256 of its bytes, whatever name or upload_to directory it came with.
+Uploading the same photo for several rows (or uploading it again) writes
+nothing new and returns the existing name, and because a name always
+denotes the same bytes, its URL can be cached forever.
+
+Files under a ``derivatives/`` directory (bikes.images) are already named
+after their blob and are stored under the name given, overwriting.
+
+Blobs may be shared by many rows, so nothing deletes them when a row
+stops using one; ``manage.py collect_media`` removes the unreferenced ones.
+"""
+import hashlib
+import posixpath
+
+from django.core.files import File
+from django.core.files.storage import FileSystemStorage
+
+BLOB_DIR = "blobs"
+
+
+def content_hash(content):
+    digest = hashlib.sha256()
+    for chunk in content.chunks():
+        digest.update(chunk if isinstance(chunk, bytes) else chunk.encode("utf-8"))
+    return digest.hexdigest()
+
+
+def blob_name(digest, extension):
+    return posixpath.join(BLOB_DIR, digest[:2], f"{digest}{extension.lower()}")
+
+
+def is_derived(name):
+    return "derivatives" in posixpath.dirname(name).split("/")
+
+
+class ContentAddressedStorage(FileSystemStorage):
+    # Tells bikes.images not to delete files another row may still use
+    shared_files = True
+
+    def __init__(self, **kwargs):
+        # Identical bytes under one name make overwriting harmless, and
+        # derivatives are regenerated in place
+        kwargs.setdefault("allow_overwrite", True)
+        super().__init__(**kwargs)
+
+    def save(self, name, content, max_length=None):
+        if name is None:
+            name = content.name
+        if is_derived(name):
+            return super().save(name, content, max_length=max_length)
+
+        if not hasattr(content, "chunks"):
+            content = File(content, name)
+        blob = blob_name(content_hash(content), posixpath.splitext(name)[1])
+        if self.exists(blob):
+            return blob
+        return super().save(blob, content, max_length=max_length)
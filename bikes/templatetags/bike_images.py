@@ -0,0 +1,55 @@
+from django import template
+from django.urls import reverse
+from django.utils.html import format_html, format_html_join
+
+from ..images import srcset, variant_url
+from ..resize import is_allowed
+
+register = template.Library()
+
+
+@register.simple_tag
+def responsive_image(obj, variant="card", sizes="100vw", field="image", loading="lazy", **attrs):
+    """
+    <picture> for ``obj.<field>`` offering its WebP and JPEG derivatives
+    (``obj.<field>_derivatives``), with the ``variant`` JPEG as the fallback
+    src. Objects without derivatives get a plain <img> of the original.
+
+        {% responsive_image bike "card" sizes="(max-width: 576px) 100vw, 350px" class="card-img-top" %}
+    """
+    image = getattr(obj, field, None)
+    if not image:
+        return ""
+    alt = attrs.pop("alt", str(obj))
+    extra = format_html_join("", ' {}="{}"', attrs.items())
+
+    derivatives = getattr(obj, f"{field}_derivatives", None) or {}
+    entry = derivatives.get("variants", {}).get(variant)
+    if not entry:
+        return format_html('<img src="{}" alt="{}" loading="{}"{}>', image.url, alt, loading, extra)
+
+    return format_html(
+        '<picture>'
+        '<source type="image/webp" srcset="{}" sizes="{}">'
+        '<img src="{}" srcset="{}" sizes="{}" width="{}" height="{}" alt="{}" loading="{}" decoding="async"{}>'
+        '</picture>',
+        srcset(image.storage, derivatives, "webp"), sizes,
+        variant_url(image.storage, derivatives, variant, "jpeg"), srcset(image.storage, derivatives, "jpeg"), sizes,
+        entry["width"], entry["height"], alt, loading, extra,
+    )
+
+
+@register.filter
+def resized(image, size):
+    """
+    URL of ``image`` (a FieldFile) scaled to fit ``size``, one of
+    MEDIA_RESIZE_SIZES; any other size gets the original.
+
+        <img src="{{ t.image|resized:"640x480" }}">
+    """
+    if not image:
+        return ""
+    width, _, height = size.partition("x")
+    if not (width.isdigit() and height.isdigit() and is_allowed(int(width), int(height))):
+        return image.url
+    return reverse("resized_media", args=[int(width), int(height), image.name])
@@ -1,3 +1,1466 @@
-from django.test import TestCase
+import base64
+import importlib
+import io
+import json
+import os
+import re
+import shutil
+import smtplib
+import tempfile
+import uuid
+from contextlib import ExitStack
+from datetime import timedelta
+from decimal import Decimal
+from pathlib import Path
+from unittest import mock, skipUnless
 
-# Create your tests here.
+from django.apps import apps as django_apps
+from django.conf import settings
+from django.core import mail
+from django.core.cache import caches
+from django.core.cache.backends.filebased import FileBasedCache
+from django.core.files.storage import default_storage
+from django.core.mail.backends import locmem
+from django.core.mail.backends.base import BaseEmailBackend
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import connection
+from django.db.models import Count, Q
+from django.db.models.functions import Lower
+from django.template import Context, Template
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from PIL import ExifTags, Image
+
+from .autocomplete import autocomplete_index
+from .cache import (
+    Snapshot, VersionedCache, bump_generation, get_generation, shared_cache, shared_cache_is_per_process,
+)
+from .columnar import listing_snapshot
+from .facets import CC_BAND_BOUNDS, PRICE_BAND_BOUNDS, build_cube, facet_index
+from .filters import BUY_BIKE_ORDERINGS, RANGE_FIELDS, InvalidFilter, ListingFilter
+from .fuzzy import FUZZY_GENERATIONS, FuzzyIndex, fuzzy_index
+from .histograms import histograms
+from .images import derivative_files
+from .mail import (
+    build_admin_notification, build_user_confirmation, deliver_outbox, dispatcher, drain_outbox, email_templates,
+    outbox_drainer,
+)
+from .management.commands.bake import output_file
+from .models import (
+    AboutSection, ApproachImage, ApproachSection, AuthImage, Bike, BikeForSale, ContactEmailTemplate,
+    ContactSubmission, EmailOutbox, FeatureSection, Testimonial,
+)
+from .pagecache import purge
+from .pagination import InvalidCursor, KeysetPaginator
+from .ratelimit import limiter, take
+from .resize import ResizeCache
+from .search import FTS_TABLE, install_search_index, search_catalogue
+from .views import listing_results
+
+
+# One representative value per buy_bike filter parameter
+LISTING_FILTERS = {
+    "brand": {"brand": "honda"},
+    "year": {"year": "2021"},
+    "fuel_type": {"fuel_type": "petrol"},
+    "owner_number": {"owner_number": "1st"},
+    "price_range": {"min_price": "40000", "max_price": "90000"},
+    "min_price": {"min_price": "40000"},
+    "max_price": {"max_price": "90000"},
+    "price_band": {"price_band": "50k_1l"},
+    "km_range": {"min_km": "1000", "max_km": "20000"},
+    "cc": {"cc": "150"},
+    "cc_range": {"min_cc": "125", "max_cc": "200"},
+    "cc_band": {"cc_band": "125_200"},
+    "brand_cc_range": {"brand": "honda", "min_cc": "125", "max_cc": "200"},
+    "brand_year": {"brand": "honda", "year": "2021"},
+    "brand_price": {"brand": "honda", "min_price": "40000", "max_price": "90000"},
+    "fuel_owner": {"fuel_type": "petrol", "owner_number": "1st"},
+    "no_filter": {},
+}
+
+# "SCAN <table>" without "USING ... INDEX" means SQLite reads every row
+FULL_SCAN = re.compile(r"\bSCAN (?:TABLE )?bikes_bikeforsale\b(?!.*\bUSING\b)")
+
+
+def use_deployed_feature_column():
+    """
+    The migrations still create FeatureSection.image as "icon" (the deployed
+    database has "image"); rename it inside the calling test's transaction
+    """
+    with connection.cursor() as cursor:
+        cursor.execute("ALTER TABLE bikes_featuresection RENAME COLUMN icon TO image")
+
+
+class ListingQueryPlanTests(TestCase):
+    """Every buy_bike filter/sort combination must be answered from an index"""
+
+    @classmethod
+    def setUpTestData(cls):
+        for i in range(6):
+            BikeForSale.objects.create(
+                name=f"Shine {i}",
+                brand="Honda" if i % 2 else "KTM",
+                cc="125",
+                year=2020 + i % 3,
+                kilometers=5000 * i,
+                fuel_type="petrol",
+                owner_number="1st",
+                price=Decimal(45000 + 10000 * i),
+                location="Chengalpattu",
+                is_featured=i < 2,
+            )
+
+    def explain(self, sql):
+        with connection.cursor() as cursor:
+            cursor.execute(f"EXPLAIN QUERY PLAN {sql}")
+            return [row[-1] for row in cursor.fetchall()]
+
+    def assertUsesIndex(self, sql):
+        plan = self.explain(sql)
+        for step in plan:
+            self.assertIsNone(FULL_SCAN.search(step), f"full table scan in plan {plan} for {sql}")
+
+    def listing_queries(self, params, ordering):
+        """SQL actually issued for the first page and a cursor page"""
+        paginator = KeysetPaginator(ListingFilter.from_params(params).queryset(), ordering, per_page=2)
+        with CaptureQueriesContext(connection) as first:
+            page = paginator.page()
+        queries = [query["sql"] for query in first.captured_queries]
+
+        cursor = page.next_cursor or paginator.encode_cursor(BikeForSale.objects.first())
+        with CaptureQueriesContext(connection) as seek:
+            paginator.page(after=cursor)
+            paginator.page(before=cursor)
+        return queries + [query["sql"] for query in seek.captured_queries]
+
+    def test_filter_and_sort_combinations_use_indexes(self):
+        for filter_name, params in LISTING_FILTERS.items():
+            for sort, ordering in BUY_BIKE_ORDERINGS.items():
+                with self.subTest(filter=filter_name, sort=sort):
+                    for sql in self.listing_queries(params, ordering):
+                        self.assertUsesIndex(sql)
+
+    def test_facet_range_narrowing_uses_indexes(self):
+        for filter_name, params in LISTING_FILTERS.items():
+            spec = ListingFilter.from_params(params)
+            if not spec.has_range_filters:
+                continue
+            with self.subTest(filter=filter_name):
+                with CaptureQueriesContext(connection) as captured:
+                    build_cube(spec.only(*RANGE_FIELDS).queryset())
+                for query in captured.captured_queries:
+                    self.assertUsesIndex(query["sql"])
+
+    def test_home_featured_listings_use_index(self):
+        queryset = BikeForSale.objects.filter(is_featured=True, is_active=True)[:3]
+        self.assertUsesIndex(str(queryset.query))
+
+    def test_full_scan_pattern(self):
+        # Guard against the regex silently matching nothing on a new SQLite
+        self.assertIsNotNone(FULL_SCAN.search("SCAN bikes_bikeforsale"))
+        self.assertIsNone(FULL_SCAN.search("SCAN bikes_bikeforsale USING INDEX bfs_active_newest_idx"))
+        self.assertIsNone(FULL_SCAN.search("SEARCH bikes_bikeforsale USING INDEX bfs_active_year_idx (year=?)"))
+
+
+
+class KeysetPaginatorTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        # Pairs of equal prices, so pages must break ties on id
+        cls.bikes = [
+            BikeForSale.objects.create(
+                name=f"Shine {i}", brand="Honda", cc="125", year=2021, kilometers=1000 * i,
+                fuel_type="petrol", owner_number="1st", price=Decimal(40000 + 1000 * (i // 2)),
+                location="Chengalpattu",
+            )
+            for i in range(7)
+        ]
+
+    def paginator(self):
+        return KeysetPaginator(BikeForSale.objects.all(), ("price", "id"), per_page=3)
+
+    def test_after_and_before_walk_every_row_once(self):
+        paginator = self.paginator()
+        expected = [bike.id for bike in sorted(self.bikes, key=lambda bike: (bike.price, bike.id))]
+
+        pages = [paginator.page()]
+        while pages[-1].has_next:
+            pages.append(paginator.page(after=pages[-1].next_cursor))
+        self.assertEqual([bike.id for page in pages for bike in page], expected)
+        self.assertEqual([len(page) for page in pages], [3, 3, 1])
+        self.assertEqual([(page.has_previous, page.has_next) for page in pages],
+                         [(False, True), (True, True), (True, False)])
+
+        back = paginator.page(before=pages[-1].previous_cursor)
+        self.assertEqual([bike.id for bike in back], [bike.id for bike in pages[1]])
+        last = pages[0].object_list[-1]
+        self.assertEqual(paginator.decode_cursor(pages[0].next_cursor), [last.price, last.id])
+
+    def test_malformed_cursors_are_rejected(self):
+        paginator = self.paginator()
+
+        def encode(payload):
+            return base64.urlsafe_b64encode(payload.encode()).decode().rstrip("=")
+
+        for cursor in ["%%%", encode("{}"), encode("[1]"), encode("[[1],1]"), encode('["x",1]'),
+                       encode("[null,1]"), encode("[true,1]"), encode('[1,{"a":1}]')]:
+            with self.subTest(cursor=cursor):
+                with self.assertRaises(InvalidCursor):
+                    paginator.decode_cursor(cursor)
+
+    def test_buy_bike_treats_a_bad_cursor_as_the_first_page(self):
+        cursor = base64.urlsafe_b64encode(b"[[1],1]").decode()
+        response = self.client.get(reverse("buy_bike"), {"after": cursor})
+        self.assertEqual(response.status_code, 200)
+
+
+
+def make_listing(**fields):
+    defaults = {
+        "name": "Shine", "brand": "Honda", "cc": "125", "year": 2021, "kilometers": 12000,
+        "fuel_type": "petrol", "owner_number": "1st", "price": Decimal("55000"), "location": "Chengalpattu",
+    }
+    return BikeForSale.objects.create(**{**defaults, **fields})
+
+
+class CatalogueSearchTests(TestCase):
+    def names(self, text):
+        return [hit.object.name for hit in search_catalogue(text)]
+
+    def test_install_recreates_triggers_and_rebuilds_the_index(self):
+        make_listing(name="Classic 350", brand="Royal Enfield")
+        with connection.cursor() as cursor:
+            cursor.execute("DROP TRIGGER bikes_listing_fts_insert")
+            cursor.execute(f"DELETE FROM {FTS_TABLE}")
+        self.assertEqual(self.names("classic"), [])
+
+        self.assertTrue(install_search_index())
+        self.assertEqual(self.names("classic"), ["Classic 350"])
+        make_listing(name="Bullet 350", brand="Royal Enfield")
+        self.assertEqual(sorted(self.names("royal")), ["Bullet 350", "Classic 350"])
+
+    def test_triggers_follow_saves_updates_and_deletes(self):
+        listing = make_listing(name="Duke 200", brand="KTM")
+        bike = Bike.objects.create(name="Duke 390")
+        self.assertEqual(
+            sorted((hit.kind, hit.object.pk) for hit in search_catalogue("duke")),
+            [("bike", bike.pk), ("listing", listing.pk)],
+        )
+
+        listing.name = "RC 200"
+        listing.save()
+        self.assertEqual(self.names("duke"), ["Duke 390"])
+        self.assertEqual(self.names("rc"), ["RC 200"])
+
+        # queryset.update() bypasses signals but not the triggers
+        BikeForSale.objects.filter(pk=listing.pk).update(is_active=False)
+        self.assertEqual(self.names("rc"), [])
+        bike.delete()
+        self.assertEqual(self.names("duke"), [])
+
+    def test_prefix_matching(self):
+        make_listing(name="Classic 350", brand="Royal Enfield")
+        self.assertEqual(self.names("roy enf"), ["Classic 350"])
+        self.assertEqual(self.names("enfield xyz"), [])
+
+    def test_best_match_first_however_old(self):
+        best = make_listing(name="Himalayan", brand="Royal Enfield", location="Chennai")
+        # Many newer listings that only mention the term in their location
+        BikeForSale.objects.bulk_create([
+            BikeForSale(name=f"Splendor {i}", brand="Hero", cc="100", year=2020, kilometers=1000,
+                        fuel_type="petrol", owner_number="1st", price=Decimal("40000"), location="Himalayan Road")
+            for i in range(600)
+        ])
+        self.assertEqual(search_catalogue("himalayan", limit=5)[0].object.pk, best.pk)
+
+        # Past the ranked window only the newest matches compete
+        with self.settings(SEARCH_RANK_WINDOW=100):
+            hits = search_catalogue("himalayan", limit=5)
+        self.assertEqual(len(hits), 5)
+        self.assertNotIn(best.pk, [hit.object.pk for hit in hits])
+        newest = BikeForSale.objects.order_by("-pk").values_list("pk", flat=True)[:100]
+        self.assertLessEqual({hit.object.pk for hit in hits}, set(newest))
+
+
+
+class AutocompleteTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        for name, brand, variant in [
+            ("Classic 350", "Royal Enfield", "Chrome"), ("Classic 350", "Royal Enfield", ""),
+            ("Bullet 350", "Royal Enfield", ""), ("R15", "Yamaha", "V4"), ("RC 390", "KTM", ""),
+        ]:
+            make_listing(name=name, brand=brand, model_variant=variant)
+
+    def setUp(self):
+        autocomplete_index.reset()
+        self.addCleanup(autocomplete_index.reset)
+
+    def texts(self, query, **kwargs):
+        return [suggestion["text"] for suggestion in autocomplete_index.suggest(query, **kwargs)]
+
+    def test_prefixes_match_any_word_ignoring_case(self):
+        self.assertEqual(self.texts("ROY cl"), ["Royal Enfield Classic 350", "Royal Enfield Classic 350 Chrome"])
+        self.assertEqual(self.texts("enf", kinds={"brand"}), ["Royal Enfield"])
+        self.assertEqual(self.texts("zzz"), [])
+
+    def test_ties_rank_by_listing_count_then_length_and_limit(self):
+        # "Royal Enfield" has 3 listings, "Royal Enfield Classic 350" 2, the rest 1 each
+        self.assertEqual(
+            self.texts("royal"),
+            ["Royal Enfield", "Royal Enfield Classic 350", "Royal Enfield Bullet 350",
+             "Royal Enfield Classic 350 Chrome"],
+        )
+        self.assertEqual(self.texts("royal", limit=2), ["Royal Enfield", "Royal Enfield Classic 350"])
+
+    def test_index_follows_saves_and_deletes(self):
+        self.assertEqual(self.texts("hima"), [])
+        with self.captureOnCommitCallbacks(execute=True):
+            listing = make_listing(name="Himalayan", brand="Royal Enfield")
+        self.assertEqual(self.texts("hima"), ["Royal Enfield Himalayan"])
+        with self.captureOnCommitCallbacks(execute=True):
+            listing.delete()
+        self.assertEqual(self.texts("hima"), [])
+
+    def test_brand_endpoint(self):
+        response = self.client.get(reverse("autocomplete"), {"q": "yam", "field": "brand"})
+        self.assertEqual([s["text"] for s in response.json()["suggestions"]], ["Yamaha"])
+        self.assertContains(self.client.get(reverse("buy_bike")), 'list="brandSuggestions"')
+
+
+
+class FuzzySearchTests(TestCase):
+    CATALOGUE = [
+        ("Royal Enfield", "Classic 350"), ("Royal Enfield", "Himalayan"), ("Yamaha", "R15 V4"),
+        ("Yamaha", "FZ S"), ("KTM", "Duke 390"), ("KTM", "RC 200"), ("Honda", "Shine"), ("Bajaj", "Pulsar 150"),
+    ]
+
+    def setUp(self):
+        self.index = FuzzyIndex()
+        self.index.build(
+            ((("listing", pk), f"{brand} {name}") for pk, (brand, name) in enumerate(self.CATALOGUE)),
+            FUZZY_GENERATIONS.read(),
+        )
+
+    def best(self, query):
+        results = self.index.search(query)
+        return results[0]["text"] if results else None
+
+    def test_misspellings_find_the_intended_bike(self):
+        self.assertIn(self.best("royel enfeild"), {"Royal Enfield Classic 350", "Royal Enfield Himalayan"})
+        self.assertTrue(self.best("yamha").startswith("Yamaha"))
+        self.assertEqual(self.best("ktm duk"), "KTM Duke 390")
+        self.assertEqual(self.best("pulsr"), "Bajaj Pulsar 150")
+
+    def test_unrelated_queries_return_nothing(self):
+        for query in ["xyzzy", "scooter", "tesla model"]:
+            with self.subTest(query=query):
+                self.assertEqual(self.index.search(query), [])
+
+    def test_search_view_falls_back_to_fuzzy_matches(self):
+        make_listing(name="Classic 350", brand="Royal Enfield")
+        fuzzy_index.reset()
+        self.addCleanup(fuzzy_index.reset)
+        response = self.client.get(reverse("search"), {"q": "royel enfeild"})
+        self.assertTrue(response.context["fuzzy"])
+        self.assertEqual([hit.object.name for hit in response.context["results"]], ["Classic 350"])
+
+
+
+class GenerationCacheTests(TestCase):
+    def setUp(self):
+        self.addCleanup(shared_cache().clear)
+
+    def test_versioned_cache_hits_until_the_generation_is_bumped(self):
+        cache = VersionedCache("test_results", timeout=60)
+        calls = []
+
+        def compute():
+            calls.append(1)
+            return len(calls)
+
+        self.assertEqual(cache.get_or_compute("brand=honda", compute), 1)
+        self.assertEqual(cache.get_or_compute("brand=honda", compute), 1)
+        self.assertEqual((cache.hits, cache.misses), (1, 1))
+
+        generation = get_generation("test_results")
+        cache.invalidate()
+        self.assertEqual(get_generation("test_results"), generation + 1)
+        self.assertEqual(cache.get_or_compute("brand=honda", compute), 2)
+
+    def test_lookups_count_per_process_and_flush_in_batches(self):
+        cache = VersionedCache("test_results", timeout=60)
+        with mock.patch.object(type(shared_cache()), "incr", wraps=shared_cache().incr) as incr:
+            for _ in range(5):
+                cache.get_or_compute("brand=honda", lambda: 1)
+            incr.assert_not_called()
+            self.assertEqual((cache.hits, cache.misses), (4, 1))
+
+            with self.settings(LISTING_CACHE_STATS_FLUSH=0):
+                cache.get_or_compute("brand=honda", lambda: 1)
+            self.assertEqual(cache.stats()["shared"], {"hits": 5, "misses": 1})
+            cache.get_or_compute("brand=honda", lambda: 1)
+            self.assertEqual(cache.stats()["shared"], {"hits": 6, "misses": 1})
+
+    def test_an_evicted_generation_does_not_come_back_lower(self):
+        generation = get_generation("test_results")
+        shared_cache().delete("bikes:generation:test_results")
+        self.assertGreaterEqual(get_generation("test_results"), generation)
+
+    def test_snapshot_is_kept_in_memory_until_invalidated(self):
+        loads = []
+        snapshot = Snapshot("test_snapshot", lambda: loads.append(1) or len(loads))
+        self.assertEqual((snapshot.get(), snapshot.get()), (1, 1))
+        # Another process bumping the generation is seen through the cache
+        bump_generation("test_snapshot")
+        self.assertEqual(snapshot.get(), 2)
+
+    def test_shared_alias_is_visible_to_other_processes(self):
+        location = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, location)
+        shared = {"BACKEND": "django.core.cache.backends.filebased.FileBasedCache", "LOCATION": location}
+        with override_settings(CACHES={**settings.CACHES, "shared": shared}, BIKES_CACHE_ALIAS="shared"):
+            self.assertFalse(shared_cache_is_per_process())
+            generation = bump_generation("listings")
+            # A second cache object over the same directory stands in for another worker
+            other_worker = FileBasedCache(location, {})
+            self.assertEqual(other_worker.get("bikes:generation:listings"), generation)
+        self.assertTrue(shared_cache_is_per_process())
+
+
+
+class PageCacheTests(TestCase):
+    def setUp(self):
+        shared_cache().clear()
+        self.addCleanup(shared_cache().clear)
+
+    def get(self, url):
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return response.get("X-Page-Cache")
+
+    def test_second_anonymous_request_is_a_hit(self):
+        self.assertEqual(self.get(reverse("about")), "miss")
+        with self.assertNumQueries(0):
+            self.assertEqual(self.get(reverse("about")), "hit")
+        # Another query string is another page
+        self.assertEqual(self.get(reverse("about") + "?utm_source=x"), "miss")
+
+    def test_session_and_messages_cookies_bypass_the_cache(self):
+        self.assertEqual(self.get(reverse("about")), "miss")
+        for cookie in (settings.SESSION_COOKIE_NAME, "messages"):
+            with self.subTest(cookie=cookie):
+                self.client.cookies.clear()
+                self.client.cookies[cookie] = "x"
+                self.assertIsNone(self.get(reverse("about")))
+
+    def test_saves_and_deletes_purge_pages_by_tag(self):
+        use_deployed_feature_column()
+        listing = make_listing(name="Classic 350", brand="Royal Enfield")
+        detail = reverse("bike_detail", args=[listing.id])
+        other = make_listing(name="Duke 390", brand="KTM")
+        other_detail = reverse("bike_detail", args=[other.id])
+        for url in (detail, other_detail, reverse("home")):
+            self.get(url)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            listing.price = Decimal("150000")
+            listing.save()
+        self.assertEqual(self.get(detail), "miss")
+        self.assertEqual(self.get(other_detail), "hit")
+        self.assertEqual(self.get(reverse("home")), "miss")
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Testimonial.objects.create(name="Anu", role="Rider", message="Smooth purchase", image="testimonials/a.jpg")
+        self.assertEqual(self.get(reverse("home")), "miss")
+        self.assertEqual(self.get(other_detail), "hit")
+
+        with self.captureOnCommitCallbacks(execute=True):
+            other.delete()
+        self.assertEqual(self.client.get(other_detail).status_code, 404)
+
+    def test_explicit_purge_without_a_model_signal(self):
+        self.get(reverse("about"))
+        # What a management command or a queryset.update() caller does
+        purge("content:about_section")
+        self.assertEqual(self.get(reverse("about")), "miss")
+
+
+
+class HomepageSnapshotTests(TestCase):
+    def setUp(self):
+        use_deployed_feature_column()
+        shared_cache().clear()
+        self.addCleanup(shared_cache().clear)
+        # A messages cookie bypasses the page cache, so renders go through the snapshot
+        self.client.cookies["messages"] = "x"
+
+    def test_warm_home_page_makes_no_queries(self):
+        make_listing(name="Classic 350", brand="Royal Enfield", is_featured=True)
+        FeatureSection.objects.create(title="Why us", description="Certified pre-owned bikes")
+        self.client.get(reverse("home"))
+        with self.assertNumQueries(0):
+            response = self.client.get(reverse("home"))
+        self.assertContains(response, "Certified pre-owned bikes")
+
+    def test_edits_show_up_on_the_next_render(self):
+        self.client.get(reverse("home"))
+        with self.captureOnCommitCallbacks(execute=True):
+            feature = FeatureSection.objects.create(title="Why us", description="Certified pre-owned bikes")
+        self.assertContains(self.client.get(reverse("home")), "Certified pre-owned bikes")
+
+        with self.captureOnCommitCallbacks(execute=True):
+            listing = make_listing(name="Himalayan 450", brand="Royal Enfield", is_featured=True)
+        self.assertContains(self.client.get(reverse("home")), "Himalayan 450")
+
+        with self.captureOnCommitCallbacks(execute=True):
+            listing.delete()
+            feature.delete()
+        response = self.client.get(reverse("home"))
+        self.assertNotContains(response, "Himalayan 450")
+        self.assertNotContains(response, "Certified pre-owned bikes")
+
+
+
+class ContentRegistryTests(TestCase):
+    def setUp(self):
+        shared_cache().clear()
+        self.addCleanup(shared_cache().clear)
+        # Bypass the page cache so renders go through the registry
+        self.client.cookies["messages"] = "x"
+        AboutSection.objects.create(title="About Drive RP", description="Since 2012", image="about/a.jpg")
+        approach = ApproachSection.objects.create(description="Inspected twice")
+        ApproachImage.objects.create(approach=approach, image="approach_images/one.jpg")
+        AuthImage.objects.create(image="auth_images/old.jpg", is_for_login=True)
+
+    def test_warm_static_pages_make_no_queries(self):
+        for name in ("about", "auth"):
+            with self.subTest(page=name):
+                self.client.get(reverse(name))
+                with self.assertNumQueries(0):
+                    self.assertEqual(self.client.get(reverse(name)).status_code, 200)
+
+    def test_edits_show_up_on_the_next_render(self):
+        self.client.get(reverse("about"))
+        self.client.get(reverse("auth"))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            about = AboutSection.objects.get()
+            about.title = "Our Story"
+            about.save()
+            ApproachImage.objects.create(approach=ApproachSection.objects.get(), image="approach_images/two.jpg")
+            AuthImage.objects.create(image="auth_images/new.jpg", is_for_login=True)
+        response = self.client.get(reverse("about"))
+        self.assertContains(response, "Our Story")
+        self.assertContains(response, "two.jpg")
+        self.assertContains(self.client.get(reverse("auth")), "new.jpg")
+
+        with self.captureOnCommitCallbacks(execute=True):
+            about.delete()
+        self.assertNotContains(self.client.get(reverse("about")), "Our Story")
+
+
+
+@override_settings(BUY_BIKE_PAGE_SIZE=2)
+class BakeTests(TestCase):
+    def setUp(self):
+        use_deployed_feature_column()
+        self.root = Path(tempfile.mkdtemp())
+        self.addCleanup(shutil.rmtree, self.root)
+        for i in range(5):
+            make_listing(name=f"Shine {i}")
+
+    def next_href(self, html):
+        return re.search(r'href="([^"]*)"[^>]*>Next', html).group(1)
+
+    def test_baked_pagination_links_reach_baked_files(self):
+        call_command("bake", output=str(self.root), buy_bike_pages=2, workers=1, stdout=io.StringIO())
+        # /buy-bike/ depends on its query string, so only page paths are baked
+        self.assertFalse((self.root / "buy-bike/index.html").exists())
+
+        first = (self.root / "buy-bike/page/1/index.html").read_text()
+        href = self.next_href(first)
+        self.assertEqual(href, "/buy-bike/page/2/")
+        second = (self.root / output_file(href)).read_text()
+        self.assertIn('href="/buy-bike/page/1/"', second)
+        self.assertIn("Shine 2", second)
+
+        # Past the last baked page, and for filters, links go to the dynamic view
+        self.assertRegex(self.next_href(second), r"^/buy-bike/\?after=")
+        self.assertIn('href="/buy-bike/?price_band=', first)
+
+
+class FacetCountTests(TestCase):
+    """Sidebar counts against plain COUNT queries over BikeForSale"""
+
+    SCENARIOS = [
+        {},
+        {"brand": "honda"},
+        {"brand": "honda", "year": "2021"},
+        {"fuel_type": "petrol", "price_band": "50k_1l"},
+        {"owner_number": "1st", "cc_band": "125_200"},
+        {"brand": "ktm", "min_price": "60000"},
+        {"cc_band": "under_125", "max_km": "30000"},
+    ]
+    RANGES = {"min_price": "price__gte", "max_price": "price__lte", "min_km": "kilometers__gte", "max_km": "kilometers__lte"}
+
+    @classmethod
+    def setUpTestData(cls):
+        for i in range(30):
+            make_listing(
+                name=f"Model {i}",
+                brand=["Honda", "KTM", "honda", "Royal Enfield", "Yamaha"][i % 5],
+                cc=["110", "150cc", "390", "", "125", "650"][i % 6],
+                year=2018 + i % 4,
+                kilometers=2500 * i,
+                fuel_type="electric" if i % 7 == 0 else "petrol",
+                owner_number=["1st", "2nd", "3rd"][i % 3],
+                price=Decimal(30000 + 20000 * (i % 9)),
+                is_active=i % 10 != 9,
+            )
+
+    def setUp(self):
+        facet_index.reset()
+        self.addCleanup(facet_index.reset)
+
+    @staticmethod
+    def band(field, bounds):
+        def q(key):
+            low, high = bounds[key]
+            condition = Q(**{f"{field}__isnull": False})
+            if low is not None:
+                condition &= Q(**{f"{field}__gte": low})
+            if high is not None:
+                condition &= Q(**{f"{field}__lt": high})
+            return condition
+        return q
+
+    def expected(self, params):
+        """(total, {facet: {value: count}}) from COUNT queries, each facet without its own filter"""
+        lookups = {
+            "brand": lambda value: Q(brand__iexact=value),
+            "year": lambda value: Q(year=value),
+            "fuel_type": lambda value: Q(fuel_type=value),
+            "owner_number": lambda value: Q(owner_number=value),
+            "price_band": self.band("price", PRICE_BAND_BOUNDS),
+            "cc_band": self.band("displacement_cc", CC_BAND_BOUNDS),
+        }
+        ranges = Q(is_active=True, **{self.RANGES[name]: value for name, value in params.items() if name in self.RANGES})
+        selected = {name: value for name, value in params.items() if name in lookups}
+        if "year" in selected:
+            selected["year"] = int(selected["year"])
+
+        def matching(*names):
+            return BikeForSale.objects.filter(ranges, *(lookups[name](selected[name]) for name in names))
+
+        counts = {}
+        for name in lookups:
+            others = matching(*(other for other in selected if other != name))
+            if name == "brand":
+                rows = others.annotate(value=Lower("brand")).values_list("value").annotate(listings=Count("id"))
+                counts[name] = dict(rows)
+            elif name in ("price_band", "cc_band"):
+                bounds = PRICE_BAND_BOUNDS if name == "price_band" else CC_BAND_BOUNDS
+                counts[name] = others.aggregate(**{key: Count("id", filter=lookups[name](key)) for key in bounds})
+            else:
+                counts[name] = dict(others.values_list(name).annotate(listings=Count("id")))
+        return matching(*selected).count(), counts
+
+    def assertMatchesCounts(self):
+        for params in self.SCENARIOS:
+            with self.subTest(params=params):
+                facets = listing_results(ListingFilter.from_params(params), engine="orm")["facets"]
+                total, counts = self.expected(params)
+                self.assertEqual(facets["total"], total)
+                for name, expected in counts.items():
+                    shown = {option["value"]: option["count"] for option in facets[name] if option["count"]}
+                    self.assertEqual(shown, {value: n for value, n in expected.items() if n}, name)
+
+    def test_counts_match_count_queries(self):
+        self.assertMatchesCounts()
+        self.assertTrue(facet_index.loaded)
+
+    def test_counts_follow_saves_and_deletes(self):
+        self.assertMatchesCounts()
+        listings = list(BikeForSale.objects.order_by("id"))
+        with self.captureOnCommitCallbacks(execute=True):
+            listings[0].brand, listings[0].price, listings[0].cc = "Yamaha", Decimal(250000), "155"
+            listings[0].save()
+            listings[1].is_active = False
+            listings[1].save()
+            listings[9].is_active = True
+            listings[9].save()
+            listings[2].delete()
+            make_listing(name="New", brand="Honda", cc="110", year=2021)
+        self.assertMatchesCounts()
+
+
+class ListingFilterTests(TestCase):
+    def test_equivalent_queries_share_a_key(self):
+        a = ListingFilter.from_params({"brand": "Honda", "min_price": "40000", "sort": "newest", "year": ""})
+        b = ListingFilter.from_params({"min_price": "40000.00", "brand": " honda "})
+        self.assertEqual(a, b)
+        self.assertEqual(hash(a), hash(b))
+        self.assertEqual(a.key, "brand=honda&min_price=40000.00")
+
+    def test_cc_accepts_free_text(self):
+        self.assertEqual(ListingFilter.from_params({"cc": "149.5 CC"}).cc, 150)
+
+    def test_bad_input_is_rejected(self):
+        bad = [
+            {"year": "abc"},
+            {"min_price": "1e9x"},
+            {"max_price": "NaN"},
+            {"min_km": "-5"},
+            {"fuel_type": "steam"},
+            {"price_band": "cheap"},
+            {"sort": "random"},
+            {"min_cc": "400", "max_cc": "200"},
+        ]
+        for params in bad:
+            with self.subTest(params=params):
+                with self.assertRaises(InvalidFilter) as raised:
+                    ListingFilter.from_params(params)
+                self.assertEqual(set(raised.exception.errors), {next(iter(params))})
+
+    def test_buy_bike_rejects_bad_input(self):
+        response = self.client.get(reverse("buy_bike"), {"year": "abc"})
+        self.assertEqual(response.status_code, 400)
+
+
+class DisplacementFilterTests(TestCase):
+    CC = {"15": 15, "150": 150, "150 cc": 150, "149.6CC": 150, "1500": 1500, "155cc": 155, "": None, "N/A": None}
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.listings = {cc: make_listing(name=f"cc {cc or 'blank'}", cc=cc) for cc in cls.CC}
+
+    def names(self, **params):
+        engines = ["orm"] + (["columnar"] if listing_snapshot.available else [])
+        results = {}
+        for engine in engines:
+            spec = ListingFilter.from_params(params)
+            results[engine] = sorted(bike.name for bike in listing_results(spec, engine=engine)["page"])
+        self.assertEqual(len(set(map(tuple, results.values()))), 1, results)
+        return results["orm"]
+
+    def test_exact_cc_matches_the_whole_number(self):
+        listing_snapshot.reset()
+        self.addCleanup(listing_snapshot.reset)
+        self.assertEqual(self.names(cc="15"), ["cc 15"])
+        self.assertEqual(self.names(cc="150cc"), ["cc 149.6CC", "cc 150", "cc 150 cc"])
+        self.assertEqual(self.names(cc="1500"), ["cc 1500"])
+        self.assertEqual(self.names(min_cc="150", max_cc="155"), ["cc 149.6CC", "cc 150", "cc 150 cc", "cc 155cc"])
+
+        response = self.client.get(reverse("buy_bike"), {"cc": "15"})
+        self.assertEqual([bike.name for bike in response.context["bikes"]], ["cc 15"])
+
+    def test_data_migration_parses_existing_values(self):
+        migration = importlib.import_module("bikes.migrations.0021_bikeforsale_displacement_cc")
+        BikeForSale.objects.update(displacement_cc=None)
+        migration.populate_displacement(django_apps, None)
+        stored = dict(BikeForSale.objects.values_list("cc", "displacement_cc"))
+        self.assertEqual(stored, self.CC)
+        # New and edited rows are parsed on save the same way
+        for cc, expected in self.CC.items():
+            with self.subTest(cc=cc):
+                self.assertEqual(make_listing(cc=cc).displacement_cc, expected)
+
+
+@skipUnless(listing_snapshot.available, "numpy is not installed")
+class ColumnarEngineTests(TestCase):
+    """The columnar snapshot must give exactly the ORM engine's pages and counts"""
+
+    @classmethod
+    def setUpTestData(cls):
+        for i in range(12):
+            BikeForSale.objects.create(
+                name=f"Model {i}",
+                brand=["Honda", "KTM", "honda", "Royal Enfield"][i % 4],
+                cc=["110", "150cc", "390", "", "125"][i % 5],
+                year=2018 + i % 4,
+                kilometers=3000 * i,
+                fuel_type="electric" if i % 5 == 0 else "petrol",
+                owner_number=["1st", "2nd", "3rd"][i % 3],
+                price=Decimal(30000 + 15000 * (i % 7)),
+                location="Chennai",
+            )
+
+    def setUp(self):
+        facet_index.reset()
+        listing_snapshot.reset()
+        self.addCleanup(listing_snapshot.reset)
+        self.addCleanup(facet_index.reset)
+
+    def assertSameResults(self, spec, after=None, before=None):
+        with self.settings(BUY_BIKE_PAGE_SIZE=3):
+            orm = listing_results(spec, after=after, before=before, engine="orm")
+            columnar = listing_results(spec, after=after, before=before, engine="columnar")
+        self.assertEqual([bike.pk for bike in columnar["page"]], [bike.pk for bike in orm["page"]])
+        self.assertEqual(columnar["facets"], orm["facets"])
+        return orm["page"]
+
+    def test_matches_orm_engine(self):
+        for filter_name, params in LISTING_FILTERS.items():
+            for sort in BUY_BIKE_ORDERINGS:
+                with self.subTest(filter=filter_name, sort=sort):
+                    spec = ListingFilter.from_params({**params, "sort": sort})
+                    page = self.assertSameResults(spec)
+                    if page.has_next:
+                        page = self.assertSameResults(spec, after=page.next_cursor)
+                        self.assertSameResults(spec, before=page.previous_cursor)
+
+    def test_follows_listing_changes(self):
+        spec = ListingFilter.from_params({})
+        self.assertSameResults(spec)
+        first = BikeForSale.objects.order_by("id").first()
+        with self.captureOnCommitCallbacks(execute=True):
+            first.price = Decimal(250000)
+            first.save()
+            BikeForSale.objects.order_by("id").last().delete()
+            BikeForSale.objects.filter(pk=first.pk + 1).get().save()
+        self.assertTrue(listing_snapshot.loaded)
+        self.assertSameResults(ListingFilter.from_params({"price_band": "2l_5l"}))
+        self.assertSameResults(spec)
+
+
+class ListingIndexGenerationTests(TestCase):
+    """In-memory indexes must pick up changes committed by another worker"""
+
+    def setUp(self):
+        self.listing = make_listing(name="Duke 390", brand="KTM", cc="390")
+        self.indexes = [facet_index, autocomplete_index, fuzzy_index, listing_snapshot]
+        for index in self.indexes:
+            index.reset()
+            self.addCleanup(index.reset)
+
+    def read_all(self):
+        facets = {option["value"]: option["count"] for option in facet_index.counts({})["brand"]}
+        suggestions = [suggestion["text"] for suggestion in autocomplete_index.suggest("suz", kinds={"brand"})]
+        matches = [match["text"] for match in fuzzy_index.search("suzuki")]
+        columnar = None
+        if listing_snapshot.available:
+            page = listing_snapshot.results(ListingFilter.from_params({"brand": "suzuki"}))
+            columnar = [bike.pk for bike in page["page"]]
+        return facets, suggestions, matches, columnar
+
+    def test_another_workers_change_reloads_every_index(self):
+        facets, suggestions, matches, columnar = self.read_all()
+        self.assertEqual((facets, suggestions, matches), ({"ktm": 1}, [], []))
+
+        # What another worker's commit looks like here: the row changes and
+        # the shared generation is bumped, but no signal runs in this process
+        BikeForSale.objects.filter(pk=self.listing.pk).update(brand="Suzuki")
+        facets, suggestions, matches, columnar = self.read_all()
+        self.assertEqual(facets, {"ktm": 1})
+        bump_generation("listings")
+        facets, suggestions, matches, columnar = self.read_all()
+        self.assertEqual(facets, {"suzuki": 1})
+        self.assertEqual(suggestions, ["Suzuki"])
+        self.assertEqual(matches, ["Suzuki Duke 390"])
+        if listing_snapshot.available:
+            self.assertEqual(columnar, [self.listing.pk])
+
+    def test_own_changes_are_applied_without_reloading(self):
+        self.read_all()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.listing.brand = "Suzuki"
+            self.listing.save()
+        with ExitStack() as stack:
+            for index in self.indexes:
+                stack.enter_context(mock.patch.object(index, "load", side_effect=AssertionError("reloaded")))
+            facets, suggestions, matches, columnar = self.read_all()
+        self.assertEqual((facets, suggestions, matches), ({"suzuki": 1}, ["Suzuki"], ["Suzuki Duke 390"]))
+        if listing_snapshot.available:
+            self.assertEqual(columnar, [self.listing.pk])
+
+    def test_carousel_bike_changes_reach_the_fuzzy_index(self):
+        self.read_all()
+        bike = Bike.objects.create(name="Suzuki Hayabusa")
+        self.assertEqual(fuzzy_index.search("hayabusa"), [])
+        bump_generation("bikes")
+        self.assertEqual(fuzzy_index.search("hayabusa")[0]["text"], "Suzuki Hayabusa")
+        with self.captureOnCommitCallbacks(execute=True):
+            bike.delete()
+        self.assertEqual(fuzzy_index.search("hayabusa"), [])
+
+
+class HistogramTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        for i in range(20):
+            BikeForSale.objects.create(
+                name=f"Model {i}", brand="Honda" if i % 2 else "KTM", cc="150", year=2020,
+                kilometers=4000 * i, fuel_type="petrol", owner_number="1st",
+                price=Decimal(20000 + 12000 * i), location="Chennai",
+            )
+
+    def test_each_histogram_ignores_only_its_own_range(self):
+        spec = ListingFilter.from_params({"brand": "honda", "min_price": "60000", "max_km": "50000"})
+        with self.assertNumQueries(1):
+            result = histograms(spec)
+
+        rows = list(BikeForSale.objects.filter(brand="Honda").values("price", "kilometers"))
+        for name, field, applies in (
+            ("price", "price", lambda row: row["kilometers"] <= 50000),
+            ("kilometers", "kilometers", lambda row: row["price"] >= 60000),
+        ):
+            expected = [
+                sum(
+                    1 for row in rows
+                    if applies(row) and bucket["min"] <= row[field]
+                    and (bucket["max"] is None or row[field] < bucket["max"])
+                )
+                for bucket in result[name]["buckets"]
+            ]
+            self.assertEqual([bucket["count"] for bucket in result[name]["buckets"]], expected)
+        self.assertEqual(result["price"]["selected"], {"min": 60000, "max": None})
+
+
+
+class ImageDerivativeTests(TestCase):
+    def setUp(self):
+        self.media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media)
+        media = override_settings(MEDIA_ROOT=self.media)
+        media.enable()
+        self.addCleanup(media.disable)
+
+    def upload(self, size, color="red", name="photo.jpg", **save_options):
+        buffer = io.BytesIO()
+        Image.new("RGB", size, color).save(buffer, "JPEG", **save_options)
+        return SimpleUploadedFile(name, buffer.getvalue(), content_type="image/jpeg")
+
+    def test_variants_are_generated_and_the_original_size_recorded(self):
+        # Large enough for draft() to decode it at half scale
+        listing = make_listing(image=self.upload((4000, 4000)))
+        description = listing.image_derivatives
+        self.assertEqual((description["width"], description["height"]), (4000, 4000))
+        self.assertEqual(
+            {variant: (entry["width"], entry["height"]) for variant, entry in description["variants"].items()},
+            {"full": (1920, 1920), "detail": (1280, 1280), "card": (640, 640), "thumb": (160, 160)},
+        )
+        for name in derivative_files(description):
+            self.assertTrue(default_storage.exists(name), name)
+        with default_storage.open(description["variants"]["card"]["webp"]) as card:
+            self.assertEqual(Image.open(card).format, "WEBP")
+
+    def test_rotated_photos_record_their_displayed_size(self):
+        exif = Image.Exif()
+        exif[ExifTags.Base.Orientation] = 6
+        listing = make_listing(image=self.upload((800, 600), exif=exif))
+        description = listing.image_derivatives
+        self.assertEqual((description["width"], description["height"]), (600, 800))
+        self.assertEqual(description["variants"]["card"]["height"], 640)
+
+    def test_responsive_image_tag(self):
+        listing = make_listing(image=self.upload((800, 600)))
+        html = Template('{% load bike_images %}{% responsive_image bike "card" sizes="50vw" class="x" %}').render(
+            Context({"bike": listing})
+        )
+        card = listing.image_derivatives["variants"]["card"]
+        self.assertIn('<picture><source type="image/webp" srcset="', html)
+        self.assertIn(f'{default_storage.url(card["webp"])} 640w', html)
+        self.assertIn(f'src="{default_storage.url(card["jpeg"])}"', html)
+        self.assertIn('width="640" height="480"', html)
+        self.assertIn('class="x"', html)
+
+        # Without derivatives the original is shown as it is
+        BikeForSale.objects.filter(pk=listing.pk).update(image_derivatives={})
+        listing.refresh_from_db()
+        html = Template('{% load bike_images %}{% responsive_image bike %}').render(Context({"bike": listing}))
+        self.assertTrue(html.startswith(f'<img src="{listing.image.url}"'))
+
+    def test_derivatives_follow_the_image(self):
+        listing = make_listing(image=self.upload((800, 600)))
+        first = listing.image_derivatives
+
+        # Saves that leave the image alone do not regenerate anything
+        with mock.patch("bikes.models.generate_derivatives") as generate:
+            listing.price = Decimal("60000")
+            listing.save()
+            listing.save(update_fields=["price"])
+        generate.assert_not_called()
+
+        listing.image = self.upload((1200, 900), color="blue")
+        listing.save()
+        self.assertNotEqual(listing.image_derivatives["source"], first["source"])
+        self.assertEqual(listing.image_derivatives["width"], 1200)
+        listing.refresh_from_db()
+        self.assertEqual(listing.image_derivatives["source"], listing.image.name)
+
+        listing.image = None
+        listing.save()
+        self.assertEqual(listing.image_derivatives, {})
+
+
+
+class BackfillDerivativesTests(TestCase):
+    def setUp(self):
+        use_deployed_feature_column()
+        self.media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media)
+        media = override_settings(MEDIA_ROOT=self.media)
+        media.enable()
+        self.addCleanup(media.disable)
+        self.addCleanup(shared_cache().clear)
+
+    def listing(self, color):
+        buffer = io.BytesIO()
+        Image.new("RGB", (800, 600), color).save(buffer, "JPEG")
+        listing = make_listing(image=SimpleUploadedFile("photo.jpg", buffer.getvalue()))
+        # As if uploaded before derivatives existed
+        for name in derivative_files(listing.image_derivatives):
+            default_storage.delete(name)
+        BikeForSale.objects.filter(pk=listing.pk).update(image_derivatives={})
+        return listing
+
+    def backfill(self, **options):
+        out, err = io.StringIO(), io.StringIO()
+        call_command("backfill_derivatives", model=["BikeForSale"], workers=1, stdout=out, stderr=err, **options)
+        return out.getvalue(), err.getvalue()
+
+    def test_missing_sources_are_skipped_and_the_rest_backfilled(self):
+        first, second = self.listing("red"), self.listing("blue")
+        missing = make_listing()
+        BikeForSale.objects.filter(pk=missing.pk).update(image="bikes_for_sale/missing.jpg")
+
+        out, err = self.backfill()
+        self.assertIn("3 images to process, 0 up to date", out)
+        self.assertIn(f"#{missing.pk}: bikes_for_sale/missing.jpg: FileNotFoundError", err)
+        self.assertIn("Generated derivatives for 2 images", out)
+        for listing in (first, second):
+            listing.refresh_from_db()
+            self.assertEqual(listing.image_derivatives["source"], listing.image.name)
+            for name in derivative_files(listing.image_derivatives):
+                self.assertTrue(default_storage.exists(name), name)
+        missing.refresh_from_db()
+        self.assertEqual(missing.image_derivatives, {})
+
+    def test_rerun_only_processes_what_is_left(self):
+        listing = self.listing("red")
+        self.assertIn("1 images to process", self.backfill()[0])
+        self.assertIn("0 images to process, 1 up to date", self.backfill()[0])
+
+        # A deleted derivative makes just that image stale again
+        listing.refresh_from_db()
+        default_storage.delete(listing.image_derivatives["variants"]["card"]["webp"])
+        self.assertIn("1 images to process, 0 up to date", self.backfill()[0])
+
+    def test_forced_regeneration_over_the_limit_keeps_the_stored_derivatives(self):
+        listing = self.listing("red")
+        self.backfill()
+        listing.refresh_from_db()
+        stored = listing.image_derivatives
+        self.assertTrue(stored["variants"])
+
+        out, err = self.backfill(force=True, max_megapixels=0.1)
+        self.assertIn(f"Skipped bikes.BikeForSale.image #{listing.pk}", err)
+        self.assertIn("Generated derivatives for 0 images", out)
+        self.assertIn("1 failed", out)
+        listing.refresh_from_db()
+        self.assertEqual(listing.image_derivatives, stored)
+        for name in derivative_files(stored):
+            self.assertTrue(default_storage.exists(name), name)
+
+    def test_cached_pages_are_purged(self):
+        listing = self.listing("red")
+        detail = reverse("bike_detail", args=[listing.pk])
+        self.client.get(detail)
+        self.assertEqual(self.client.get(detail)["X-Page-Cache"], "hit")
+        self.backfill()
+        response = self.client.get(detail)
+        self.assertEqual(response["X-Page-Cache"], "miss")
+        listing.refresh_from_db()
+        self.assertContains(response, listing.image_derivatives["variants"]["detail"]["jpeg"])
+
+
+class ResizedMediaTests(TestCase):
+    def setUp(self):
+        self.media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media)
+        settings = override_settings(
+            MEDIA_ROOT=self.media,
+            MEDIA_RESIZE_ROOT=Path(self.media) / "cache",
+            MEDIA_RESIZE_SIZES=["400x400", "640x480"],
+        )
+        settings.enable()
+        self.addCleanup(settings.disable)
+        Path(self.media, "testimonials").mkdir()
+        Image.new("RGB", (2000, 1000), "red").save(Path(self.media, "testimonials", "anu.jpg"))
+
+    def test_resizes_once_and_caches_forever(self):
+        url = reverse("resized_media", args=[640, 480, "testimonials/anu.jpg"])
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn("immutable", response["Cache-Control"])
+        with Image.open(io.BytesIO(b"".join(response.streaming_content))) as image:
+            self.assertEqual(image.size, (640, 320))
+        self.assertEqual(self.client.get(url).status_code, 200)
+        self.assertEqual(len(list(Path(self.media, "cache").glob("*/*"))), 1)
+
+    def test_rejects_sizes_outside_the_whitelist_and_paths_outside_media(self):
+        self.assertEqual(self.client.get("/media/r/641x480/testimonials/anu.jpg").status_code, 404)
+        self.assertEqual(self.client.get("/media/r/640x480/testimonials/missing.jpg").status_code, 404)
+        self.assertEqual(self.client.get("/media/r/640x480/../../etc/passwd").status_code, 404)
+
+    def test_evicts_least_recently_used_beyond_the_byte_budget(self):
+        cache = ResizeCache()
+        first = cache.get("testimonials/anu.jpg", 640, 480)
+        size = first.stat().st_size
+        os.utime(first, (0, 0))
+        with override_settings(MEDIA_RESIZE_CACHE_BYTES=size + 1):
+            second = cache.get("testimonials/anu.jpg", 400, 400)
+        self.assertFalse(first.exists())
+        self.assertTrue(second.exists())
+
+
+class MediaFileTests(TestCase):
+    def setUp(self):
+        self.media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media)
+        settings = override_settings(MEDIA_ROOT=self.media)
+        settings.enable()
+        self.addCleanup(settings.disable)
+        Path(self.media, "bikes_for_sale").mkdir()
+        Path(self.media, "bikes_for_sale", "r15.jpg").write_bytes(bytes(range(256)) * 4)
+        Path(self.media, "bikes_for_sale", "r15.3f2a9c0d1e4b.jpg").write_bytes(b"hashed")
+
+    def get(self, name, **headers):
+        return self.client.get(f"/media/bikes_for_sale/{name}", headers=headers)
+
+    def test_validators_and_not_modified(self):
+        response = self.get("r15.jpg")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(b"".join(response.streaming_content)), 1024)
+        self.assertEqual(response["Content-Type"], "image/jpeg")
+        self.assertNotIn("immutable", response["Cache-Control"])
+
+        self.assertEqual(self.get("r15.jpg", if_none_match=response["ETag"]).status_code, 304)
+        self.assertEqual(self.get("r15.jpg", if_modified_since=response["Last-Modified"]).status_code, 304)
+
+    def test_byte_ranges(self):
+        response = self.get("r15.jpg", range="bytes=10-19")
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(response["Content-Range"], "bytes 10-19/1024")
+        self.assertEqual(b"".join(response.streaming_content), bytes(range(10, 20)))
+
+        response = self.get("r15.jpg", range="bytes=-4")
+        self.assertEqual(b"".join(response.streaming_content), bytes(range(252, 256)))
+        self.assertEqual(self.get("r15.jpg", range="bytes=2000-").status_code, 416)
+        # A stale If-Range gets the whole, current file
+        self.assertEqual(self.get("r15.jpg", range="bytes=0-1", if_range='"stale"').status_code, 200)
+
+    def test_hashed_names_are_immutable(self):
+        self.assertIn("immutable", self.get("r15.3f2a9c0d1e4b.jpg")["Cache-Control"])
+        self.assertEqual(self.get("missing.jpg").status_code, 404)
+        self.assertEqual(self.client.get("/media/bikes_for_sale/").status_code, 404)
+
+
+class ContentAddressedStorageTests(TestCase):
+    def setUp(self):
+        self.media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media)
+        settings = override_settings(MEDIA_ROOT=self.media)
+        settings.enable()
+        self.addCleanup(settings.disable)
+
+    def upload(self, color, name="photo.JPG"):
+        buffer = io.BytesIO()
+        Image.new("RGB", (800, 600), color).save(buffer, "JPEG")
+        return SimpleUploadedFile(name, buffer.getvalue(), content_type="image/jpeg")
+
+    def listing(self, image):
+        return BikeForSale.objects.create(
+            name="R15", brand="Yamaha", cc="155", year=2021, kilometers=1000,
+            price=Decimal(150000), location="Chennai", image=image,
+        )
+
+    def test_identical_uploads_share_one_blob(self):
+        first = self.listing(self.upload("red"))
+        second = self.listing(self.upload("red", name="copy.jpg"))
+        self.assertEqual(first.image.name, second.image.name)
+        self.assertRegex(first.image.name, r"^blobs/[0-9a-f]{2}/[0-9a-f]{64}\.jpg$")
+        self.assertEqual(first.image_derivatives, second.image_derivatives)
+        self.assertIn("immutable", self.client.get(first.image.url)["Cache-Control"])
+
+    def test_collect_media_deletes_only_unreferenced_blobs(self):
+        use_deployed_feature_column()
+        kept = self.listing(self.upload("red"))
+        shared = self.listing(self.upload("red"))
+        replaced = self.listing(self.upload("blue"))
+        old_files = [replaced.image.name, *derivative_files(replaced.image_derivatives)]
+
+        # Replacing one user of a shared blob leaves it, and its derivatives, in place
+        shared.image = self.upload("green")
+        shared.save()
+        replaced.image = self.upload("green")
+        replaced.save()
+        for name in [kept.image.name, *derivative_files(kept.image_derivatives), *old_files]:
+            self.assertTrue(default_storage.exists(name), name)
+
+        call_command("collect_media", grace=0, stdout=io.StringIO())
+        for name in [kept.image.name, *derivative_files(kept.image_derivatives),
+                     replaced.image.name, *derivative_files(replaced.image_derivatives)]:
+            self.assertTrue(default_storage.exists(name), name)
+        for name in old_files:
+            self.assertFalse(default_storage.exists(name), name)
+
+
+class FailingEmailBackend(BaseEmailBackend):
+    def send_messages(self, email_messages):
+        raise smtplib.SMTPServerDisconnected("Connection unexpectedly closed")
+
+
+class FlakyEmailBackend(locmem.EmailBackend):
+    """Counts opened connections; the first one is dropped by the "server" on its first send"""
+    opened = 0
+
+    def open(self):
+        FlakyEmailBackend.opened += 1
+        self.dropped = FlakyEmailBackend.opened > 1
+        return True
+
+    def send_messages(self, messages):
+        if not self.dropped:
+            self.dropped = True
+            raise smtplib.SMTPServerDisconnected("Connection unexpectedly closed")
+        return super().send_messages(messages)
+
+
+CONTACT_FORM = {
+    "name": "Anu Raj", "email": "anu@example.com", "phone": "9876543210",
+    "reason": "buy_bike", "source": "google", "message": "Looking for a used R15 under 1.2 lakh.",
+}
+
+
+class EmailOutboxTests(TestCase):
+    def setUp(self):
+        # The dispatcher's connection outlives a test; start each one afresh
+        dispatcher.close()
+        self.addCleanup(dispatcher.close)
+        limiter.reset()
+
+    def submit(self, **fields):
+        response = self.client.post(reverse("api"), {**CONTACT_FORM, **fields})
+        self.assertEqual(response.status_code, 200, response.content)
+        return ContactSubmission.objects.get(id=response.json()["submission_id"])
+
+    def test_submission_queues_emails_without_sending(self):
+        submission = self.submit()
+        self.assertEqual(len(mail.outbox), 0)
+        self.assertEqual(
+            sorted(submission.outbox_messages.values_list("kind", flat=True)),
+            ["admin_notification", "confirmation"],
+        )
+
+        call_command("send_outbox", once=True, stdout=io.StringIO())
+        self.assertEqual(sorted(message.to[0] for message in mail.outbox), ["anu@example.com", "info@driverp.in"])
+        submission.refresh_from_db()
+        self.assertTrue(submission.email_sent)
+        self.assertIsNotNone(submission.email_sent_at)
+        self.assertFalse(EmailOutbox.objects.exclude(status="sent").exists())
+
+    @override_settings(EMAIL_BACKEND="bikes.tests.FailingEmailBackend", OUTBOX_MAX_ATTEMPTS=2)
+    def test_failures_back_off_then_give_up(self):
+        submission = self.submit()
+        started = timezone.now()
+        self.assertEqual(deliver_outbox(), (0, 2))
+        item = submission.outbox_messages.first()
+        self.assertEqual((item.status, item.attempts), ("pending", 1))
+        self.assertGreaterEqual(item.next_attempt_at, started + timedelta(seconds=30))
+        # Not due yet
+        self.assertEqual(deliver_outbox(), (0, 0))
+
+        EmailOutbox.objects.update(next_attempt_at=timezone.now())
+        self.assertEqual(deliver_outbox(), (0, 2))
+        self.assertEqual(set(EmailOutbox.objects.values_list("status", flat=True)), {"failed"})
+        submission.refresh_from_db()
+        self.assertFalse(submission.email_sent)
+
+    @override_settings(EMAIL_BACKEND="bikes.tests.FlakyEmailBackend")
+    def test_one_connection_is_reused_and_replaced_when_dropped(self):
+        FlakyEmailBackend.opened = 0
+        for number in range(3):
+            self.submit(email=f"rider{number}@example.com")
+        before = dict(dispatcher.counts)
+
+        self.assertEqual(deliver_outbox(), (6, 0))
+        self.assertEqual(len(mail.outbox), 6)
+        # The first connection was dropped on its first message, which went
+        # out on the second; every other message reused that one
+        self.assertEqual(FlakyEmailBackend.opened, 2)
+        self.assertEqual(dispatcher.counts["reconnects"] - before["reconnects"], 1)
+        self.assertEqual(dispatcher.counts["messages"] - before["messages"], 6)
+
+    @override_settings(CONTACT_ADMIN_DIGEST_SIZE=3)
+    def test_admin_digest_batches_notifications(self):
+        self.submit(email="rider0@example.com")
+        self.submit(email="rider1@example.com")
+        self.assertEqual(deliver_outbox(), (2, 0))
+        self.assertEqual([message.to for message in mail.outbox], [["rider0@example.com"], ["rider1@example.com"]])
+
+        self.submit(email="rider2@example.com")
+        self.assertEqual(deliver_outbox(), (4, 0))
+        digest = next(message for message in mail.outbox if message.to == ["info@driverp.in"])
+        self.assertEqual(digest.subject, "3 New Inquiries - Drive RP")
+        self.assertEqual(len(mail.outbox), 4)
+        self.assertEqual(ContactSubmission.objects.filter(email_sent=True).count(), 3)
+
+    def test_web_processes_drain_the_outbox_once_a_submission_commits(self):
+        self.addCleanup(setattr, outbox_drainer, "_thread", None)
+        with mock.patch("bikes.mail.threading.Thread") as thread:
+            with self.captureOnCommitCallbacks(execute=True):
+                self.submit()
+            thread.assert_not_called()  # OUTBOX_DRAIN = "worker": send_outbox's job
+
+            with self.settings(OUTBOX_DRAIN="web"), self.captureOnCommitCallbacks(execute=True):
+                self.submit(email="rider@example.com")
+                thread.assert_not_called()  # not before the commit
+            thread.assert_called_once()
+            thread.return_value.start.assert_called_once()
+
+        # What the drainer thread runs on each wake
+        self.assertEqual(drain_outbox(batch_size=1), (4, 0))
+        self.assertEqual(len(mail.outbox), 4)
+        self.assertEqual(drain_outbox(), (0, 0))
+
+
+
+class ContactBulkAPITests(TestCase):
+    def setUp(self):
+        limiter.reset()
+
+    def post(self, body, content_type):
+        return self.client.post(reverse("api_bulk"), body, content_type=content_type)
+
+    @override_settings(BULK_CONTACT_BATCH_SIZE=25)
+    def test_valid_items_are_inserted_in_batches_and_queued(self):
+        items = [{**CONTACT_FORM, "email": f"rider{number}@example.com"} for number in range(60)]
+        items[7] = {**CONTACT_FORM, "email": "not-an-email"}
+        items[30] = "not an object"
+        with CaptureQueriesContext(connection) as queries:
+            response = self.post(json.dumps(items), "application/json")
+        self.assertEqual(response.status_code, 200, response.content)
+        result = response.json()
+        self.assertEqual((result["created"], result["rejected"]), (58, 2))
+        self.assertEqual([error["index"] for error in result["errors"]], [7, 30])
+        self.assertIn("email", result["errors"][0]["errors"])
+        # 58 submissions and 116 outbox rows in batches of 25, not a row at a time
+        self.assertLessEqual(len(queries), 12)
+
+        self.assertEqual(ContactSubmission.objects.count(), 58)
+        self.assertEqual(EmailOutbox.objects.filter(status="pending").count(), 116)
+        self.assertEqual(
+            set(ContactSubmission.objects.values_list("id", flat=True)),
+            {uuid.UUID(submission_id) for submission_id in result["submission_ids"]},
+        )
+
+    def test_ndjson_reports_bad_lines_and_malformed_bodies_are_rejected(self):
+        lines = [json.dumps(CONTACT_FORM), "{not json", "", json.dumps({**CONTACT_FORM, "reason": ""})]
+        response = self.post("\n".join(lines), "application/x-ndjson")
+        result = response.json()
+        self.assertEqual((result["created"], result["rejected"]), (1, 2))
+        self.assertEqual([error["index"] for error in result["errors"]], [1, 2])
+
+        self.assertEqual(self.post(json.dumps(CONTACT_FORM), "application/json").status_code, 400)
+        self.assertEqual(self.post(json.dumps([{"name": ""}]), "application/json").status_code, 400)
+        with override_settings(BULK_CONTACT_MAX_ITEMS=2):
+            self.assertEqual(self.post(json.dumps([CONTACT_FORM] * 3), "application/json").status_code, 413)
+        self.assertEqual(ContactSubmission.objects.count(), 1)
+
+
+
+class RateLimitTests(TestCase):
+    def setUp(self):
+        limiter.reset()
+        self.addCleanup(limiter.reset)
+
+    @override_settings(RATE_LIMITS={"contact_api": "3/m"})
+    def test_bursts_then_answers_429_per_client(self):
+        for _ in range(3):
+            self.assertEqual(self.client.post(reverse("api"), CONTACT_FORM).status_code, 200)
+        with self.assertNumQueries(0):
+            response = self.client.post(reverse("api"), CONTACT_FORM)
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(response["Retry-After"], "20")
+        # Other clients and safe methods have buckets of their own
+        other = self.client.post(reverse("api"), CONTACT_FORM, HTTP_X_FORWARDED_FOR="203.0.113.9")
+        self.assertEqual(other.status_code, 200)
+        self.assertEqual(self.client.get(reverse("api")).status_code, 200)
+        self.assertEqual(limiter.stats()["throttled"], {"contact_api": 1})
+
+    @override_settings(RATE_LIMITS={"contact_api": "2/m"}, RATELIMIT_TRUSTED_PROXIES=1)
+    def test_spoofed_forwarded_for_does_not_reset_the_bucket(self):
+        # The proxy appends the real client address after whatever it sent
+        statuses = [
+            self.client.post(
+                reverse("api"), CONTACT_FORM, HTTP_X_FORWARDED_FOR=f"10.0.0.{number}, 198.51.100.7",
+            ).status_code
+            for number in range(4)
+        ]
+        self.assertEqual(statuses, [200, 200, 429, 429])
+
+        with self.settings(RATELIMIT_TRUSTED_PROXIES=0):
+            # No proxy: the header is the client's own and is ignored
+            response = self.client.post(reverse("api"), CONTACT_FORM, HTTP_X_FORWARDED_FOR="10.0.0.9")
+            self.assertEqual(response.status_code, 200)
+            for number in range(2):
+                response = self.client.post(reverse("api"), CONTACT_FORM, HTTP_X_FORWARDED_FOR=f"10.1.0.{number}")
+            self.assertEqual(response.status_code, 429)
+
+    def test_bucket_refills_at_the_steady_rate(self):
+        arrival = None
+        for _ in range(2):
+            arrival, wait = take(arrival, 100.0, 30.0, 2)
+            self.assertEqual(wait, 0)
+        self.assertEqual(take(arrival, 100.0, 30.0, 2), (None, 30.0))
+        self.assertEqual(take(arrival, 130.0, 30.0, 2), (190.0, 0))
+
+    @override_settings(
+        RATE_LIMITS={"contact_validate": "1/h"}, RATELIMIT_CACHE_ALIAS="default",
+    )
+    def test_shared_buckets(self):
+        self.addCleanup(caches["default"].clear)
+        data = {"field_name": "email", "field_value": "anu@example.com"}
+        self.assertEqual(self.client.post(reverse("validate_field"), data).status_code, 200)
+        limiter.reset()
+        # Another worker (a reset local state) still sees the shared bucket
+        self.assertEqual(self.client.post(reverse("validate_field"), data).status_code, 429)
+
+
+class EmailTemplateTests(TestCase):
+    def setUp(self):
+        email_templates.invalidate()
+        self.submission = ContactSubmission.objects.create(
+            name="Anu & Co", email="anu@example.com", reason="sell_bike", message="2019 Pulsar, 20k km",
+        )
+
+    def test_file_templates_are_sent_as_multipart(self):
+        message = build_admin_notification(self.submission)
+        self.assertEqual(message.subject, "New Sell a Bike Inquiry - Drive RP")
+        self.assertIn("Name: Anu & Co", message.body)
+        [(html, mimetype)] = message.alternatives
+        self.assertEqual(mimetype, "text/html")
+        self.assertIn("Anu &amp; Co", html)
+
+    def test_active_template_is_compiled_once_and_replaced_on_save(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            template = ContactEmailTemplate.objects.create(
+                name="Warm", template_type="confirmation", subject="Thanks {{ name }}",
+                body_text="Hi {{ name }}", body_html="<p>Hi {{ name }}</p>",
+            )
+        message = build_user_confirmation(self.submission)
+        self.assertEqual((message.subject, message.body), ("Thanks Anu & Co", "Hi Anu & Co"))
+        self.assertEqual(message.alternatives[0][0], "<p>Hi Anu &amp; Co</p>")
+        with self.assertNumQueries(0):
+            build_user_confirmation(self.submission)
+
+        template.subject = "We got your message, {{ name }}"
+        with self.captureOnCommitCallbacks(execute=True):
+            template.save()
+        self.assertEqual(build_user_confirmation(self.submission).subject, "We got your message, Anu & Co")
@@ -1,10 +1,13 @@
+from django.conf import settings
 from django.urls import path
 from . import views
 
 urlpatterns = [
     path("", views.home, name="home"),
     path("search/", views.search, name="search"),  # ✅ here is the "search" url
+    path("autocomplete/", views.autocomplete, name="autocomplete"),
     path("buy-bike/", views.buy_bike, name="buy_bike"),
+    path("buy-bike/histograms/", views.listing_histograms, name="listing_histograms"),
      path('contact/', views.contact_view, name='contact'),
     
     # AJAX validation endpoint
@@ -12,6 +15,7 @@ urlpatterns = [
     
     # API endpoint
     path('api/', views.ContactAPIView.as_view(), name='api'),
+    path('api/bulk/', views.ContactBulkAPIView.as_view(), name='api_bulk'),
     
     # Admin dashboard (requires staff permissions)
     path('dashboard/', views.contact_dashboard, name='dashboard'),
@@ -19,6 +23,9 @@ urlpatterns = [
     # Bulk actions (admin)
     path('bulk-update/', views.bulk_update_submissions, name='bulk_update'),
 
+    # Result cache hit/miss counters (admin)
+    path('cache-stats/', views.cache_stats, name='cache_stats'),
+
     path("auth/", views.auth_view, name="auth"),
 
     path("about/", views.about, name="about"),
@@ -26,5 +33,9 @@ urlpatterns = [
     path('sell_motorcycle/', views.sell_motorcycle, name='sell_motorcycle'),
      path('bike/<int:id>/', views.bike_detail, name='bike_detail'),
 
+    # Uploads resized on demand, e.g. /media/r/640x480/testimonials/anu.jpg
+    path(f"{settings.MEDIA_URL.strip('/')}/r/<int:width>x<int:height>/<path:path>",
+         views.resized_media, name='resized_media'),
+
 
 ]
@@ -10,125 +10,198 @@ from django.views.decorators.http import require_http_methods
 # from django.core.paginator import Paginator
 import json
 from .models import AuthImage
+from .search import search_catalogue, fuzzy_search_catalogue
+from .autocomplete import autocomplete_index
+from .homepage import homepage_snapshot
+from .content import content_registry
+from .pagecache import page_cache
 
 
+@page_cache("listings", "bikes", "testimonials", "content:feature", "content:rider_section")
 def home(request):
-    bikes = Bike.objects.all()[:5]
-    bikes_for_sale = BikeForSale.objects.filter(is_featured=True, is_active=True)[:3]
-    feature = FeatureSection.objects.first()
-    testimonials = Testimonial.objects.all()[:3]
-    rider_section = RiderTrustSection.objects.first()  # ✅ fetch section
-
-    context = {
-        'bikes': bikes,
-        'bikes_for_sale': bikes_for_sale,
-        'feature': feature,
-        'testimonials': testimonials,
-        'rider_section': rider_section,
-    }
-    return render(request, "home.html", context)
+    # Served from the homepage snapshot: no queries once the cache is warm
+    return render(request, "home.html", homepage_snapshot.get())
 
 
+@page_cache("listings", "bikes")
 def search(request):
+    query = request.GET.get("q", "").strip()
+    results = search_catalogue(query) if query else []
+    fuzzy = False
+    if query and not results:
+        # Nothing matched word for word; fall back to typo-tolerant matching
+        results = fuzzy_search_catalogue(query)
+        fuzzy = bool(results)
+    return render(request, "search.html", {"results": results, "query": query, "fuzzy": fuzzy})
+
+@require_http_methods(["GET"])
+def autocomplete(request):
+    """Typeahead suggestions for brand / model / variant, served from memory"""
     query = request.GET.get("q", "")
-    results = Bike.objects.filter(name__icontains=query) if query else []
-    return render(request, "search.html", {"results": results, "query": query})
+    try:
+        limit = min(max(int(request.GET.get("limit", 8)), 1), 20)
+    except ValueError:
+        limit = 8
+    kinds = {"brand"} if request.GET.get("field") == "brand" else None
+    suggestions = autocomplete_index.suggest(query, limit=limit, kinds=kinds)
+    return JsonResponse({"query": query, "suggestions": suggestions})
 
 # about page
+@page_cache("content:about_section", "content:mission", "content:approach_section")
 def about(request):
-    about_section = AboutSection.objects.first()          # Get about section
-    mission = MissionSection.objects.first()              # Get mission section
-    approach_section = ApproachSection.objects.prefetch_related("images").first()  # Get approach section + related images
-
-    return render(
-        request,
-        "about.html",
-        {
-            "about_section": about_section,
-            "mission": mission,
-            "approach_section": approach_section,
-        }
-    )
-
+    # Section objects (and the approach images) come from the content registry
+    context = content_registry.get_many("about_section", "mission", "approach_section")
+    return render(request, "about.html", context)
 
 from django.shortcuts import render
-from .models import BikeForSale
+from django.conf import settings
+from django.http import HttpResponseBadRequest
+from dataclasses import replace
+from .pagination import KeysetPaginator, InvalidCursor, cursor_querystring
+from .facets import facet_index
+from .filters import ListingFilter, InvalidFilter, RANGE_FIELDS, DEFAULT_SORT
+from .histograms import histograms
+from .cache import listing_cache
+from .columnar import listing_snapshot
+
+
+def listing_results(spec, after=None, before=None, engine=None):
+    """Page of listings plus sidebar facet counts for a ListingFilter"""
+    per_page = getattr(settings, "BUY_BIKE_PAGE_SIZE", 24)
+    engine = engine or getattr(settings, "BUY_BIKE_ENGINE", "orm")
+    if engine == "columnar" and listing_snapshot.available:
+        # Masks over the in-memory snapshot; only the page's rows are fetched
+        try:
+            return listing_snapshot.results(spec, after=after, before=before, per_page=per_page)
+        except InvalidCursor:
+            return listing_snapshot.results(spec, per_page=per_page)
+
+    # Keyset pagination: no OFFSET and no COUNT(*), page 500 costs the same as page 1
+    # (id ends every ordering so each row has a unique cursor position)
+    paginator = KeysetPaginator(spec.queryset(), spec.ordering, per_page=per_page)
+    try:
+        page = paginator.page(after=after, before=before)
+    except InvalidCursor:
+        page = paginator.page()
+
+    # Sidebar counts come from the in-memory facet cube; range filters narrow
+    # it with one grouped query instead of the cube
+    narrowed = spec.only(*RANGE_FIELDS).queryset() if spec.has_range_filters else None
+    facets = facet_index.counts(spec.selected_facets(), narrowed)
+    return {"page": page, "facets": facets}
 
+
+@page_cache("listings")
 def buy_bike(request):
-    bikes = BikeForSale.objects.filter(is_active=True)
-
-    # Filters
-    brand = request.GET.get("brand")
-    year = request.GET.get("year")
-    fuel = request.GET.get("fuel_type")
-    owner = request.GET.get("owner_number")
-    cc = request.GET.get("cc")
-    min_price = request.GET.get("min_price")
-    max_price = request.GET.get("max_price")
-    min_km = request.GET.get("min_km")
-    max_km = request.GET.get("max_km")
-
-    if brand:
-        bikes = bikes.filter(brand__iexact=brand)
-    if year:
-        bikes = bikes.filter(year=year)
-    if fuel:
-        bikes = bikes.filter(fuel_type=fuel)
-    if owner:
-        bikes = bikes.filter(owner_number=owner)
-    if cc:
-        bikes = bikes.filter(cc__icontains=cc)
-    if min_price:
-        bikes = bikes.filter(price__gte=min_price)
-    if max_price:
-        bikes = bikes.filter(price__lte=max_price)
-    if min_km:
-        bikes = bikes.filter(kilometers__gte=min_km)
-    if max_km:
-        bikes = bikes.filter(kilometers__lte=max_km)
-
-    # Sorting
-    sort_by = request.GET.get("sort", "newest")
-    if sort_by == "price_low":
-        bikes = bikes.order_by("price")
-    elif sort_by == "price_high":
-        bikes = bikes.order_by("-price")
-    else:  # newest
-        bikes = bikes.order_by("-created_at")
+    try:
+        spec = ListingFilter.from_params(request.GET)
+    except InvalidFilter as e:
+        return HttpResponseBadRequest(f"Invalid filter: {e}")
+
+    after, before = request.GET.get("after"), request.GET.get("before")
+
+    # Popular filter combinations are served from the versioned result cache;
+    # any BikeForSale change bumps the generation and retires every entry
+    results = listing_cache.get_or_compute(
+        "&".join([spec.key, f"after={after or ''}", f"before={before or ''}"]),
+        lambda: listing_results(spec, after=after, before=before),
+    )
+    page, facets = results["page"], results["facets"]
+
+    price_bands = [
+        {**option, "query": cursor_querystring(request, price_band=option["value"])}
+        for option in facets["price_band"]
+    ]
+    cc_bands = [
+        {**option, "query": cursor_querystring(request, cc_band=option["value"])}
+        for option in facets["cc_band"]
+    ]
 
     context = {
-        "bikes": bikes,
-        "brands": BikeForSale.objects.values_list("brand", flat=True).distinct(),
-        "years": BikeForSale.objects.values_list("year", flat=True).distinct(),
+        "bikes": page,
+        "page": page,
+        "next_query": cursor_querystring(request, after=page.next_cursor) if page.has_next else "",
+        "previous_query": cursor_querystring(request, before=page.previous_cursor) if page.has_previous else "",
+        "facets": facets,
+        "price_bands": price_bands,
+        "cc_bands": cc_bands,
     }
     return render(request, "buy_bike.html", context)
 
+@require_http_methods(["GET"])
+def listing_histograms(request):
+    """Price and kilometre histograms for the buy_bike range sliders"""
+    try:
+        spec = ListingFilter.from_params(request.GET)
+    except InvalidFilter as e:
+        return JsonResponse({"errors": e.errors}, status=400)
+
+    # The sort order does not change the counts, so every sort shares one entry
+    spec = replace(spec, sort=DEFAULT_SORT)
+    data = listing_cache.get_or_compute(f"histograms:{spec.key}", lambda: histograms(spec))
+    return JsonResponse({"filters": spec.key, **data})
+
+@page_cache("listing:{id}")
 def bike_detail(request, id):
     bike = get_object_or_404(BikeForSale, id=id)  # Use the model, not 'bikes'
     return render(request, 'bike_detail.html', {'bike': bike})
 
 
+from django.core.exceptions import SuspiciousFileOperation
+from django.core.files.storage import default_storage
+from django.http import Http404
+from PIL import Image
+from .media import IMMUTABLE, file_response, media_cache_control
+from .resize import is_allowed, resize_cache
+
+@require_http_methods(["GET", "HEAD"])
+def media_file(request, path):
+    """An upload from MEDIA_ROOT, with validators, ranges and long caching for hashed names"""
+    try:
+        return file_response(request, default_storage.path(path), media_cache_control(path))
+    except (FileNotFoundError, NotADirectoryError, SuspiciousFileOperation):
+        raise Http404("No such file")
+
+@require_http_methods(["GET", "HEAD"])
+def resized_media(request, width, height, path):
+    """An upload scaled to fit one of the whitelisted MEDIA_RESIZE_SIZES"""
+    if not is_allowed(width, height):
+        raise Http404("Size not allowed")
+    try:
+        cached = resize_cache.get(path, width, height)
+    except (FileNotFoundError, IsADirectoryError, SuspiciousFileOperation):
+        raise Http404("No such image")
+    except (OSError, ValueError, Image.DecompressionBombError) as e:
+        logger.warning(f"Could not resize {path} to {width}x{height}: {str(e)}")
+        raise Http404("Not a readable image")
+
+    # Storage never overwrites an upload, so a path keeps naming the same
+    # image and its resized copies can be cached for good
+    return file_response(request, cached, IMMUTABLE)
+
+
 
 from django.shortcuts import render, redirect
 from django.contrib import messages
-from django.core.mail import send_mail, EmailMessage
 from django.conf import settings
-from django.template.loader import render_to_string
 from django.http import JsonResponse, HttpResponseRedirect
 from django.views.decorators.csrf import csrf_protect
 from django.views.decorators.http import require_http_methods
 from django.views.decorators.cache import never_cache
 from django.utils.html import strip_tags
-from django.utils import timezone
 from django.urls import reverse
 import logging
 import json
+from django.db import transaction
 from .forms import ContactForm
 from .models import ContactSubmission
+from .mail import dispatcher, enqueue_contact_emails
+from .ratelimit import get_client_ip, limiter, rate_limit
 
 # Set up logging
 logger = logging.getLogger(__name__)
 
+@rate_limit("contact")
 @csrf_protect
 @never_cache
 @require_http_methods(["GET", "POST"])
@@ -145,25 +218,20 @@ def contact_view(request):
                 client_ip = get_client_ip(request)
                 user_agent = request.META.get('HTTP_USER_AGENT', '')
                 
-                # Save to database
-                contact_submission = ContactSubmission.objects.create(
-                    name=form.cleaned_data['name'],
-                    email=form.cleaned_data['email'],
-                    phone=form.cleaned_data.get('phone', ''),
-                    reason=form.cleaned_data['reason'],
-                    source=form.cleaned_data.get('source', ''),
-                    message=form.cleaned_data['message'],
-                    ip_address=client_ip,
-                    user_agent=user_agent[:500] if user_agent else ''  # Truncate if too long
-                )
-                
-                # Send email notifications
-                email_sent = send_contact_emails(form.cleaned_data, contact_submission)
-                
-                if email_sent:
-                    contact_submission.email_sent = True
-                    contact_submission.email_sent_at = timezone.now()
-                    contact_submission.save()
+                # Save to database, queueing the notification emails in the
+                # same transaction; the outbox worker sends them
+                with transaction.atomic():
+                    contact_submission = ContactSubmission.objects.create(
+                        name=form.cleaned_data['name'],
+                        email=form.cleaned_data['email'],
+                        phone=form.cleaned_data.get('phone', ''),
+                        reason=form.cleaned_data['reason'],
+                        source=form.cleaned_data.get('source', ''),
+                        message=form.cleaned_data['message'],
+                        ip_address=client_ip,
+                        user_agent=user_agent[:500] if user_agent else ''  # Truncate if too long
+                    )
+                    enqueue_contact_emails(contact_submission)
                 
                 # Success message based on reason
                 success_message = get_success_message(form.cleaned_data['reason'])
@@ -209,85 +277,6 @@ def contact_view(request):
     return render(request, 'contact.html', context)
 
 
-def send_contact_emails(form_data, submission_instance):
-    """
-    Send email notifications for contact form submissions
-    Returns True if emails sent successfully, False otherwise
-    """
-    try:
-        # Prepare email context
-        email_context = {
-            'name': form_data['name'],
-            'email': form_data['email'],
-            'phone': form_data.get('phone', 'Not provided'),
-            'reason': form_data['reason'],
-            'reason_display': dict(ContactForm.REASON_CHOICES)[form_data['reason']],
-            'source': form_data.get('source', 'Not specified'),
-            'source_display': dict(ContactForm.SOURCE_CHOICES).get(form_data.get('source', ''), 'Not specified'),
-            'message': form_data['message'],
-            'submission_date': submission_instance.created_at,
-            'submission_id': str(submission_instance.id),
-        }
-        
-        # Send admin notification email
-        admin_subject = f"New {email_context['reason_display']} Inquiry - Drive RP"
-        send_admin_notification(admin_subject, email_context)
-        
-        # Send user confirmation email
-        user_subject = get_user_email_subject(form_data['reason'])
-        send_user_confirmation(user_subject, email_context)
-        
-        logger.info(f"Contact form emails sent successfully for submission {submission_instance.id}")
-        return True
-        
-    except Exception as e:
-        logger.error(f"Error sending contact emails: {str(e)}")
-        return False
-
-
-def send_admin_notification(subject, context):
-    """Send notification email to admin"""
-    try:
-        # Render email template
-        html_message = render_to_string('emails/contact_admin_notification.html', context)
-        text_message = render_to_string('emails/contact_admin_notification.txt', context)
-        
-        admin_email = EmailMessage(
-            subject=subject,
-            body=html_message,
-            from_email=settings.DEFAULT_FROM_EMAIL,
-            to=[getattr(settings, 'CONTACT_EMAIL', 'admin@driverp.in')],
-            reply_to=[context['email']]
-        )
-        admin_email.content_subtype = "html"
-        admin_email.send()
-        
-    except Exception as e:
-        logger.error(f"Error sending admin notification: {str(e)}")
-        raise
-
-
-def send_user_confirmation(subject, context):
-    """Send confirmation email to user"""
-    try:
-        # Render email template
-        html_message = render_to_string('emails/contact_user_confirmation.html', context)
-        text_message = render_to_string('emails/contact_user_confirmation.txt', context)
-        
-        user_email = EmailMessage(
-            subject=subject,
-            body=html_message,
-            from_email=settings.DEFAULT_FROM_EMAIL,
-            to=[context['email']]
-        )
-        user_email.content_subtype = "html"
-        user_email.send()
-        
-    except Exception as e:
-        logger.error(f"Error sending user confirmation: {str(e)}")
-        raise
-
-
 def get_success_message(reason):
     """Get customized success message based on inquiry reason"""
     success_messages = {
@@ -301,29 +290,6 @@ def get_success_message(reason):
     return success_messages.get(reason, 'Thank you for contacting us! We will get back to you soon.')
 
 
-def get_user_email_subject(reason):
-    """Get customized email subject for user confirmation"""
-    subjects = {
-        'general_enquiry': 'Thank you for contacting Drive RP',
-        'buy_bike': 'Thank you for your interest in buying a bike - Drive RP',
-        'sell_bike': 'Thank you for choosing Drive RP to sell your bike',
-        'exchange_bike': 'Thank you for your bike exchange inquiry - Drive RP',
-        'rto_service': 'Thank you for your RTO service inquiry - Drive RP',
-        'others': 'Thank you for contacting Drive RP',
-    }
-    return subjects.get(reason, 'Thank you for contacting Drive RP')
-
-
-def get_client_ip(request):
-    """Extract client IP address from request"""
-    x_forwarded_for = request.META.get('HTTP_X_FORWARDED_FOR')
-    if x_forwarded_for:
-        ip = x_forwarded_for.split(',')[0].strip()
-    else:
-        ip = request.META.get('REMOTE_ADDR', '')
-    return ip
-
-
 def get_contact_info():
     """Get contact information for template"""
     return {
@@ -344,6 +310,7 @@ def get_business_hours():
 
 
 # AJAX endpoint for real-time form validation
+@rate_limit("contact_validate")
 @csrf_protect
 @require_http_methods(["POST"])
 def validate_contact_field(request):
@@ -392,6 +359,7 @@ from django.utils.decorators import method_decorator
 from django.views import View
 
 @method_decorator(csrf_exempt, name='dispatch')
+@method_decorator(rate_limit("contact_api"), name='dispatch')
 class ContactAPIView(View):
     """API endpoint for contact form submissions"""
     
@@ -406,25 +374,19 @@ class ContactAPIView(View):
             form = ContactForm(data)
             
             if form.is_valid():
-                # Save submission
-                contact_submission = ContactSubmission.objects.create(
-                    name=form.cleaned_data['name'],
-                    email=form.cleaned_data['email'],
-                    phone=form.cleaned_data.get('phone', ''),
-                    reason=form.cleaned_data['reason'],
-                    source=form.cleaned_data.get('source', ''),
-                    message=form.cleaned_data['message'],
-                    ip_address=get_client_ip(request),
-                    user_agent=request.META.get('HTTP_USER_AGENT', '')[:500]
-                )
-                
-                # Send emails
-                email_sent = send_contact_emails(form.cleaned_data, contact_submission)
-                
-                if email_sent:
-                    contact_submission.email_sent = True
-                    contact_submission.email_sent_at = timezone.now()
-                    contact_submission.save()
+                # Save submission and queue its emails
+                with transaction.atomic():
+                    contact_submission = ContactSubmission.objects.create(
+                        name=form.cleaned_data['name'],
+                        email=form.cleaned_data['email'],
+                        phone=form.cleaned_data.get('phone', ''),
+                        reason=form.cleaned_data['reason'],
+                        source=form.cleaned_data.get('source', ''),
+                        message=form.cleaned_data['message'],
+                        ip_address=get_client_ip(request),
+                        user_agent=request.META.get('HTTP_USER_AGENT', '')[:500]
+                    )
+                    enqueue_contact_emails(contact_submission)
                 
                 return JsonResponse({
                     'success': True,
@@ -456,11 +418,111 @@ class ContactAPIView(View):
             'version': '1.0',
             'endpoints': {
                 'POST /contact/api/': 'Submit contact form',
+                'POST /contact/api/bulk/': 'Submit many contact forms as a JSON array or NDJSON',
                 'POST /contact/validate/': 'Validate individual fields'
             }
         })
 
 
+class InvalidBulkPayload(ValueError):
+    """Raised when a bulk request body is not a JSON array or NDJSON"""
+
+
+def bulk_contact_items(request):
+    """
+    The items of a bulk request: a JSON array, or NDJSON (one object per
+    line, read from the request stream). A line that is not JSON yields
+    the exception in its place so it is reported as that item's error.
+    """
+    if request.content_type in ('application/x-ndjson', 'application/jsonl'):
+        for line in request:
+            if line.strip():
+                try:
+                    yield json.loads(line)
+                except ValueError as e:
+                    yield e
+        return
+
+    try:
+        items = json.loads(request.body.decode('utf-8'))
+    except ValueError:
+        raise InvalidBulkPayload('Invalid JSON data')
+    if not isinstance(items, list):
+        raise InvalidBulkPayload('Expected a JSON array of contact forms')
+    yield from items
+
+
+@method_decorator(csrf_exempt, name='dispatch')
+@method_decorator(rate_limit("contact_bulk"), name='dispatch')
+class ContactBulkAPIView(View):
+    """
+    API endpoint for partner lead sources pushing many contact forms at
+    once. Each item is validated with ContactForm; valid ones are inserted
+    with bulk_create (in batches, one transaction) and their emails queued
+    in the outbox. Invalid items are reported by position.
+    """
+
+    def post(self, request):
+        max_items = getattr(settings, 'BULK_CONTACT_MAX_ITEMS', 1000)
+        client_ip = get_client_ip(request)
+        user_agent = request.META.get('HTTP_USER_AGENT', '')[:500]
+
+        submissions = []
+        errors = []
+        try:
+            for index, item in enumerate(bulk_contact_items(request)):
+                if index >= max_items:
+                    return JsonResponse({
+                        'success': False,
+                        'message': f'At most {max_items} contact forms per request'
+                    }, status=413)
+                if isinstance(item, ValueError):
+                    errors.append({'index': index, 'errors': {'__all__': ['Invalid JSON data']}})
+                    continue
+                if not isinstance(item, dict):
+                    errors.append({'index': index, 'errors': {'__all__': ['Expected a JSON object']}})
+                    continue
+
+                form = ContactForm(item)
+                if not form.is_valid():
+                    errors.append({'index': index, 'errors': form.errors})
+                    continue
+                submissions.append(ContactSubmission(
+                    name=form.cleaned_data['name'],
+                    email=form.cleaned_data['email'],
+                    phone=form.cleaned_data.get('phone', ''),
+                    reason=form.cleaned_data['reason'],
+                    source=form.cleaned_data.get('source', ''),
+                    message=form.cleaned_data['message'],
+                    ip_address=client_ip,
+                    user_agent=user_agent
+                ))
+        except InvalidBulkPayload as e:
+            return JsonResponse({'success': False, 'message': str(e)}, status=400)
+
+        try:
+            with transaction.atomic():
+                ContactSubmission.objects.bulk_create(
+                    submissions, batch_size=getattr(settings, 'BULK_CONTACT_BATCH_SIZE', 500)
+                )
+                enqueue_contact_emails(*submissions)
+        except Exception as e:
+            logger.error(f"Contact bulk API error: {str(e)}")
+            return JsonResponse({
+                'success': False,
+                'message': 'An error occurred. Please try again.'
+            }, status=500)
+
+        logger.info(f"Contact bulk API: {len(submissions)} created, {len(errors)} rejected from {client_ip}")
+        return JsonResponse({
+            'success': not errors,
+            'created': len(submissions),
+            'rejected': len(errors),
+            'submission_ids': [str(submission.id) for submission in submissions],
+            'errors': errors
+        }, status=200 if submissions or not errors else 400)
+
+
 # Admin dashboard view for contact submissions
 from django.contrib.admin.views.decorators import staff_member_required
 from django.db.models import Count, Q
@@ -545,17 +607,16 @@ def bulk_update_submissions(request):
 
 
 
-def auth_view(request):
-    # Get latest images for login and register forms
-    login_image = AuthImage.objects.filter(is_for_login=True).order_by("-uploaded_at").first()
-    register_image = AuthImage.objects.filter(is_for_register=True).order_by("-uploaded_at").first()
+@staff_member_required
+def cache_stats(request):
+    """Hit/miss counters of the buy_bike result cache, mail connection reuse and throttling (admin only)"""
+    return JsonResponse({"listings": listing_cache.stats(), "mail": dispatcher.stats(), "ratelimit": limiter.stats()})
 
-    context = {
-        "login_image": login_image,
-        "register_image": register_image,
-    }
-    return render(request, "auth.html", context)
 
+def auth_view(request):
+    # Latest images for login and register forms, from the content registry
+    context = content_registry.get_many("login_image", "register_image")
+    return render(request, "auth.html", context)
 
 from django.http import JsonResponse
 from .models import Motorcycle
@@ -12,6 +12,7 @@ https://docs.djangoproject.com/en/5.2/ref/settings/
 
 from pathlib import Path
 import os
+import sys
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -26,6 +27,8 @@ SECRET_KEY = 'django-insecure-p6ix7h+8ltts^2&eu4tkh%6i3&vi!cv3nlh9lq8(fsc)186z1w
 # SECURITY WARNING: don't run with debug turned on in production!
 DEBUG = True
 
+TESTING = sys.argv[1:2] == ['test']
+
 ALLOWED_HOSTS = ['*']
 
 
@@ -123,13 +126,99 @@ MEDIA_URL = "/media/"
 MEDIA_ROOT = os.path.join(BASE_DIR, "media")
 
 STATIC_ROOT = BASE_DIR / "staticfiles"
-STATICFILES_STORAGE = "whitenoise.storage.CompressedManifestStaticFilesStorage"
+# Uploads are stored by content hash (bikes.storage): identical photos are
+# kept once and every media URL names fixed bytes. "manage.py collect_media"
+# deletes blobs no row refers to any more. Static files are compressed and
+# hashed by whitenoise at collectstatic; the test runner has no manifest
+STORAGES = {
+    "default": {"BACKEND": "bikes.storage.ContentAddressedStorage"},
+    "staticfiles": {
+        "BACKEND": (
+            "django.contrib.staticfiles.storage.StaticFilesStorage" if TESTING
+            else "whitenoise.storage.CompressedManifestStaticFilesStorage"
+        ),
+    },
+}
 
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
+# Cache
+# https://docs.djangoproject.com/en/5.2/topics/cache/
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'bikewebsite',
+        'OPTIONS': {
+            'MAX_ENTRIES': 5000,
+        },
+    },
+    # Seen by every process on the host: gunicorn workers, the send_outbox
+    # worker and management commands. Swap in Redis/Memcached when the site
+    # runs on more than one machine
+    'shared': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': os.environ.get('BIKES_CACHE_DIR', BASE_DIR / 'cache'),
+        'OPTIONS': {
+            'MAX_ENTRIES': 20000,
+        },
+    },
+}
+
+# Cache holding the bikes generations, result/page caches and snapshots
+# (bikes.cache). It must be shared, or a change made in one process (a
+# signal, a queryset.update() followed by a purge, a management command)
+# never reaches the others; a per-process backend is logged at startup.
+# Tests get a fresh per-process cache
+BIKES_CACHE_ALIAS = 'default' if TESTING else 'shared'
+
+# Buy bike listing: rows per keyset-paginated page
+BUY_BIKE_PAGE_SIZE = 24
+
+# Buy bike filtering engine: "orm" (database queries) or "columnar"
+# (in-memory NumPy snapshot; numpy is in requirements.txt, and without it
+# the engine falls back to "orm" with a warning at startup)
+BUY_BIKE_ENGINE = 'orm'
+
+# Seconds a cached buy_bike result may live; listing changes retire entries sooner
+LISTING_CACHE_TIMEOUT = 600
+# Seconds between adding a worker's hit/miss counts to the shared totals
+LISTING_CACHE_STATS_FLUSH = 60
+
+# Full-page cache for anonymous visitors; entries are purged by surrogate
+# keys on model changes. This bounds how long unused pages are kept, and how
+# stale a page can get if a change bypasses the signals (or the cache is
+# per-process)
+PAGE_CACHE_TIMEOUT = 3600
+
+# Static pre-render ("manage.py bake"): output directory and buy_bike pages
+# baked (as /buy-bike/page/N/). Serve BAKE_ROOT from the front proxy (or
+# WHITENOISE_ROOT) to use it
+BAKE_ROOT = BASE_DIR / "baked"
+BAKE_BUY_BIKE_PAGES = 5
+
+# On-demand resizing (/media/r/<w>x<h>/<path>): the only boxes served, where
+# results are cached and the byte budget of that cache (least recently
+# used files are evicted)
+MEDIA_RESIZE_SIZES = ["400x400", "640x480", "800x600", "800x800", "1280x960", "1920x1080"]
+MEDIA_RESIZE_ROOT = BASE_DIR / "media_cache"
+MEDIA_RESIZE_CACHE_BYTES = 512 * 1024 * 1024
+
+# Uploads are served by bikes.views.media_file (set SERVE_MEDIA = False when
+# the front proxy serves MEDIA_ROOT). Names without a content hash may be
+# cached this many seconds before the browser revalidates them
+SERVE_MEDIA = True
+MEDIA_MAX_AGE = 3600
+
+# Catalogue search: maximum results returned by the FTS5 index, and how
+# many of the newest matches are ranked by relevance to pick them (see
+# bikes.search.RANK_WINDOW for the measured cost)
+SEARCH_RESULT_LIMIT = 30
+SEARCH_RANK_WINDOW = 2000
+
 # Email settings for contact form
 EMAIL_BACKEND = 'django.core.mail.backends.smtp.EmailBackend'
 EMAIL_HOST = 'smtp.gmail.com'
@@ -143,6 +232,56 @@ DEFAULT_FROM_EMAIL = 'Drive RP <noreply@driverp.in>'
 CONTACT_EMAIL = 'info@driverp.in'  # Where contact forms are sent
 ADMIN_EMAIL = 'admin@driverp.in'   # Admin notifications
 
+# Contact email outbox. OUTBOX_DRAIN = "worker" leaves it to
+# "manage.py send_outbox" (the procfile worker); "web" drains it from a
+# background thread of each web process, woken by every submission and
+# otherwise every OUTBOX_DRAIN_INTERVAL seconds (render.yaml: a Render
+# worker cannot reach the web service's SQLite disk). Then: messages per
+# batch, seconds between polls when idle, retry backoff (base doubled per
+# failed attempt, capped) and attempts before a message is marked failed
+OUTBOX_DRAIN = os.environ.get('OUTBOX_DRAIN', 'worker' if TESTING else 'web')
+OUTBOX_DRAIN_INTERVAL = 60
+OUTBOX_BATCH_SIZE = 50
+OUTBOX_POLL_INTERVAL = 5
+OUTBOX_RETRY_BASE = 30
+OUTBOX_RETRY_MAX = 3600
+OUTBOX_MAX_ATTEMPTS = 8
+
+# The outbox worker keeps one mail connection open, closing it after this
+# many idle seconds. With CONTACT_ADMIN_DIGEST_SIZE above 1, admin
+# notifications are sent as one digest per that many submissions, or
+# after the oldest has waited CONTACT_ADMIN_DIGEST_WAIT seconds
+MAIL_CONNECTION_IDLE = 60
+CONTACT_ADMIN_DIGEST_SIZE = 1
+CONTACT_ADMIN_DIGEST_WAIT = 900
+
+# Compiled ContactEmailTemplate subjects/bodies are rebuilt when a template
+# is saved, and in any case after this many seconds (covers processes that
+# do not share a cache with the admin)
+EMAIL_TEMPLATE_MAX_AGE = 300
+
+# Bulk contact API (/api/bulk/): items accepted per request and rows per
+# INSERT statement
+BULK_CONTACT_MAX_ITEMS = 1000
+BULK_CONTACT_BATCH_SIZE = 500
+
+# Token-bucket rate limits per client IP and endpoint ("<count>/<s|m|h|d>":
+# bursts of up to count, refilled at that rate); exceeding one answers 429.
+# Buckets are kept per process unless RATELIMIT_CACHE_ALIAS names a cache
+# shared by the workers; RATELIMIT_MAX_KEYS bounds the per-process buckets.
+# RATELIMIT_TRUSTED_PROXIES is the number of proxies in front of the site
+# that append to X-Forwarded-For (Render's load balancer: 1); the client IP
+# is read that many entries from the right, never from the client's own part
+RATE_LIMITS = {
+    'contact': '10/m',
+    'contact_api': '10/m',
+    'contact_validate': '120/m',
+    'contact_bulk': '30/h',
+}
+RATELIMIT_CACHE_ALIAS = None
+RATELIMIT_MAX_KEYS = 10000
+RATELIMIT_TRUSTED_PROXIES = int(os.environ.get('RATELIMIT_TRUSTED_PROXIES', 1))
+
 # Drive RP business details (used in templates)
 BUSINESS_INFO = {
     'name': 'Drive RP',
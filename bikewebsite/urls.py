@@ -14,17 +14,24 @@ Including another URLconf
     1. Import the include() function: from django.urls import include, path
     2. Add a URL to urlpatterns:  path('blog/', include('blog.urls'))
 """
+import re
+
 from django.contrib import admin
-from django.urls import path, include
+from django.urls import path, include, re_path
 from django.conf import settings
-from django.conf.urls.static import static
+
+from bikes.views import media_file
 
 urlpatterns = [
     path("admin/", admin.site.urls),
     path("", include("bikes.urls")),  # your app name = bikes
 ]
 
-# To serve media files (bike images) during development
-if settings.DEBUG:
-    urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
+# Media files (bike images), in development and production alike: with
+# ETag/Last-Modified, ranges and immutable caching for hashed names. Set
+# SERVE_MEDIA = False when the front proxy serves MEDIA_ROOT itself
+if getattr(settings, "SERVE_MEDIA", True):
+    urlpatterns += [
+        re_path(rf"^{re.escape(settings.MEDIA_URL.lstrip('/'))}(?P<path>.+)$", media_file, name="media"),
+    ]
 
@@ -14,3 +14,8 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'bikewebsite.settings')
 
 application = get_wsgi_application()
+
+# Load the static page sections (about, auth, home) before the first request
+from bikes.content import content_registry  # noqa: E402
+
+content_registry.warm_up()